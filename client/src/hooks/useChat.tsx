@@ -3,33 +3,51 @@ import { useState } from "react";
 
 type StreamingResponseProps = {
   prompt: string;
+  dbId: number;
   language?: string;
 };
 
 type UseChatReturns = {
   response: string;
+  stage: string;
+  sql: string;
   getStreamingResponse: (props: StreamingResponseProps) => void;
 };
 
 export default function useChat(): UseChatReturns {
   const [response, setResponse] = useState("");
+  const [stage, setStage] = useState("");
+  const [sql, setSql] = useState("");
+
+  // Server-sent events: "progress", "token" (model output), then "sql" or "error"
+  const handleEvent = (event: string, data: any) => {
+    if (event === "progress") setStage(data.stage);
+    else if (event === "token") setResponse((prev) => prev + data.text);
+    else if (event === "sql") setSql(data.raw_sql);
+    else if (event === "error") console.error("Generation failed:", data.detail);
+  };
 
   const getStreamingResponse = async ({
     prompt,
+    dbId,
     language,
   }: StreamingResponseProps) => {
     const body = {
       prompt,
+      db_id: dbId,
       language: language ? language : "en",
     };
 
     setResponse("");
+    setStage("");
+    setSql("");
 
     try {
       const response = await fetch(`${API_URL}/chat/stream`, {
         method: "POST",
         headers: {
           "Content-Type": "application/json",
+          Authorization: `Bearer ${localStorage.getItem("token")}`,
         },
         body: JSON.stringify(body),
       });
@@ -40,13 +58,24 @@ export default function useChat(): UseChatReturns {
 
       const reader = response.body.getReader();
       const decoder = new TextDecoder("utf-8");
+      let buffer = "";
 
       while (true) {
         const { done, value } = await reader.read();
         if (done) break;
 
-        const chunk = decoder.decode(value, { stream: true });
-        setResponse((prev) => prev + chunk);
+        buffer += decoder.decode(value, { stream: true });
+        const events = buffer.split("\n\n");
+        buffer = events.pop() ?? "";
+        for (const raw of events) {
+          let event = "message";
+          let data = "";
+          for (const line of raw.split("\n")) {
+            if (line.startsWith("event: ")) event = line.slice(7);
+            else if (line.startsWith("data: ")) data += line.slice(6);
+          }
+          if (data) handleEvent(event, JSON.parse(data));
+        }
       }
     } catch (error) {
       console.error("Error while streaming:", error);
@@ -55,6 +84,8 @@ export default function useChat(): UseChatReturns {
 
   const hooks = {
     response,
+    stage,
+    sql,
     getStreamingResponse,
   };
 
@@ -0,0 +1,33 @@
+import axios from 'axios';
+import { API_URL } from '@/constants';
+
+// Last body and ETag of each schema URL, replayed when the server answers 304 Not Modified
+const etagCache = new Map<string, { etag: string; data: any }>();
+
+// GET a schema endpoint with If-None-Match, so an unchanged schema is not sent (or rebuilt) again
+export async function getSchemaResource(path: string, token: string | null) {
+  const url = `${API_URL}${path}`;
+  const cached = etagCache.get(url);
+  const headers: Record<string, string> = { Authorization: `Bearer ${token}` };
+  if (cached) {
+    headers['If-None-Match'] = cached.etag;
+  }
+
+  const response = await axios.get(url, {
+    headers,
+    validateStatus: status => (status >= 200 && status < 300) || status === 304,
+  });
+  if (response.status === 304 && cached) {
+    return cached.data;
+  }
+
+  const etag = response.headers['etag'];
+  if (etag) {
+    etagCache.set(url, { etag, data: response.data });
+  }
+  return response.data;
+}
+
+export function tablePath(tableName: string) {
+  return `/agent/schema/tables/${encodeURIComponent(tableName)}`;
+}
@@ -63,6 +63,7 @@ export default function ChatbotPage() {
   const [input, setInput] = useState('');
   const [prompts, setPrompts] = useState<string[]>([]);
   const [rawSQL, setrawSQL] = useState('');
+  const [sqlPrompt, setSqlPrompt] = useState('');
   const [responses, setResponses] = useState<QueryResponse[]>([]);
   const [dbConfig, setDbConfig] = useState<UserDatabaseType>({
     host: '',
@@ -175,6 +176,7 @@ export default function ChatbotPage() {
       );
 
       setrawSQL(res.data.raw_sql);
+      setSqlPrompt(input);
 
       const response = {
         ...res.data,
@@ -211,6 +213,7 @@ export default function ChatbotPage() {
         {
           raw_sql: sql || rawSQL,
           db_id: selectedDbId,
+          prompt: sqlPrompt || undefined,
         },
         {
           headers: {
@@ -4,7 +4,10 @@ import { cn } from '@/lib/utils';
 
 // ER Diagram specific props
 interface ERDiagramViewProps {
+  // Table list and FK edges from /agent/schema/tables
   schemaData: any;
+  // Per-table structures, filled in as they are fetched
+  tableDetails: Record<string, any>;
   zoom: number;
   loading: boolean;
   expandedTables: Record<string, boolean>;
@@ -13,6 +16,7 @@ interface ERDiagramViewProps {
 
 export default function ERDiagramView({
   schemaData,
+  tableDetails,
   zoom,
   loading,
   expandedTables,
@@ -20,27 +24,23 @@ export default function ERDiagramView({
 }: ERDiagramViewProps) {
   // Generate relationships for visualization
   const relationships = useMemo(() => {
-    if (!schemaData || !schemaData.tables) return [];
+    if (!schemaData || !schemaData.edges) return [];
     
-    const relations = [];
-    
-    Object.entries(schemaData.tables).forEach(([tableName, tableData]: [string, any]) => {
-      const foreignKeys = tableData.structure.foreign_keys || [];
-      
-      foreignKeys.forEach(fk => {
-        relations.push({
-          fromTable: tableName,
-          fromColumn: fk.constrained_columns[0],
-          toTable: fk.referred_table,
-          toColumn: fk.referred_columns[0],
-          name: fk.name
-        });
-      });
-    });
-    
-    return relations;
+    return schemaData.edges.map(edge => ({
+      fromTable: edge.from_table,
+      fromColumn: edge.from_columns[0],
+      toTable: edge.to_table,
+      toColumn: edge.to_columns[0],
+      name: edge.name
+    }));
   }, [schemaData]);
 
+  // Structure of a table, empty until its detail has been fetched
+  const getStructure = useCallback((tableName) => {
+    const structure = tableDetails[tableName]?.structure || {};
+    return { columns: structure.columns || [], foreign_keys: structure.foreign_keys || [] };
+  }, [tableDetails]);
+
   // Calculate layout positions for tables
   const tablePositions = useMemo(() => {
     if (!schemaData || !schemaData.tables) return {};
@@ -69,12 +69,10 @@ export default function ERDiagramView({
 
   // Get primary key columns for a table
   const getPrimaryKeys = useCallback((tableName) => {
-    if (!schemaData || !schemaData.tables || !schemaData.tables[tableName]) return [];
-    
-    return schemaData.tables[tableName].structure.columns
+    return getStructure(tableName).columns
       .filter(col => col.primary_key)
       .map(col => col.name);
-  }, [schemaData]);
+  }, [getStructure]);
 
   // Calculate SVG dimensions based on table positions
   const svgDimensions = useMemo(() => {
@@ -98,7 +96,7 @@ export default function ERDiagramView({
 
   // Draw a table box in the SVG
   const renderTableBox = (tableName, x, y) => {
-    const tableData = schemaData.tables[tableName];
+    const structure = getStructure(tableName);
     const isExpanded = expandedTables[tableName] || false;
     const primaryKeys = getPrimaryKeys(tableName);
     
@@ -108,18 +106,18 @@ export default function ERDiagramView({
     const headerHeight = 30;
     
     // Determine columns to show (limit to primary keys and foreign keys if collapsed)
-    let columnsToShow = tableData.structure.columns;
+    let columnsToShow = structure.columns;
     if (!isExpanded) {
-      const fkColumns = (tableData.structure.foreign_keys || [])
+      const fkColumns = (structure.foreign_keys || [])
         .flatMap(fk => fk.constrained_columns);
       
-      columnsToShow = tableData.structure.columns.filter(col => 
+      columnsToShow = structure.columns.filter(col => 
         col.primary_key || fkColumns.includes(col.name)
       );
       
       // Always show at least 3 columns for visual consistency
-      if (columnsToShow.length < 3 && tableData.structure.columns.length >= 3) {
-        columnsToShow = tableData.structure.columns.slice(0, 3);
+      if (columnsToShow.length < 3 && structure.columns.length >= 3) {
+        columnsToShow = structure.columns.slice(0, 3);
       }
     }
     
@@ -128,7 +126,7 @@ export default function ERDiagramView({
     
     // Determine if column is part of a foreign key
     const isForeignKey = (columnName) => {
-      return (tableData.structure.foreign_keys || []).some(
+      return (structure.foreign_keys || []).some(
         fk => fk.constrained_columns.includes(columnName)
       );
     };
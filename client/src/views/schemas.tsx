@@ -1,6 +1,7 @@
 import { useState, useEffect, useCallback } from 'react';
 import axios from 'axios';
 import { API_URL } from '@/constants';
+import { getSchemaResource, tablePath } from '@/lib/schemaApi';
 import { 
   Database, 
   RefreshCw, 
@@ -19,7 +20,10 @@ import ERDiagramView from './ERDiagram'; // Import the ERDiagram component
 import { useNavigate } from 'react-router-dom';
 
 export default function SchemaVisualizationPage() {
+  // Table list with counts and FK edges; columns and sample rows are fetched per table on demand
   const [schemaData, setSchemaData] = useState(null);
+  const [tableDetails, setTableDetails] = useState({});
+  const [tableSamples, setTableSamples] = useState({});
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState(null);
   const [selectedDbId, setSelectedDbId] = useState(0);
@@ -63,33 +67,22 @@ export default function SchemaVisualizationPage() {
       setLoading(true);
       setError(null);
       
-      const response = await axios.get(`${API_URL}/agent/visualize-schema?db_id=${dbId}`, {
-        headers: {
-          Authorization: `Bearer ${token}`,
-        },
-      });
-      
-      let data = response.data;
-      
-      // Handle string response if needed
-      if (typeof data === 'string') {
-        try {
-          data = JSON.parse(data);
-        } catch (e) {
-          console.error("Failed to parse schema data:", e);
-          setError('Invalid schema data format');
-          return;
-        }
-      }
+      const data = await getSchemaResource(`/agent/schema/tables?db_id=${dbId}`, token);
       
-      if (!data || !data.tables) {
+      if (!data || !Array.isArray(data.tables)) {
         setError('Invalid schema data structure');
         return;
       }
       
-      setSchemaData(data);
+      setSchemaData({
+        ...data,
+        tables: Object.fromEntries(data.tables.map(table => [table.name, table]))
+      });
+      // Details are re-requested with If-None-Match, so unchanged tables cost a 304
+      setTableDetails({});
+      setTableSamples({});
       // Expand the first table by default
-      const firstTable = Object.keys(data.tables)[0];
+      const firstTable = data.tables[0]?.name;
       if (firstTable) {
         setExpandedTables({ [firstTable]: true });
       }
@@ -101,6 +94,49 @@ export default function SchemaVisualizationPage() {
     }
   }, [token]);
 
+  // Fetch columns, foreign keys and indexes of one table
+  const fetchTableDetail = useCallback(async (dbId, tableName) => {
+    setTableDetails(prev => ({ ...prev, [tableName]: { loading: true } }));
+    try {
+      const detail = await getSchemaResource(`${tablePath(tableName)}?db_id=${dbId}`, token);
+      setTableDetails(prev => ({ ...prev, [tableName]: detail }));
+    } catch (err) {
+      console.error(`Error fetching table ${tableName}:`, err);
+      setTableDetails(prev => ({ ...prev, [tableName]: { error: `Failed to load columns: ${err.message}` } }));
+    }
+  }, [token]);
+
+  // Fetch every table's structure at once, for the ER diagram
+  const fetchAllTableDetails = useCallback(async (dbId) => {
+    try {
+      const data = await getSchemaResource(`/agent/visualize-schema?db_id=${dbId}`, token);
+      const details = {};
+      Object.entries(data.tables || {}).forEach(([tableName, tableData]) => {
+        details[tableName] = { name: tableName, ...tableData };
+      });
+      setTableDetails(prev => ({ ...prev, ...details }));
+    } catch (err) {
+      console.error("Error fetching table structures:", err);
+      setError(`Failed to load table structures: ${err.message}`);
+    }
+  }, [token]);
+
+  // Sample rows are read from the database on request and never cached
+  const fetchTableSample = useCallback(async (dbId, tableName) => {
+    setTableSamples(prev => ({ ...prev, [tableName]: { loading: true } }));
+    try {
+      const response = await axios.get(`${API_URL}${tablePath(tableName)}/sample?db_id=${dbId}`, {
+        headers: {
+          Authorization: `Bearer ${token}`,
+        },
+      });
+      setTableSamples(prev => ({ ...prev, [tableName]: response.data }));
+    } catch (err) {
+      console.error(`Error sampling table ${tableName}:`, err);
+      setTableSamples(prev => ({ ...prev, [tableName]: { error: `Failed to load sample rows: ${err.message}` } }));
+    }
+  }, [token]);
+
   // Fetch databases
   const fetchDatabases = useCallback(async () => {
     try {
@@ -140,12 +176,29 @@ export default function SchemaVisualizationPage() {
     }
   }, [selectedDbId, fetchSchemaData]);
 
+  // Load the details of expanded tables that have not been fetched yet
+  useEffect(() => {
+    if (!schemaData) return;
+    Object.keys(expandedTables)
+      .filter(tableName => expandedTables[tableName] && schemaData.tables[tableName] && !tableDetails[tableName])
+      .forEach(tableName => fetchTableDetail(selectedDbId, tableName));
+  }, [schemaData, expandedTables, tableDetails, selectedDbId, fetchTableDetail]);
+
+  // The ER diagram draws the columns of every table
+  useEffect(() => {
+    if (activeTab === 'erdiagram' && schemaData && selectedDbId !== 0) {
+      fetchAllTableDetails(selectedDbId);
+    }
+  }, [activeTab, schemaData, selectedDbId, fetchAllTableDetails]);
+
   // Handle database selection change
   const handleDbChange = (event) => {
     const dbId = Number(event.target.value);
     setSelectedDbId(dbId);
     // Clear previous schema data when changing databases
     setSchemaData(null);
+    setTableDetails({});
+    setTableSamples({});
     setExpandedTables({});
   };
 
@@ -175,15 +228,10 @@ export default function SchemaVisualizationPage() {
   const getOrganizedTables = useCallback(() => {
     if (!schemaData || !schemaData.tables) return [];
     
-    // Find tables with incoming foreign keys
-    const tablesWithIncomingFKs = new Set();
+    const edges = schemaData.edges || [];
     
-    Object.entries(schemaData.tables).forEach(([_, tableData]) => {
-      const foreignKeys = tableData.structure.foreign_keys || [];
-      foreignKeys.forEach(fk => {
-        tablesWithIncomingFKs.add(fk.referred_table);
-      });
-    });
+    // Find tables with incoming foreign keys
+    const tablesWithIncomingFKs = new Set(edges.map(edge => edge.to_table));
     
     // Group tables by their relationship level
     const levels = [];
@@ -208,10 +256,9 @@ export default function SchemaVisualizationPage() {
       const stillRemaining = [];
       
       for (const tableName of remainingTables) {
-        const tableData = schemaData.tables[tableName];
         // Check if all referred tables are in previous levels
-        const allReferredTablesProcessed = (tableData.structure.foreign_keys || []).every(fk => {
-          return levels.flat().includes(fk.referred_table);
+        const allReferredTablesProcessed = edges.filter(edge => edge.from_table === tableName).every(edge => {
+          return levels.flat().includes(edge.to_table);
         });
         
         if (allReferredTablesProcessed) {
@@ -239,47 +286,36 @@ export default function SchemaVisualizationPage() {
   const getRelationships = useCallback(() => {
     if (!schemaData || !schemaData.tables) return [];
     
-    const relationships = [];
-    
-    Object.entries(schemaData.tables).forEach(([tableName, tableData]) => {
-      const foreignKeys = tableData.structure.foreign_keys || [];
-      
-      foreignKeys.forEach(fk => {
-        relationships.push({
-          fromTable: tableName,
-          fromColumn: fk.constrained_columns[0],
-          toTable: fk.referred_table,
-          toColumn: fk.referred_columns[0],
-          name: fk.name
-        });
-      });
-    });
-    
-    return relationships;
+    return (schemaData.edges || []).map(edge => ({
+      fromTable: edge.from_table,
+      fromColumn: edge.from_columns[0],
+      toTable: edge.to_table,
+      toColumn: edge.to_columns[0],
+      name: edge.name
+    }));
   }, [schemaData]);
 
   // Render a table with its structure and sample data
   const renderTable = (tableName) => {
     const tableData = schemaData.tables[tableName];
+    const detail = tableDetails[tableName];
+    const sample = tableSamples[tableName];
     const isExpanded = expandedTables[tableName] || false;
+    const tableEdges = (schemaData.edges || []).filter(edge => edge.from_table === tableName);
     
     // Check if column is part of a foreign key
     const isForeignKey = (columnName) => {
-      return (tableData.structure.foreign_keys || []).some(
-        fk => fk.constrained_columns.includes(columnName)
-      );
+      return tableEdges.some(edge => edge.from_columns.includes(columnName));
     };
     
     // Get relationship details for a column if it's a foreign key
     const getRelationshipDetails = (columnName) => {
-      const fk = (tableData.structure.foreign_keys || []).find(
-        fk => fk.constrained_columns.includes(columnName)
-      );
+      const edge = tableEdges.find(edge => edge.from_columns.includes(columnName));
       
-      if (fk) {
+      if (edge) {
         return {
-          referencedTable: fk.referred_table,
-          referencedColumn: fk.referred_columns[0]
+          referencedTable: edge.to_table,
+          referencedColumn: edge.to_columns[0]
         };
       }
       
@@ -309,7 +345,8 @@ export default function SchemaVisualizationPage() {
             <div>
               <h3 className="text-lg font-bold text-indigo-200">{tableName}</h3>
               <p className="text-xs text-gray-400">
-                {tableData.structure.columns.length} columns • {tableData.sample_data?.length || 0} sample rows
+                {tableData.column_count} columns
+                {tableData.row_count != null && ` • ${tableData.row_count_estimated ? '~' : ''}${tableData.row_count} rows`}
               </p>
             </div>
           </div>
@@ -327,15 +364,15 @@ export default function SchemaVisualizationPage() {
         {isExpanded && (
           <div className="p-4">
             {/* Foreign Key Relationships */}
-            {tableData.structure.foreign_keys?.length > 0 && (
+            {tableEdges.length > 0 && (
               <div className="mb-4 p-3 bg-indigo-950 bg-opacity-30 rounded-lg border border-indigo-900">
                 <h4 className="text-sm font-semibold text-indigo-300 mb-2">Relationships</h4>
                 <div className="space-y-2">
-                  {tableData.structure.foreign_keys.map((fk, idx) => (
+                  {tableEdges.map((edge, idx) => (
                     <div key={idx} className="flex items-center text-sm">
-                      <span className="text-indigo-400 font-medium">{fk.constrained_columns[0]}</span>
+                      <span className="text-indigo-400 font-medium">{edge.from_columns[0]}</span>
                       <ArrowRight className="w-4 h-4 mx-2 text-indigo-500" />
-                      <span className="text-green-400">{fk.referred_table}.{fk.referred_columns[0]}</span>
+                      <span className="text-green-400">{edge.to_table}.{edge.to_columns[0]}</span>
                     </div>
                   ))}
                 </div>
@@ -345,8 +382,14 @@ export default function SchemaVisualizationPage() {
             {/* Columns */}
             <div className="mb-4">
               <h4 className="text-sm font-semibold text-gray-300 mb-2">Columns</h4>
+              {(tableData.error || detail?.error) && (
+                <p className="text-sm text-red-300">{tableData.error || detail.error}</p>
+              )}
+              {(!detail || detail.loading) && (
+                <p className="text-sm text-gray-400">Loading columns...</p>
+              )}
               <div className="space-y-1 max-h-64 overflow-y-auto pr-1">
-                {tableData.structure.columns.map((column) => (
+                {(detail?.structure?.columns || []).map((column) => (
                   <div 
                     key={column.name}
                     className={cn(
@@ -397,14 +440,28 @@ export default function SchemaVisualizationPage() {
             </div>
             
             {/* Sample Data */}
-            {tableData.sample_data && tableData.sample_data.length > 0 && (
-              <div>
-                <h4 className="text-sm font-semibold text-gray-300 mb-2">Sample Data</h4>
+            <div>
+              <h4 className="text-sm font-semibold text-gray-300 mb-2">Sample Data</h4>
+              {!sample ? (
+                <Button
+                  size="sm"
+                  className="bg-gray-700 hover:bg-gray-600 text-gray-300"
+                  onClick={() => fetchTableSample(selectedDbId, tableName)}
+                >
+                  Load sample rows
+                </Button>
+              ) : sample.loading ? (
+                <p className="text-sm text-gray-400">Loading sample rows...</p>
+              ) : sample.error ? (
+                <p className="text-sm text-red-300">{sample.error}</p>
+              ) : !sample.sample_data?.length ? (
+                <p className="text-sm text-gray-400">No rows</p>
+              ) : (
                 <div className="overflow-x-auto border border-gray-700 rounded-lg">
                   <table className="w-full table-auto">
                     <thead>
                       <tr className="bg-gray-800">
-                        {Object.keys(tableData.sample_data[0]).map(key => (
+                        {Object.keys(sample.sample_data[0]).map(key => (
                           <th key={key} className="px-3 py-2 text-left text-xs font-medium text-gray-400 uppercase tracking-wider">
                             {key}
                           </th>
@@ -412,7 +469,7 @@ export default function SchemaVisualizationPage() {
                       </tr>
                     </thead>
                     <tbody>
-                      {tableData.sample_data.map((row, idx) => (
+                      {sample.sample_data.map((row, idx) => (
                         <tr key={idx} className={idx % 2 === 0 ? 'bg-gray-750' : 'bg-gray-800'}>
                           {Object.values(row).map((value, valIdx) => (
                             <td key={valIdx} className="px-3 py-2 text-sm whitespace-nowrap text-gray-300">
@@ -424,8 +481,8 @@ export default function SchemaVisualizationPage() {
                     </tbody>
                   </table>
                 </div>
-              </div>
-            )}
+              )}
+            </div>
           </div>
         )}
       </div>
@@ -632,6 +689,7 @@ export default function SchemaVisualizationPage() {
           // ER Diagram View
           <ERDiagramView 
             schemaData={schemaData}
+            tableDetails={tableDetails}
             zoom={zoom}
             loading={loading}
             expandedTables={expandedTables}
@@ -1,3 +1,4 @@
+import os
 from logging.config import fileConfig
 
 from sqlalchemy import engine_from_config
@@ -9,6 +10,7 @@ from models.db_model import SQLModel
 from models.query_model import *
 from models.db_model import *
 from models.user_model import *
+from models.cache_model import *
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
 config = context.config
@@ -18,6 +20,10 @@ config = context.config
 if config.config_file_name is not None:
     fileConfig(config.config_file_name)
 
+# The application's metadata store setting wins over the ini default
+if os.getenv("METADATA_DATABASE_URL"):
+    config.set_main_option("sqlalchemy.url", os.getenv("METADATA_DATABASE_URL"))
+
 # add your model's MetaData object here
 # for 'autogenerate' support
 # from myapp import mymodel
@@ -61,6 +67,14 @@ def run_migrations_online() -> None:
     and associate a connection with the context.
 
     """
+    # database.init_db passes its own connection when migrating at startup
+    connection = config.attributes.get("connection")
+    if connection is not None:
+        context.configure(connection=connection, target_metadata=target_metadata)
+        with context.begin_transaction():
+            context.run_migrations()
+        return
+
     connectable = engine_from_config(
         config.get_section(config.config_ini_section, {}),
         prefix="sqlalchemy.",
@@ -0,0 +1,55 @@
+"""index and full-text search for query history
+
+Revision ID: 4f1d2c7e9a30
+Revises: 99bc6b83386d
+Create Date: 2026-10-17 19:48:02.517311
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4f1d2c7e9a30'
+down_revision: Union[str, None] = '99bc6b83386d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+FTS_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS queryhistory_fts USING fts5(
+        original_prompt, generated_sql, content='queryhistory', content_rowid='id'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS queryhistory_fts_ai AFTER INSERT ON queryhistory BEGIN
+        INSERT INTO queryhistory_fts(rowid, original_prompt, generated_sql)
+        VALUES (new.id, new.original_prompt, new.generated_sql);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS queryhistory_fts_ad AFTER DELETE ON queryhistory BEGIN
+        INSERT INTO queryhistory_fts(queryhistory_fts, rowid, original_prompt, generated_sql)
+        VALUES ('delete', old.id, old.original_prompt, old.generated_sql);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS queryhistory_fts_au AFTER UPDATE ON queryhistory BEGIN
+        INSERT INTO queryhistory_fts(queryhistory_fts, rowid, original_prompt, generated_sql)
+        VALUES ('delete', old.id, old.original_prompt, old.generated_sql);
+        INSERT INTO queryhistory_fts(rowid, original_prompt, generated_sql)
+        VALUES (new.id, new.original_prompt, new.generated_sql);
+    END""",
+]
+
+
+def upgrade() -> None:
+    op.create_index('ix_queryhistory_db_executed', 'queryhistory', ['user_database_id', 'executed_at'])
+    if op.get_bind().dialect.name == 'sqlite':
+        for stmt in FTS_DDL:
+            op.execute(stmt)
+        op.execute("INSERT INTO queryhistory_fts(queryhistory_fts) VALUES ('rebuild')")
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name == 'sqlite':
+        for trigger in ('queryhistory_fts_ai', 'queryhistory_fts_ad', 'queryhistory_fts_au'):
+            op.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+        op.execute("DROP TABLE IF EXISTS queryhistory_fts")
+    op.drop_index('ix_queryhistory_db_executed', table_name='queryhistory')
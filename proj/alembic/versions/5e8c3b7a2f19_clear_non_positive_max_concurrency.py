@@ -0,0 +1,26 @@
+"""clear non-positive max_concurrency
+
+Revision ID: 5e8c3b7a2f19
+Revises: d6b2f8a4c1e7
+Create Date: 2026-10-17 21:05:42.318204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5e8c3b7a2f19'
+down_revision: Union[str, None] = 'd6b2f8a4c1e7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Values below 1 were accepted before validation and break the database's concurrency slot
+    op.execute("UPDATE userdatabase SET max_concurrency = NULL WHERE max_concurrency < 1")
+
+
+def downgrade() -> None:
+    pass
@@ -0,0 +1,27 @@
+"""add max_concurrency to userdatabase
+
+Revision ID: 99bc6b83386d
+Revises: 25b3e40c76f1
+Create Date: 2026-10-17 19:20:11.204518
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '99bc6b83386d'
+down_revision: Union[str, None] = '25b3e40c76f1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('userdatabase', sa.Column('max_concurrency', sa.Integer(), nullable=True))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('userdatabase') as batch_op:
+        batch_op.drop_column('max_concurrency')
@@ -0,0 +1,27 @@
+"""add result cache ttl to userdatabase
+
+Revision ID: a8d4e2f1c9b6
+Revises: f3a9c1e7b2d4
+Create Date: 2026-10-18 00:07:31.662054
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a8d4e2f1c9b6'
+down_revision: Union[str, None] = 'f3a9c1e7b2d4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('userdatabase', sa.Column('result_cache_ttl_seconds', sa.Integer(), nullable=True))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('userdatabase') as batch_op:
+        batch_op.drop_column('result_cache_ttl_seconds')
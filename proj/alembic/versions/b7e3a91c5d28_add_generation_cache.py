@@ -0,0 +1,44 @@
+"""add generation cache
+
+Revision ID: b7e3a91c5d28
+Revises: 4f1d2c7e9a30
+Create Date: 2026-10-17 20:05:44.810263
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7e3a91c5d28'
+down_revision: Union[str, None] = '4f1d2c7e9a30'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'generationcache',
+        sa.Column('cache_key', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column('user_database_id', sa.Integer(), nullable=False),
+        sa.Column('model_name', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column('schema_fingerprint', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column('normalized_prompt', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column('generated_sql', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column('hit_count', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('last_used_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['user_database_id'], ['userdatabase.id']),
+        sa.PrimaryKeyConstraint('cache_key'),
+    )
+    op.create_index(op.f('ix_generationcache_user_database_id'), 'generationcache', ['user_database_id'])
+    op.create_index(op.f('ix_generationcache_last_used_at'), 'generationcache', ['last_used_at'])
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_generationcache_last_used_at'), table_name='generationcache')
+    op.drop_index(op.f('ix_generationcache_user_database_id'), table_name='generationcache')
+    op.drop_table('generationcache')
@@ -0,0 +1,32 @@
+"""postgres full-text index for query history
+
+Revision ID: c4e1f7a2d9b3
+Revises: b7e3a91c5d28
+Create Date: 2026-10-17 21:05:43.118204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4e1f7a2d9b3'
+down_revision: Union[str, None] = 'b7e3a91c5d28'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # SQLite searches through the FTS5 table from 4f1d2c7e9a30; Postgres gets a GIN index instead
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute(
+            "CREATE INDEX IF NOT EXISTS ix_queryhistory_search ON queryhistory "
+            "USING gin (to_tsvector('simple', original_prompt || ' ' || generated_sql))"
+        )
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute("DROP INDEX IF EXISTS ix_queryhistory_search")
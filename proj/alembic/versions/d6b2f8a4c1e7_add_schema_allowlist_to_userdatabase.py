@@ -0,0 +1,27 @@
+"""add schema allowlist to userdatabase
+
+Revision ID: d6b2f8a4c1e7
+Revises: a8d4e2f1c9b6
+Create Date: 2026-10-18 02:41:09.318274
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd6b2f8a4c1e7'
+down_revision: Union[str, None] = 'a8d4e2f1c9b6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('userdatabase', sa.Column('schema_allowlist', sa.JSON(), nullable=True))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('userdatabase') as batch_op:
+        batch_op.drop_column('schema_allowlist')
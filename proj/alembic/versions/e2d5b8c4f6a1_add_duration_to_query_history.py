@@ -0,0 +1,27 @@
+"""add duration to query history
+
+Revision ID: e2d5b8c4f6a1
+Revises: c4e1f7a2d9b3
+Create Date: 2026-10-17 22:41:07.193552
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e2d5b8c4f6a1'
+down_revision: Union[str, None] = 'c4e1f7a2d9b3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('queryhistory', sa.Column('duration_ms', sa.Integer(), nullable=True))
+
+
+def downgrade() -> None:
+    # Not batch mode: recreating the table would drop the queryhistory_fts triggers (needs SQLite 3.35+)
+    op.drop_column('queryhistory', 'duration_ms')
@@ -0,0 +1,38 @@
+"""add execution limits to userdatabase
+
+Revision ID: f3a9c1e7b2d4
+Revises: e2d5b8c4f6a1
+Create Date: 2026-10-17 23:12:48.540117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f3a9c1e7b2d4'
+down_revision: Union[str, None] = 'e2d5b8c4f6a1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('userdatabase', sa.Column('statement_timeout_ms', sa.Integer(), nullable=True))
+    op.add_column('userdatabase', sa.Column('lock_timeout_ms', sa.Integer(), nullable=True))
+    op.add_column('userdatabase', sa.Column('read_only', sa.Boolean(), nullable=True))
+    op.add_column('userdatabase', sa.Column('max_plan_cost', sa.Float(), nullable=True))
+    op.add_column('userdatabase', sa.Column('max_plan_rows', sa.Integer(), nullable=True))
+    op.add_column('userdatabase', sa.Column('plan_guard_mode', sqlmodel.sql.sqltypes.AutoString(), nullable=True))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('userdatabase') as batch_op:
+        batch_op.drop_column('plan_guard_mode')
+        batch_op.drop_column('max_plan_rows')
+        batch_op.drop_column('max_plan_cost')
+        batch_op.drop_column('read_only')
+        batch_op.drop_column('lock_timeout_ms')
+        batch_op.drop_column('statement_timeout_ms')
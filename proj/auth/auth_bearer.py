@@ -1,7 +1,7 @@
 from fastapi import Request, HTTPException
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from jose import JWTError
-from .auth_handler import decode_token
+from .auth_handler import decode_token_cached
 
 class JWTBearer(HTTPBearer):
     def __init__(self, auto_error: bool = True):
@@ -11,9 +11,14 @@ class JWTBearer(HTTPBearer):
         credentials: HTTPAuthorizationCredentials = await super().__call__(request)
         if credentials:
             try:
-                payload = decode_token(credentials.credentials)
+                payload = decode_token_cached(credentials.credentials)
                 return payload
             except JWTError:
                 raise HTTPException(status_code=403, detail="Invalid token")
         raise HTTPException(status_code=403, detail="Invalid authorization code")
 
+
+
+# One shared instance: FastAPI caches a dependency's result per request by identity, so every
+# route and sub-dependency using jwt_bearer shares a single decode
+jwt_bearer = JWTBearer()
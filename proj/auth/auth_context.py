@@ -0,0 +1,37 @@
+from typing import Dict, List, Optional
+from fastapi import Depends
+from sqlmodel import Session
+from models.db_model import UserDatabase
+from auth.auth_bearer import jwt_bearer
+from crud.db_crud import get_user_databases
+from database import get_session
+from utils.ownership_cache import ownership_cache
+from utils.concurrency import run_blocking
+
+
+class AuthContext:
+    """The authenticated user of one request, with cached access to the databases they own"""
+
+    def __init__(self, payload: dict, session: Session):
+        self.payload = payload
+        self.user_id = int(payload["sub"])
+        self.session = session
+
+    async def _databases(self) -> Dict[int, UserDatabase]:
+        databases = ownership_cache.peek(self.user_id)
+        if databases is None:
+            generation = ownership_cache.generation(self.user_id)
+            loaded = await run_blocking(get_user_databases, self.session, self.user_id)
+            databases = ownership_cache.store(self.user_id, loaded, generation)
+        return databases
+
+    async def databases(self) -> List[UserDatabase]:
+        return list((await self._databases()).values())
+
+    async def database(self, db_id: int) -> Optional[UserDatabase]:
+        """The user's database with this id, or None if it does not exist or belongs to someone else"""
+        return (await self._databases()).get(db_id)
+
+
+async def get_auth_context(payload: dict = Depends(jwt_bearer), session: Session = Depends(get_session)) -> AuthContext:
+    return AuthContext(payload, session)
@@ -1,3 +1,6 @@
+import time
+import threading
+from collections import OrderedDict
 from datetime import datetime, timedelta
 from jose import jwt
 from passlib.context import CryptContext
@@ -9,8 +12,12 @@ load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), "..", ".env"))
 SECRET_KEY = os.getenv("JWT_SECRET_KEY")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60
+# bcrypt cost factor for new hashes; existing hashes with another cost are rehashed on the next login
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+# Decoded tokens kept in memory so repeated requests with the same token skip signature verification
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "4096"))
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
 
 def create_access_token(data: dict):
     to_encode = data.copy()
@@ -21,9 +28,37 @@ def create_access_token(data: dict):
 def decode_token(token: str):
     return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
 
+# token -> (payload, exp as unix time)
+_token_cache: "OrderedDict[str, tuple]" = OrderedDict()
+_token_cache_lock = threading.Lock()
+
+def decode_token_cached(token: str):
+    """decode_token with an in-memory cache of verified tokens; entries stop being served at the token's exp"""
+    with _token_cache_lock:
+        cached = _token_cache.get(token)
+        if cached is not None:
+            payload, expires_at = cached
+            if time.time() < expires_at:
+                _token_cache.move_to_end(token)
+                return payload
+            del _token_cache[token]
+
+    # Raises JWTError for invalid or expired tokens; those are never cached
+    payload = decode_token(token)
+    if "exp" in payload:
+        with _token_cache_lock:
+            _token_cache[token] = (payload, float(payload["exp"]))
+            while len(_token_cache) > TOKEN_CACHE_SIZE:
+                _token_cache.popitem(last=False)
+    return payload
+
 def hash_password(password: str):
     return pwd_context.hash(password)
 
 def verify_password(plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
 
+def verify_and_update_password(plain_password, hashed_password):
+    """Returns (valid, new_hash); new_hash is set when the stored hash uses outdated settings"""
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
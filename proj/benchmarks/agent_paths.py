@@ -0,0 +1,417 @@
+"""
+Agent path benchmark suite.
+
+Builds synthetic schemas in a local PostgreSQL server, replaces Gemini with a deterministic
+FakeProvider (utils.llm), and measures:
+
+- phases: the building blocks called directly (introspection steps, _gather_schema_structure,
+  prompt building, format_db_structure_for_visualization, execute_query)
+- endpoints: /agent/* requests with the given concurrency, against the app running in this
+  process (no network; client and server share the CPU), plus the server-side phase timings
+  recorded in utils.metrics while they ran
+
+Scenarios (databases named speakql_bench_<scenario>, created on first use and reused after):
+
+- tables-10 / tables-100 / tables-1000: that many tables of 8 columns, chained by foreign keys
+- wide:  20 tables of 300 columns
+- large: 4 tables of --large-rows rows each
+
+Results are printed (or written to --output) as JSON with p50/p90/p95/p99 per measurement;
+--baseline adds the ratio to an earlier run's output.
+
+    python benchmarks/agent_paths.py --pg-url postgresql://postgres@localhost:5432/postgres \\
+        --scenarios tables-10,tables-100 --requests 200 --concurrency 16 --output run.json
+"""
+import os
+import re
+import sys
+import json
+import time
+import asyncio
+import argparse
+import platform
+import statistics
+import subprocess
+import tempfile
+from datetime import datetime, timezone
+from urllib.parse import urlsplit, urlunsplit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from sqlalchemy import create_engine, text  # noqa: E402
+
+SCENARIOS = {
+    "tables-10": {"tables": 10, "columns": 8, "rows": 100},
+    "tables-100": {"tables": 100, "columns": 8, "rows": 100},
+    "tables-1000": {"tables": 1000, "columns": 8, "rows": 20},
+    "wide": {"tables": 20, "columns": 300, "rows": 100},
+    "large": {"tables": 4, "columns": 8, "rows": None},
+}
+
+# Column type -> value expression over the generate_series counter g
+COLUMN_TYPES = [
+    ("text", "'name ' || g"),
+    ("integer", "g % 1000"),
+    ("numeric(12,2)", "(g % 100000) / 100.0"),
+    ("timestamptz", "timestamptz '2024-01-01' + g * interval '1 minute'"),
+    ("boolean", "g % 2 = 0"),
+    ("jsonb", "jsonb_build_object('k', g, 'tag', 'x' || (g % 7))"),
+    ("varchar(32)", "'code-' || (g % 50)"),
+]
+
+ENDPOINTS = ("schema_tables", "visualize_schema", "generate_sql", "generate_sql_cached", "generate_sql_stream",
+             "execute_sql", "execute_sql_stream")
+
+_CREATE_TABLE = re.compile(r'CREATE TABLE "?(\w+)"?')
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, round(pct / 100 * len(values)) - 1))
+    return round(values[index] * 1000, 3)
+
+
+def summarize(latencies, wall=None):
+    summary = {
+        "count": len(latencies),
+        "p50_ms": percentile(latencies, 50),
+        "p90_ms": percentile(latencies, 90),
+        "p95_ms": percentile(latencies, 95),
+        "p99_ms": percentile(latencies, 99),
+        "max_ms": round(max(latencies) * 1000, 2) if latencies else None,
+        "mean_ms": round(statistics.mean(latencies) * 1000, 2) if latencies else None,
+    }
+    if wall:
+        summary["per_second"] = round(len(latencies) / wall, 1)
+    return summary
+
+
+# ----------- Synthetic schemas -----------
+
+def database_url(pg_url: str, db_name: str = None) -> str:
+    """pg_url pointed at another database (its own database when db_name is None)"""
+    parts = urlsplit(pg_url)
+    scheme = "postgresql+psycopg2" if parts.scheme in ("postgres", "postgresql") else parts.scheme
+    return urlunsplit((scheme, parts.netloc, "/" + (db_name or parts.path.lstrip("/") or "postgres"), "", ""))
+
+
+def table_ddl(index: int, columns: int):
+    name = f"t{index:04d}"
+    definitions = ["id integer PRIMARY KEY"]
+    values = ["g"]
+    if index > 0:
+        definitions.append(f"parent_id integer REFERENCES t{index - 1:04d}(id)")
+        values.append("g")
+    for position in range(columns - len(definitions)):
+        column_type, expression = COLUMN_TYPES[position % len(COLUMN_TYPES)]
+        definitions.append(f"c{position:03d} {column_type}")
+        values.append(expression)
+    return name, f"CREATE TABLE {name} ({', '.join(definitions)})", ", ".join(values)
+
+
+def ensure_scenario(pg_url: str, scenario: str, spec: dict, recreate: bool) -> dict:
+    """Create the scenario's database unless one built from the same spec exists; returns its setup time"""
+    db_name = f"speakql_bench_{scenario.replace('-', '_')}"
+    marker = json.dumps(spec, sort_keys=True)
+    admin = create_engine(database_url(pg_url), isolation_level="AUTOCOMMIT")
+    started = time.perf_counter()
+    with admin.connect() as conn:
+        existing = conn.execute(
+            text("SELECT shobj_description(oid, 'pg_database') FROM pg_database WHERE datname = :name"), {"name": db_name}
+        ).first()
+        if existing is not None and existing[0] == marker and not recreate:
+            admin.dispose()
+            return {"database": db_name, "created": False, "setup_seconds": 0.0}
+        if existing is not None:
+            conn.execute(text(f'DROP DATABASE "{db_name}" WITH (FORCE)'))
+        conn.execute(text(f'CREATE DATABASE "{db_name}"'))
+    admin.dispose()
+
+    engine = create_engine(database_url(pg_url, db_name))
+    with engine.begin() as conn:
+        for index in range(spec["tables"]):
+            name, ddl, values = table_ddl(index, spec["columns"])
+            conn.execute(text(ddl))
+            conn.execute(text(f"COMMENT ON TABLE {name} IS 'synthetic table {index} for benchmarks'"))
+            conn.execute(text(f"INSERT INTO {name} SELECT {values} FROM generate_series(1, {spec['rows']}) g"))
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text("ANALYZE"))
+    engine.dispose()
+
+    # Written last, so an interrupted setup is rebuilt on the next run
+    admin = create_engine(database_url(pg_url), isolation_level="AUTOCOMMIT")
+    with admin.connect() as conn:
+        conn.execute(text(f"COMMENT ON DATABASE \"{db_name}\" IS '{marker}'"))
+    admin.dispose()
+    return {"database": db_name, "created": True, "setup_seconds": round(time.perf_counter() - started, 2)}
+
+
+# ----------- Deterministic LLM stand-in -----------
+
+def stub_answer(prompt: str) -> str:
+    """A query on the first table of the prompt's schema context, fenced like Gemini's answers"""
+    match = _CREATE_TABLE.search(prompt)
+    table = match.group(1) if match else "t0000"
+    return f"```sql\nSELECT * FROM {table} LIMIT 10\n```"
+
+
+# ----------- Measurements -----------
+
+def time_phase(fn, repeats: int):
+    latencies = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - started)
+    return summarize(latencies)
+
+
+def run_phases(user_db, repeats: int) -> dict:
+    from utils.agent import DatabaseAgent
+    from utils.visualizer import format_db_structure_for_visualization
+
+    agent = DatabaseAgent(user_db=user_db, debug=False)
+    tools = agent.tools
+    snapshot = agent.get_schema_snapshot()
+    structure = snapshot.structure
+    first_table = sorted(structure["tables"])[0]
+    return {
+        "list_schemas": time_phase(tools.list_schemas, repeats),
+        "schema_directory": time_phase(tools.schema_directory, repeats),
+        "describe_schema": time_phase(lambda: tools.describe_schema("public"), repeats),
+        "count_table_rows": time_phase(lambda: tools.count_table_rows("public"), repeats),
+        "column_stats": time_phase(lambda: tools.column_stats("public"), repeats),
+        "preview_data": time_phase(lambda: tools.preview_data(first_table, limit=3), repeats),
+        "schema_fingerprint": time_phase(lambda: tools.schema_fingerprints(["public"]), repeats),
+        # Same keys as before per-schema snapshots, so earlier runs stay comparable as baselines
+        "gather_database_structure": time_phase(lambda: agent._gather_schema_structure("public"), repeats),
+        "build_prompt": time_phase(lambda: agent.build_prompt(f"list the newest rows of {first_table}", structure, snapshot.full_tokens), repeats),
+        "format_db_structure_for_visualization": time_phase(lambda: format_db_structure_for_visualization(structure), repeats),
+        "execute_query": time_phase(lambda: tools.execute_query(f"SELECT * FROM {first_table} LIMIT 1000"), repeats),
+    }
+
+
+def histogram_totals() -> dict:
+    """(metric, labels) -> [count, sum] of the server-side histograms in utils.metrics"""
+    from utils.metrics import registry
+
+    totals = {}
+    for family in registry.collect():
+        if family.type != "histogram" or family.name == "speakql_http_request_seconds":
+            continue
+        for sample in family.samples:
+            if sample.name.endswith(("_count", "_sum")):
+                labels = ",".join(f"{k}={v}" for k, v in sorted(sample.labels.items()))
+                totals.setdefault((family.name, labels), [0.0, 0.0])[sample.name.endswith("_sum")] = sample.value
+    return totals
+
+
+def histogram_delta(before: dict, after: dict) -> dict:
+    """Observations and their mean between two histogram_totals() calls"""
+    delta = {}
+    for (name, labels), (count, total) in after.items():
+        previous = before.get((name, labels), [0.0, 0.0])
+        observed = count - previous[0]
+        if not observed:
+            continue
+        mean = (total - previous[1]) / observed
+        key = f"{name}{{{labels}}}" if labels else name
+        if name.endswith("_seconds"):
+            delta[key] = {"count": int(observed), "mean_ms": round(mean * 1000, 2)}
+        else:
+            delta[key] = {"count": int(observed), "mean": round(mean, 1)}
+    return delta
+
+
+async def load(client, make_request, requests: int, concurrency: int, warmup: int) -> dict:
+    for i in range(warmup):
+        await make_request(client, i)
+    latencies = []
+    statuses = {}
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i):
+        async with semaphore:
+            started = time.perf_counter()
+            response = await make_request(client, i)
+            elapsed = time.perf_counter() - started
+        statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+        if response.status_code < 400:
+            latencies.append(elapsed)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    wall = time.perf_counter() - started
+    result = summarize(latencies, wall)
+    result["status_codes"] = {str(code): count for code, count in sorted(statuses.items())}
+    return result
+
+
+def endpoint_requests(db_id: int, tables: list, headers: dict) -> dict:
+    def post(path, body):
+        return lambda client, i: client.post(path, json=body(i), headers=headers)
+
+    def get(path):
+        return lambda client, i: client.get(path, headers=headers)
+
+    prompt = lambda i: f"show the latest rows of {tables[i % len(tables)]}"  # noqa: E731
+    return {
+        "schema_tables": get(f"/agent/schema/tables?db_id={db_id}"),
+        "visualize_schema": get(f"/agent/visualize-schema?db_id={db_id}"),
+        "generate_sql": post("/agent/generate-sql", lambda i: {"db_id": db_id, "prompt": prompt(i), "bypass_cache": True}),
+        "generate_sql_cached": post("/agent/generate-sql", lambda i: {"db_id": db_id, "prompt": prompt(i % 5)}),
+        "generate_sql_stream": post("/agent/generate-sql/stream", lambda i: {"db_id": db_id, "prompt": prompt(i), "bypass_cache": True}),
+        "execute_sql": post("/agent/execute-sql", lambda i: {"db_id": db_id, "raw_sql": f"SELECT * FROM {tables[i % len(tables)]} LIMIT 100"}),
+        "execute_sql_stream": post("/agent/execute-sql/stream", lambda i: {"db_id": db_id, "raw_sql": f"SELECT * FROM {tables[0]}", "max_rows": 10000}),
+    }
+
+
+async def run_endpoints(app_module, pg_url: str, database: str, args) -> tuple:
+    import httpx
+    from sqlmodel import Session
+    from database import engine as metadata_engine
+    from models.db_model import UserDatabase
+
+    parts = urlsplit(pg_url)
+    transport = httpx.ASGITransport(app=app_module.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        username = f"bench-{time.time_ns()}"
+        await client.post("/signup", json={"username": username, "password": "benchmark-password"})
+        token = (await client.post("/login", json={"username": username, "password": "benchmark-password"})).json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+        response = await client.post("/databases", headers=headers, json={
+            "host": parts.hostname or "localhost", "port": parts.port or 5432, "db_user": parts.username or "postgres",
+            "db_password": parts.password or "", "db_name": database, "max_concurrency": args.concurrency,
+        })
+        db_id = response.json()["db_id"]
+        with Session(metadata_engine) as session:
+            user_db = session.get(UserDatabase, db_id)
+            session.expunge(user_db)
+
+        tables = sorted(t["name"] for t in (await client.get(f"/agent/schema/tables?db_id={db_id}", headers=headers)).json()["tables"])
+
+        results = {}
+        before = histogram_totals()
+        if not args.only_phases:
+            selected = args.endpoints.split(",") if args.endpoints else None
+            for name, make_request in endpoint_requests(db_id, tables, headers).items():
+                if selected is None or name in selected:
+                    results[name] = await load(client, make_request, args.requests, args.concurrency, args.warmup)
+        server_phases = histogram_delta(before, histogram_totals())
+    return user_db, results, server_phases
+
+
+def compare(baseline: dict, report: dict) -> dict:
+    """p50/p95 of this run divided by the baseline's, per scenario and measurement (above 1 = slower)"""
+    previous = {s["scenario"]: s for s in baseline.get("scenarios", [])}
+    comparison = {}
+    for scenario in report["scenarios"]:
+        old = previous.get(scenario["scenario"])
+        if old is None:
+            continue
+        for section in ("phases", "endpoints"):
+            for name, summary in scenario.get(section, {}).items():
+                before = old.get(section, {}).get(name)
+                if not before:
+                    continue
+                comparison[f"{scenario['scenario']}/{section}/{name}"] = {
+                    f"{pct}_ratio": round(summary[f"{pct}_ms"] / before[f"{pct}_ms"], 3)
+                    if before.get(f"{pct}_ms") and summary.get(f"{pct}_ms") is not None else None
+                    for pct in ("p50", "p95")
+                }
+    return comparison
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(__file__), check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+async def run(args) -> dict:
+    # Settings are read at import time, so the app is imported only once the environment is prepared
+    import main as app_module
+    from utils.llm import llm_client, FakeProvider
+
+    llm_client.use(FakeProvider(answer=stub_answer, latency=args.llm_latency_ms / 1000, model_name="benchmark-stub"))
+
+    report = {
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "git_commit": git_commit(),
+        "python": platform.python_version(),
+        "cpu_count": os.cpu_count(),
+        "settings": {k: v for k, v in vars(args).items() if k not in ("pg_url", "output", "baseline")},
+        "scenarios": [],
+    }
+    engine = create_engine(database_url(args.pg_url))
+    with engine.connect() as conn:
+        report["postgres"] = conn.execute(text("SHOW server_version")).scalar()
+    engine.dispose()
+
+    async with app_module.lifespan(app_module.app):
+        for scenario in args.scenarios.split(","):
+            spec = dict(SCENARIOS[scenario])
+            if spec["rows"] is None:
+                spec["rows"] = args.large_rows
+            print(f"[{scenario}] preparing", file=sys.stderr)
+            setup = ensure_scenario(args.pg_url, scenario, spec, args.recreate)
+            print(f"[{scenario}] endpoints", file=sys.stderr)
+            user_db, endpoints, server_phases = await run_endpoints(app_module, args.pg_url, setup["database"], args)
+            print(f"[{scenario}] phases", file=sys.stderr)
+            phases = await asyncio.to_thread(run_phases, user_db, args.phase_repeats)
+            report["scenarios"].append({
+                "scenario": scenario, **spec, **setup,
+                "phases": phases,
+                "endpoints": endpoints,
+                "server_phases": server_phases,
+            })
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pg-url", default="postgresql://postgres@localhost:5432/postgres",
+                        help="server to create the benchmark databases on (needs CREATEDB)")
+    parser.add_argument("--scenarios", default="tables-10,tables-100,tables-1000,wide,large")
+    parser.add_argument("--large-rows", type=int, default=1_000_000)
+    parser.add_argument("--recreate", action="store_true", help="rebuild scenario databases even if they exist")
+    parser.add_argument("--requests", type=int, default=100, help="requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--warmup", type=int, default=3, help="unmeasured requests per endpoint")
+    parser.add_argument("--endpoints", help="comma-separated subset of: " + ", ".join(ENDPOINTS))
+    parser.add_argument("--only-phases", action="store_true", help="skip the endpoint load")
+    parser.add_argument("--phase-repeats", type=int, default=5)
+    parser.add_argument("--llm-latency-ms", type=float, default=0, help="simulated model latency")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    parser.add_argument("--baseline", help="earlier report to compare p50/p95 against")
+    args = parser.parse_args()
+    unknown = set(args.scenarios.split(",")) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Fresh metadata store and keys, so runs never touch the real db.sqlite3
+        os.environ["METADATA_DATABASE_URL"] = f"sqlite:///{os.path.join(tmp, 'metadata.sqlite3')}"
+        if not os.getenv("FERNET_KEY"):
+            from cryptography.fernet import Fernet
+            os.environ["FERNET_KEY"] = Fernet.generate_key().decode()
+        os.environ.setdefault("JWT_SECRET_KEY", "benchmark")
+        report = asyncio.run(run(args))
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            report["comparison"] = compare(json.load(f), report)
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Login throughput microbenchmark.
+
+Fires concurrent /login requests at a running server and, alongside them, probes a cheap
+authenticated endpoint (/me) to show how much a login burst slows down everything else.
+
+    python benchmarks/login_throughput.py --url http://localhost:8000 --requests 200 --concurrency 32
+"""
+import argparse
+import json
+import statistics
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, round(pct / 100 * len(values)) - 1))
+    return round(values[index] * 1000, 1)
+
+
+def summarize(latencies):
+    return {
+        "count": len(latencies),
+        "p50_ms": percentile(latencies, 50),
+        "p95_ms": percentile(latencies, 95),
+        "p99_ms": percentile(latencies, 99),
+        "mean_ms": round(statistics.mean(latencies) * 1000, 1) if latencies else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--requests", type=int, default=200, help="total login requests")
+    parser.add_argument("--concurrency", type=int, default=32, help="simultaneous login requests")
+    parser.add_argument("--probe-interval", type=float, default=0.05, help="seconds between /me probes")
+    args = parser.parse_args()
+
+    username, password = f"bench-{uuid.uuid4().hex[:8]}", "benchmark-password"
+    requests.post(f"{args.url}/signup", json={"username": username, "password": password}).raise_for_status()
+    token = requests.post(f"{args.url}/login", json={"username": username, "password": password}).json()["access_token"]
+
+    statuses = {}
+    login_latencies = []
+    probe_latencies = []
+    lock = threading.Lock()
+    done = threading.Event()
+
+    def login(_):
+        started = time.perf_counter()
+        response = requests.post(f"{args.url}/login", json={"username": username, "password": password})
+        elapsed = time.perf_counter() - started
+        with lock:
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+            if response.status_code == 200:
+                login_latencies.append(elapsed)
+
+    def probe():
+        headers = {"Authorization": f"Bearer {token}"}
+        while not done.is_set():
+            started = time.perf_counter()
+            requests.get(f"{args.url}/me", headers=headers)
+            probe_latencies.append(time.perf_counter() - started)
+            time.sleep(args.probe_interval)
+
+    prober = threading.Thread(target=probe, daemon=True)
+    prober.start()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        list(pool.map(login, range(args.requests)))
+    wall = time.perf_counter() - started
+    done.set()
+    prober.join()
+
+    print(json.dumps({
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "wall_seconds": round(wall, 2),
+        "logins_per_second": round(len(login_latencies) / wall, 1),
+        "status_codes": statuses,
+        "login_latency": summarize(login_latencies),
+        "probe_latency": summarize(probe_latencies),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
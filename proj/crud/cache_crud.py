@@ -0,0 +1,56 @@
+# cache_crud.py
+
+from datetime import datetime, timedelta
+from typing import Optional
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session, select, delete, func
+from models.cache_model import GenerationCache
+from utils.generation_cache import normalize_prompt, GENERATION_CACHE_TTL, GENERATION_CACHE_MAX_ENTRIES
+from utils.history_writer import history_writer
+
+
+def get_cached_generation(session: Session, cache_key: str, ttl: int = GENERATION_CACHE_TTL) -> Optional[GenerationCache]:
+    """Read-only on a hit: hit_count and last_used_at are updated in the background by the history writer"""
+    entry = session.get(GenerationCache, cache_key)
+    if not entry:
+        return None
+    now = datetime.utcnow()
+    if entry.created_at < now - timedelta(seconds=ttl):
+        session.delete(entry)
+        session.commit()
+        return None
+    history_writer.record_cache_hit(cache_key)
+    return entry
+
+
+def store_generation(session: Session, cache_key: str, db_id: int, prompt: str, schema_fingerprint: str,
+                     model_name: str, sql: str, max_entries: int = GENERATION_CACHE_MAX_ENTRIES) -> GenerationCache:
+    entry = session.get(GenerationCache, cache_key)
+    if entry is None:
+        entry = GenerationCache(cache_key=cache_key, user_database_id=db_id)
+    entry.model_name = model_name
+    entry.schema_fingerprint = schema_fingerprint
+    entry.normalized_prompt = normalize_prompt(prompt)
+    entry.generated_sql = sql
+    entry.created_at = entry.last_used_at = datetime.utcnow()
+    session.add(entry)
+    try:
+        session.commit()
+    except IntegrityError:
+        # A concurrent request stored the same key first; its answer is for the same question
+        session.rollback()
+        return session.get(GenerationCache, cache_key)
+    session.refresh(entry)
+
+    # Evict least recently used entries beyond the size bound
+    overflow = session.exec(select(func.count()).select_from(GenerationCache)).one() - max_entries
+    if overflow > 0:
+        oldest = select(GenerationCache.cache_key).order_by(GenerationCache.last_used_at).limit(overflow)
+        session.execute(delete(GenerationCache).where(GenerationCache.cache_key.in_(oldest)))
+        session.commit()
+    return entry
+
+
+def count_cached_generations(session: Session) -> int:
+    return session.exec(select(func.count()).select_from(GenerationCache)).one()
+
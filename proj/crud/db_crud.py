@@ -1,13 +1,34 @@
 # db_crud.py
 
-from sqlmodel import Session, select
+import re
+import base64
+from datetime import datetime
+from sqlmodel import Session, select, delete
+from sqlalchemy import or_, and_, text
 from models.db_model import UserDatabase
 from models.query_model import QueryHistory
+from models.cache_model import GenerationCache
 from utils.encryption import encrypt_password, decrypt_password
-from typing import List
+from utils.engine_registry import engine_registry
+from utils.schema_cache import schema_cache
+from utils.result_cache import result_cache
+from utils.concurrency import forget_database
+from utils.ownership_cache import ownership_cache
+from utils.prewarm import prewarm_scheduler
+from database import HISTORY_TSVECTOR
+from typing import List, Optional, Tuple
 from schemas.db_schemas import UserDatabaseCreate, UserDatabaseUpdate
 
 
+def _invalidate_connection_caches(db_id: int):
+    """Drop pooled connections and cached schema built from a database's old settings"""
+    engine_registry.invalidate(db_id)
+    schema_cache.invalidate(db_id)
+    result_cache.invalidate(db_id)
+    forget_database(db_id)
+    prewarm_scheduler.forget(db_id)
+
+
 def create_user_database(session: Session, user_id: int, data: UserDatabaseCreate):
     encrypted_pass = encrypt_password(data.db_password)
     user_db = UserDatabase(
@@ -16,11 +37,21 @@ def create_user_database(session: Session, user_id: int, data: UserDatabaseCreat
         port=data.port,
         db_user=data.db_user,
         db_password_encrypted=encrypted_pass,
-        db_name=data.db_name
+        db_name=data.db_name,
+        max_concurrency=data.max_concurrency,
+        statement_timeout_ms=data.statement_timeout_ms,
+        lock_timeout_ms=data.lock_timeout_ms,
+        read_only=data.read_only,
+        max_plan_cost=data.max_plan_cost,
+        max_plan_rows=data.max_plan_rows,
+        plan_guard_mode=data.plan_guard_mode,
+        result_cache_ttl_seconds=data.result_cache_ttl_seconds,
+        schema_allowlist=data.schema_allowlist
     )
     session.add(user_db)
     session.commit()
     session.refresh(user_db)
+    ownership_cache.invalidate(user_id)
     return user_db
 
 
@@ -47,6 +78,8 @@ def update_user_database(session: Session, db_id: int, user_id: int, updates: Us
     session.add(db)
     session.commit()
     session.refresh(db)
+    _invalidate_connection_caches(db_id)
+    ownership_cache.invalidate(user_id)
     return db
 
 
@@ -54,8 +87,11 @@ def delete_user_database(session: Session, db_id: int, user_id: int):
     db = session.get(UserDatabase, db_id)
     if not db or db.user_id != user_id:
         return False
+    session.execute(delete(GenerationCache).where(GenerationCache.user_database_id == db_id))
     session.delete(db)
     session.commit()
+    _invalidate_connection_caches(db_id)
+    ownership_cache.invalidate(user_id)
     return True
 
 def add_query_history(session: Session, db_id: int, prompt: str, sql: str, success: bool = True, error: str = None):
@@ -97,5 +133,89 @@ def delete_all_query_history_for_db(session: Session, db_id: int, user_id: int):
 
 def get_query_history_by_database(session: Session, db_id: int) -> List[QueryHistory]:
     return session.exec(
-        select(QueryHistory).where(QueryHistory.user_database_id == db_id)
+        select(QueryHistory)
+        .where(QueryHistory.user_database_id == db_id)
+        .order_by(QueryHistory.executed_at.desc(), QueryHistory.id.desc())
     ).all()
+
+
+def encode_history_cursor(history: QueryHistory) -> str:
+    raw = f"{history.executed_at.isoformat()}|{history.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_history_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Raises ValueError for cursors this API did not hand out"""
+    executed_at, history_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+    return datetime.fromisoformat(executed_at), int(history_id)
+
+
+def _fts_query(search: str) -> str:
+    """Quote every term so user input is never parsed as FTS5 syntax; the last term matches as a prefix"""
+    terms = ['"' + term.replace('"', '""') + '"' for term in search.split()]
+    if terms:
+        terms[-1] += "*"
+    return " ".join(terms)
+
+
+def _tsquery(search: str) -> str:
+    """Postgres counterpart of _fts_query: words only, AND-ed, the last one as a prefix"""
+    words = re.findall(r"\w+", search.lower())
+    if not words:
+        return ""
+    words[-1] += ":*"
+    return " & ".join(words)
+
+
+def get_query_history_page(
+    session: Session,
+    db_id: int,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    success: Optional[bool] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    search: Optional[str] = None,
+) -> Tuple[List[QueryHistory], Optional[str]]:
+    """
+    Newest-first page of a database's history using keyset pagination on (executed_at, id).
+
+    Returns:
+        tuple: (rows, cursor for the next page or None when this is the last page)
+    """
+    statement = select(QueryHistory).where(QueryHistory.user_database_id == db_id)
+
+    if cursor:
+        cursor_at, cursor_id = decode_history_cursor(cursor)
+        statement = statement.where(or_(
+            QueryHistory.executed_at < cursor_at,
+            and_(QueryHistory.executed_at == cursor_at, QueryHistory.id < cursor_id),
+        ))
+    if success is not None:
+        statement = statement.where(QueryHistory.success == success)
+    if since is not None:
+        statement = statement.where(QueryHistory.executed_at >= since)
+    if until is not None:
+        statement = statement.where(QueryHistory.executed_at < until)
+    if search and search.strip():
+        if session.get_bind().dialect.name == "sqlite":
+            statement = statement.where(QueryHistory.id.in_(
+                select(text("rowid")).select_from(text("queryhistory_fts"))
+                .where(text("queryhistory_fts MATCH :fts_query"))
+            )).params(fts_query=_fts_query(search))
+        elif session.get_bind().dialect.name == "postgresql" and _tsquery(search):
+            # Matches the expression of the ix_queryhistory_search GIN index
+            statement = statement.where(
+                text(f"{HISTORY_TSVECTOR} @@ to_tsquery('simple', :ts_query)")
+            ).params(ts_query=_tsquery(search))
+        else:
+            pattern = f"%{search.strip()}%"
+            statement = statement.where(or_(
+                QueryHistory.original_prompt.ilike(pattern),
+                QueryHistory.generated_sql.ilike(pattern),
+            ))
+
+    statement = statement.order_by(QueryHistory.executed_at.desc(), QueryHistory.id.desc()).limit(limit + 1)
+    rows = session.exec(statement).all()
+    next_cursor = encode_history_cursor(rows[limit - 1]) if len(rows) > limit else None
+    return rows[:limit], next_cursor
@@ -0,0 +1,25 @@
+# user_crud.py
+
+from typing import Optional
+from sqlmodel import Session, select
+from models.user_model import User
+
+
+def get_user_by_username(session: Session, username: str) -> Optional[User]:
+    return session.exec(select(User).where(User.username == username)).first()
+
+
+def create_user(session: Session, username: str, password_hash: str) -> User:
+    db_user = User(username=username, password_hash=password_hash)
+    session.add(db_user)
+    session.commit()
+    session.refresh(db_user)
+    return db_user
+
+
+def update_password_hash(session: Session, user_id: int, password_hash: str) -> None:
+    user = session.get(User, user_id)
+    if user:
+        user.password_hash = password_hash
+        session.add(user)
+        session.commit()
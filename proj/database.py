@@ -1,16 +1,193 @@
+import os
+from alembic import command
+from alembic.config import Config
 from sqlmodel import SQLModel, create_engine, Session
+from sqlalchemy import event, inspect, text
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlmodel.ext.asyncio.session import AsyncSession
+from dotenv import load_dotenv
+import models.user_model, models.db_model, models.query_model, models.cache_model  # register every table
 
-sqlite_file_name = "db.sqlite3"
-sqlite_url = f"sqlite:///{sqlite_file_name}"
 
-engine = create_engine(sqlite_url, echo=True)
+load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), ".env"))
 
+# Metadata store (users, saved connections, history, caches): SQLite by default, Postgres for multi-worker deployments
+METADATA_DATABASE_URL = os.getenv("METADATA_DATABASE_URL", "sqlite:///db.sqlite3")
+METADATA_DB_ECHO = os.getenv("METADATA_DB_ECHO", "false").lower() in ("1", "true", "yes")
+METADATA_DB_POOL_SIZE = int(os.getenv("METADATA_DB_POOL_SIZE", "10"))
+METADATA_DB_MAX_OVERFLOW = int(os.getenv("METADATA_DB_MAX_OVERFLOW", "20"))
+METADATA_DB_POOL_TIMEOUT = int(os.getenv("METADATA_DB_POOL_TIMEOUT", "30"))
+METADATA_DB_POOL_RECYCLE = int(os.getenv("METADATA_DB_POOL_RECYCLE", "1800"))
+# Run Alembic migrations (or create and stamp a fresh schema) on startup
+METADATA_AUTO_MIGRATE = os.getenv("METADATA_AUTO_MIGRATE", "true").lower() in ("1", "true", "yes")
 
-def init_db():
-    SQLModel.metadata.create_all(engine)
+# SQLite tuning, applied to every new connection
+SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", "20000"))
+
+# Drivers used by get_async_session for the same METADATA_DATABASE_URL
+ASYNC_DRIVERS = {"sqlite": "sqlite+aiosqlite", "postgresql": "postgresql+asyncpg"}
+
+
+def _sqlite_pragmas(journal_mode: str = SQLITE_JOURNAL_MODE):
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        # WAL lets readers proceed while a writer commits; NORMAL only fsyncs at checkpoints in WAL mode
+        cursor.execute(f"PRAGMA journal_mode={journal_mode}")
+        cursor.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+        cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+        cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+        cursor.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        cursor.close()
+    return on_connect
+
+
+def _engine_options(url: str) -> dict:
+    options = {"echo": METADATA_DB_ECHO}
+    if make_url(url).get_backend_name() == "sqlite" and ":memory:" in url:
+        return options
+    options.update(
+        pool_size=METADATA_DB_POOL_SIZE,
+        max_overflow=METADATA_DB_MAX_OVERFLOW,
+        pool_timeout=METADATA_DB_POOL_TIMEOUT,
+        pool_recycle=METADATA_DB_POOL_RECYCLE,
+        pool_pre_ping=make_url(url).get_backend_name() != "sqlite",
+    )
+    return options
+
+
+def create_metadata_engine(url: str = METADATA_DATABASE_URL, tune_sqlite: bool = True) -> Engine:
+    """
+    Engine for the metadata store.
+
+    Args:
+        url: SQLAlchemy URL (sqlite:///... or postgresql+psycopg2://...)
+        tune_sqlite: Apply the WAL/synchronous/busy_timeout/mmap pragmas to SQLite connections
+
+    Returns:
+        Engine: Pooled engine configured from the METADATA_DB_* settings
+    """
+    metadata_engine = create_engine(url, **_engine_options(url))
+    if metadata_engine.dialect.name == "sqlite" and tune_sqlite:
+        event.listen(metadata_engine, "connect", _sqlite_pragmas())
+    return metadata_engine
+
+
+engine = create_metadata_engine()
+
+# External-content FTS5 index over query history, kept in sync by triggers
+HISTORY_FTS_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS queryhistory_fts USING fts5(
+        original_prompt, generated_sql, content='queryhistory', content_rowid='id'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS queryhistory_fts_ai AFTER INSERT ON queryhistory BEGIN
+        INSERT INTO queryhistory_fts(rowid, original_prompt, generated_sql)
+        VALUES (new.id, new.original_prompt, new.generated_sql);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS queryhistory_fts_ad AFTER DELETE ON queryhistory BEGIN
+        INSERT INTO queryhistory_fts(queryhistory_fts, rowid, original_prompt, generated_sql)
+        VALUES ('delete', old.id, old.original_prompt, old.generated_sql);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS queryhistory_fts_au AFTER UPDATE ON queryhistory BEGIN
+        INSERT INTO queryhistory_fts(queryhistory_fts, rowid, original_prompt, generated_sql)
+        VALUES ('delete', old.id, old.original_prompt, old.generated_sql);
+        INSERT INTO queryhistory_fts(rowid, original_prompt, generated_sql)
+        VALUES (new.id, new.original_prompt, new.generated_sql);
+    END""",
+]
+
+# Postgres equivalent: a GIN index over the same tsvector expression the search query uses
+HISTORY_TSVECTOR = "to_tsvector('simple', original_prompt || ' ' || generated_sql)"
+HISTORY_GIN_DDL = f"CREATE INDEX IF NOT EXISTS ix_queryhistory_search ON queryhistory USING gin ({HISTORY_TSVECTOR})"
+
+
+def init_history_search(bind):
+    """Create the query history full-text index if missing, backfilling it from existing rows"""
+    if bind.dialect.name == "postgresql":
+        with bind.begin() as conn:
+            conn.execute(text(HISTORY_GIN_DDL))
+        return
+    if bind.dialect.name != "sqlite":
+        return
+    with bind.begin() as conn:
+        exists = conn.execute(
+            text("SELECT 1 FROM sqlite_master WHERE name = 'queryhistory_fts'")
+        ).first()
+        for stmt in HISTORY_FTS_DDL:
+            conn.execute(text(stmt))
+        if not exists:
+            conn.execute(text("INSERT INTO queryhistory_fts(queryhistory_fts) VALUES ('rebuild')"))
+
+
+def _alembic_config(connection):
+    # No ini file: alembic's fileConfig would otherwise reset the server's logging
+    cfg = Config()
+    cfg.set_main_option("script_location", os.path.join(os.path.dirname(__file__), "alembic"))
+    cfg.attributes["connection"] = connection
+    return cfg
+
+
+def init_db(bind: Engine = engine):
+    """
+    Bring the metadata schema up to date.
+
+    A database with an alembic_version table is upgraded to head. Anything else (a new
+    database, or one created by create_all before migrations ran at startup) gets the
+    current models plus the search index and is stamped at head.
+    """
+    with bind.connect() as conn:
+        versioned = "alembic_version" in inspect(conn).get_table_names()
+    if not versioned:
+        SQLModel.metadata.create_all(bind)
+        init_history_search(bind)
+    with bind.begin() as conn:
+        cfg = _alembic_config(conn)
+        if versioned:
+            command.upgrade(cfg, "head")
+        else:
+            command.stamp(cfg, "head")
 
 
 def get_session():
     with Session(engine) as session:
         yield session
 
+
+def async_database_url(url: str = METADATA_DATABASE_URL) -> str:
+    """METADATA_DATABASE_URL on its async driver; asyncpg takes libpq's sslmode as ssl"""
+    parsed = make_url(url)
+    parsed = parsed.set(drivername=ASYNC_DRIVERS[parsed.get_backend_name()])
+    if parsed.get_backend_name() == "postgresql" and "sslmode" in parsed.query:
+        parsed = parsed.update_query_dict({"ssl": parsed.query["sslmode"]}).difference_update_query(["sslmode"])
+    return parsed.render_as_string(hide_password=False)
+
+
+_async_engine = None
+
+
+def get_async_engine():
+    """Async engine over the same metadata store, created on first use so the async driver stays optional"""
+    global _async_engine
+    if _async_engine is None:
+        url = async_database_url()
+        _async_engine = create_async_engine(url, **_engine_options(url))
+        if _async_engine.dialect.name == "sqlite":
+            event.listen(_async_engine.sync_engine, "connect", _sqlite_pragmas())
+    return _async_engine
+
+
+async def get_async_session():
+    """FastAPI dependency yielding an AsyncSession, for routes that query the metadata store without a worker thread"""
+    async with AsyncSession(get_async_engine(), expire_on_commit=False) as session:
+        yield session
+
+
+async def dispose_engines():
+    engine.dispose()
+    if _async_engine is not None:
+        await _async_engine.dispose()
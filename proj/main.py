@@ -1,25 +1,60 @@
-from fastapi import FastAPI, Depends, HTTPException, status
+from contextlib import asynccontextmanager
+from datetime import datetime
+import hmac
+from fastapi import FastAPI, Depends, HTTPException, status, Query, Response, Header
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 from sqlmodel import Session, select
 from models.user_model import User
-from database import init_db, get_session
-from auth.auth_handler import create_access_token, hash_password, verify_password
-from auth.auth_bearer import JWTBearer
-from routers.agent_routes import router as agent_router
+from database import init_db, get_session, dispose_engines, METADATA_AUTO_MIGRATE
+from auth.auth_handler import create_access_token
+from auth.password_pool import password_hasher, PasswordPoolSaturated
+from auth.auth_bearer import jwt_bearer
+from auth.auth_context import AuthContext, get_auth_context
+from routers.agent_routes import router as agent_router, generate_sql_stream
+from utils.engine_registry import engine_registry
+from utils.concurrency import shutdown_executor, run_blocking
+from utils.history_writer import history_writer
+from utils.query_registry import query_registry
+from utils.prewarm import prewarm_scheduler
+from utils.metrics import MetricsMiddleware, render_metrics, METRICS_ENABLED, METRICS_TOKEN, METRICS_ALLOW_ANONYMOUS
+from utils.result_encoding import FastJSONResponse, RESPONSE_GZIP_ENABLED, RESPONSE_GZIP_MIN_BYTES
 from crud.db_crud import (
     create_user_database,
-    get_user_databases,
     update_user_database,
     delete_user_database,
-    get_query_history_by_database,
+    get_query_history_page,
 )
-from crud.db_crud import get_user_databases
+from crud.user_crud import get_user_by_username, create_user, update_password_hash
 
 from schemas.user_schemas import UserCreate, UserRead, UserLogin
 from schemas.db_schemas import UserDatabaseCreate, UserDatabaseUpdate, UserDatabaseRead
-from typing import List
+from typing import List, Optional
 from schemas.query_schemas import *
-app = FastAPI()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if METADATA_AUTO_MIGRATE:
+        init_db()
+    history_writer.start()
+    engine_registry.start_reaper()
+    prewarm_scheduler.start()
+    yield
+    prewarm_scheduler.shutdown()
+    # Queued history rows are written before the metadata engine goes away
+    history_writer.shutdown()
+    password_hasher.shutdown()
+    query_registry.shutdown()
+    shutdown_executor()
+    engine_registry.dispose_all()
+    await dispose_engines()
+
+
+app = FastAPI(lifespan=lifespan, default_response_class=FastJSONResponse)
+
+if RESPONSE_GZIP_ENABLED:
+    app.add_middleware(GZipMiddleware, minimum_size=RESPONSE_GZIP_MIN_BYTES)
 
 # CORS
 app.add_middleware(
@@ -28,39 +63,71 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag", "X-Query-Plan", "X-Query-Id"],
 )
+if METRICS_ENABLED:
+    # Outermost, so request timings include compression and CORS handling
+    app.add_middleware(MetricsMiddleware)
 app.include_router(agent_router, prefix="/agent", tags=["agent"])
-# Init DB
-init_db()
+# The React client's useChat hook streams from here
+app.add_api_route("/chat/stream", generate_sql_stream, methods=["POST"], tags=["agent"])
+
+# Route latencies, cache sizes and user/database counts are not public: no token, no endpoint
+if METRICS_ENABLED and (METRICS_TOKEN or METRICS_ALLOW_ANONYMOUS):
+    @app.get("/metrics", include_in_schema=False)
+    def metrics(authorization: Optional[str] = Header(None)):
+        """Prometheus exposition of this worker process's metrics"""
+        if METRICS_TOKEN and not hmac.compare_digest(authorization or "", f"Bearer {METRICS_TOKEN}"):
+            raise HTTPException(status_code=401, detail="Invalid metrics token")
+        body, content_type = render_metrics()
+        return Response(content=body, media_type=content_type)
 
 # ----------- Auth Routes -----------
 
+def _password_pool_busy():
+    return HTTPException(status_code=503, detail="Server busy, please retry", headers={"Retry-After": "1"})
+
+
 @app.post("/signup", response_model=UserRead)
-def signup(user: UserCreate, session: Session = Depends(get_session)):
-    existing = session.exec(select(User).where(User.username == user.username)).first()
+async def signup(user: UserCreate, session: Session = Depends(get_session)):
+    existing = await run_blocking(get_user_by_username, session, user.username)
     if existing:
         raise HTTPException(status_code=400, detail="Username already exists")
 
-    hashed_pw = hash_password(user.password)
-    db_user = User(username=user.username, password_hash=hashed_pw)
-    session.add(db_user)
-    session.commit()
-    session.refresh(db_user)
-    return db_user
+    # bcrypt runs on its own process pool so a burst of signups/logins cannot stall other requests
+    try:
+        hashed_pw = await password_hasher.hash(user.password)
+    except PasswordPoolSaturated:
+        raise _password_pool_busy()
+    return await run_blocking(create_user, session, user.username, hashed_pw)
 
 
 @app.post("/login")
-def login(credentials: UserLogin, session: Session = Depends(get_session)):
-    user = session.exec(select(User).where(User.username == credentials.username)).first()
-    if not user or not verify_password(credentials.password, user.password_hash):
+async def login(credentials: UserLogin, session: Session = Depends(get_session)):
+    user = await run_blocking(get_user_by_username, session, credentials.username)
+    if not user:
+        raise HTTPException(status_code=401, detail="Invalid credentials")
+    try:
+        valid, new_hash = await password_hasher.verify_and_update(credentials.password, user.password_hash)
+    except PasswordPoolSaturated:
+        raise _password_pool_busy()
+    if not valid:
         raise HTTPException(status_code=401, detail="Invalid credentials")
+    if new_hash:
+        # Stored hash predates the current BCRYPT_ROUNDS
+        await run_blocking(update_password_hash, session, user.id, new_hash)
 
     token = create_access_token({"sub": str(user.id)})
+    if prewarm_scheduler.enabled:
+        # Introspect the user's databases in the background before their first question; this
+        # also loads the ownership cache their next request reads
+        databases = await AuthContext({"sub": str(user.id)}, session).databases()
+        prewarm_scheduler.submit_user(user.id, databases)
     return {"access_token": token}
 
 
-@app.get("/me", dependencies=[Depends(JWTBearer())])
-def read_current_user(token_data: dict = Depends(JWTBearer()), session: Session = Depends(get_session)):
+@app.get("/me")
+def read_current_user(token_data: dict = Depends(jwt_bearer), session: Session = Depends(get_session)):
     user_id = int(token_data["sub"])
     user = session.get(User, user_id)
     if not user:
@@ -69,32 +136,29 @@ def read_current_user(token_data: dict = Depends(JWTBearer()), session: Session
 
 
 
-@app.post("/databases", dependencies=[Depends(JWTBearer())])
+@app.post("/databases")
 def add_db(
     db_data: UserDatabaseCreate,
     session: Session = Depends(get_session),
-    token_data: dict = Depends(JWTBearer())
+    token_data: dict = Depends(jwt_bearer)
 ):
     user_id = int(token_data["sub"])
     db = create_user_database(session, user_id, db_data)
-    return {"msg": "Database added successfully", "db_id": db.id}
+    job = prewarm_scheduler.submit(db, "created")
+    return {"msg": "Database added successfully", "db_id": db.id, "prewarm_job_id": job.id if job else None}
 
 
-@app.get("/get_databases", response_model=list[UserDatabaseRead], dependencies=[Depends(JWTBearer())])
-def get_dbs(
-    session: Session = Depends(get_session),
-    token_data: dict = Depends(JWTBearer())
-):
-    user_id = int(token_data["sub"])
-    return get_user_databases(session, user_id)
+@app.get("/get_databases", response_model=list[UserDatabaseRead])
+async def get_dbs(auth: AuthContext = Depends(get_auth_context)):
+    return await auth.databases()
 
 
-@app.put("/databases/{db_id}", dependencies=[Depends(JWTBearer())])
+@app.put("/databases/{db_id}")
 def update_db(
     db_id: int,
     updates: UserDatabaseUpdate,
     session: Session = Depends(get_session),
-    token_data: dict = Depends(JWTBearer())
+    token_data: dict = Depends(jwt_bearer)
 ):
     user_id = int(token_data["sub"])
     updated = update_user_database(session, db_id, user_id, updates)
@@ -103,11 +167,11 @@ def update_db(
     return {"msg": "Database updated", "db_id": updated.id}
 
 
-@app.delete("/databases/{db_id}", dependencies=[Depends(JWTBearer())])
+@app.delete("/databases/{db_id}")
 def delete_db(
     db_id: int,
     session: Session = Depends(get_session),
-    token_data: dict = Depends(JWTBearer())
+    token_data: dict = Depends(jwt_bearer)
 ):
     user_id = int(token_data["sub"])
     success = delete_user_database(session, db_id, user_id)
@@ -115,20 +179,33 @@ def delete_db(
         raise HTTPException(status_code=404, detail="Database not found or unauthorized")
     return {"msg": "Database deleted successfully"}
 
-@app.get("/query-history/{db_id}", response_model=List[QueryHistoryRead], dependencies=[Depends(JWTBearer())])
-def get_query_history(
+@app.get("/query-history/{db_id}", response_model=List[QueryHistoryRead])
+async def get_query_history(
     db_id: int,
+    response: Response,
+    limit: int = Query(100, ge=1, le=500),
+    cursor: Optional[str] = None,
+    success: Optional[bool] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    q: Optional[str] = None,
     session: Session = Depends(get_session),
-    token_data: dict = Depends(JWTBearer())
+    auth: AuthContext = Depends(get_auth_context)
 ):
-    user_id = int(token_data["sub"])
-
+    """Newest-first history page; pass the X-Next-Cursor response header back as `cursor` for the next page."""
     # Ensure user has access to the database
-    user_dbs = get_user_databases(session, user_id)
-    if not any(db.id == db_id for db in user_dbs):
+    if not await auth.database(db_id):
         raise HTTPException(status_code=403, detail="Forbidden: Database not accessible")
 
-    query_history = get_query_history_by_database(session, db_id)
+    try:
+        query_history, next_cursor = await run_blocking(
+            get_query_history_page,
+            session, db_id, limit=limit, cursor=cursor, success=success, since=since, until=until, search=q
+        )
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     return [QueryHistoryRead.model_validate(qh) for qh in query_history]
 
 
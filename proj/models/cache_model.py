@@ -0,0 +1,14 @@
+from sqlmodel import SQLModel, Field
+from datetime import datetime
+
+
+class GenerationCache(SQLModel, table=True):
+    cache_key: str = Field(primary_key=True)  # sha256 of database, model, schema fingerprint and normalized prompt
+    user_database_id: int = Field(foreign_key="userdatabase.id", index=True)
+    model_name: str
+    schema_fingerprint: str
+    normalized_prompt: str
+    generated_sql: str
+    hit_count: int = 0
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    last_used_at: datetime = Field(default_factory=datetime.utcnow, index=True)
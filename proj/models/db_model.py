@@ -1,4 +1,5 @@
 from sqlmodel import SQLModel, Field, Relationship
+from sqlalchemy import Column, JSON
 from typing import Optional, List
 from datetime import datetime
 
@@ -11,6 +12,17 @@ class UserDatabase(SQLModel, table=True):
     db_user: Optional[str] = None
     db_password_encrypted: str
     db_name: str
+    max_concurrency: Optional[int] = None  # Simultaneous operations allowed against this database
+    # Execution limits; None falls back to the server defaults in utils/query_guard.py
+    statement_timeout_ms: Optional[int] = None
+    lock_timeout_ms: Optional[int] = None
+    read_only: Optional[bool] = None
+    max_plan_cost: Optional[float] = None
+    max_plan_rows: Optional[int] = None
+    plan_guard_mode: Optional[str] = None  # "reject", "warn" or "off"
+    result_cache_ttl_seconds: Optional[int] = None  # Seconds read-only results are cached; 0 disables, None uses the default
+    # Schemas the agent may introspect, loaded by default in this order; None allows all and loads "public"
+    schema_allowlist: Optional[List[str]] = Field(default=None, sa_column=Column(JSON))
     created_at: datetime = Field(default_factory=datetime.utcnow)
 
     owner: "User" = Relationship(back_populates="databases")
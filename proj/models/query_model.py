@@ -1,15 +1,20 @@
 from sqlmodel import SQLModel, Field, Relationship
+from sqlalchemy import Index
 from typing import Optional
 from datetime import datetime
 
 
 class QueryHistory(SQLModel, table=True):
+    # Serves the per-database, newest-first keyset pagination of /query-history
+    __table_args__ = (Index("ix_queryhistory_db_executed", "user_database_id", "executed_at"),)
+
     id: Optional[int] = Field(default=None, primary_key=True)
     user_database_id: int = Field(foreign_key="userdatabase.id")
     original_prompt: str
     generated_sql: str
     success: bool = True
     error_message: Optional[str] = None
+    duration_ms: Optional[int] = None
     executed_at: datetime = Field(default_factory=datetime.utcnow)
 
     database: "UserDatabase" = Relationship(
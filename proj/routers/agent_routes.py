@@ -1,74 +1,496 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+import time
+import json
+import asyncio
+import anyio
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, status, Header, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
 from sqlalchemy.orm import Session
-from models.user_model import User
-from schemas.agent_schemas import GenerateSQLRequest, GenerateSQLResponse, ExecuteSQLRequest, ExecuteSQLResponse
-from crud.db_crud import get_user_databases,add_query_history
+from schemas.agent_schemas import GenerateSQLRequest, GenerateSQLResponse, ExecuteSQLRequest, ExecuteSQLResponse, StreamSQLRequest
+from crud.cache_crud import get_cached_generation, store_generation, count_cached_generations
 
-from utils.agent import DatabaseAgent  
-from auth.auth_bearer import JWTBearer
+from utils.agent import DatabaseAgent
+from auth.auth_context import AuthContext, get_auth_context
 from database import get_session
-from utils.visualizer import get_db_structure_json
+from utils.visualizer import (
+    format_db_structure_for_visualization,
+    list_tables_for_visualization,
+    table_detail_for_visualization,
+    table_sample_for_visualization,
+)
+from utils.schema_cache import schema_cache
+from utils.schema_scope import SchemaNotAllowed, allowed_schemas, resolve_schemas
+from utils.concurrency import run_blocking, run_against_database, database_slot, BlockingIterator
+from utils.result_stream import QueryStream, StreamEncoder
+from utils.generation_cache import make_cache_key, generation_cache_stats
+from utils.sse import sse_event, SSE_HEADERS
+from utils.result_encoding import FastJSONResponse
+from utils.history_writer import history_writer
+from utils.query_guard import ExecutionPolicy, PlanRejected
+from utils.query_registry import RunningQuery, query_registry, QUERY_DISCONNECT_POLL_SECONDS
+from utils.result_cache import result_cache, result_cache_ttl, make_result_key, is_read_only_candidate
+from utils.metrics import observe_execution
+from utils.llm import LLMBusy
+from utils.prewarm import prewarm_scheduler
 router = APIRouter()
 
+# Every blocking step (SQLite session, customer database, Gemini) runs on the bounded worker pool;
+# work against a customer database additionally holds one of that database's concurrency slots.
+
+
+def _elapsed_ms(started: float) -> int:
+    return int((time.perf_counter() - started) * 1000)
+
+
+async def _until_disconnect(http_request: Request, running: RunningQuery, awaitable):
+    """
+    Await a step of a registered query, cancelling it on the database if the client disconnects
+    (or this request is cancelled) in the meantime. After a cancel the step still runs to its
+    end, which is then the database's "canceling statement" error.
+    """
+    task = asyncio.ensure_future(awaitable)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=QUERY_DISCONNECT_POLL_SECONDS)
+            if done:
+                return task.result()
+            if await http_request.is_disconnected():
+                await asyncio.wrap_future(query_registry.cancel_soon(running))
+                return await task
+    except asyncio.CancelledError:
+        query_registry.cancel_soon(running)
+        # Nobody awaits the step any more; retrieve its (cancellation) error so it is not logged as lost
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        raise
+
+
+def _outcome(running: RunningQuery, failed: bool) -> str:
+    if not failed:
+        return "success"
+    return "cancelled" if running.cancel_requested else "error"
+
+
+def _plan_rejected(e: PlanRejected) -> HTTPException:
+    return HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail={"message": str(e), "plan": e.plan})
+
 @router.post("/generate-sql", response_model=GenerateSQLResponse)
-async def generate_sql(request: GenerateSQLRequest, session: Session = Depends(get_session), user: User = Depends(JWTBearer())):
+async def generate_sql(request: GenerateSQLRequest, session: Session = Depends(get_session), auth: AuthContext = Depends(get_auth_context)):
     """Generate SQL based on user's request and the database structure."""
-    user_id = int(user['sub'])
-    user_databases = get_user_databases(session, user_id)
-
-       
-    user_db = next((db for db in user_databases if db.id == request.db_id), None)
+    user_db = await auth.database(request.db_id)
     if not user_db:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Database not found")
-    
 
-    agent = DatabaseAgent(user_db=user_db,debug=True)
-    sql = agent.process_request(request.prompt)
-    
+
+    agent = await run_blocking(DatabaseAgent, user_db=user_db)
+    try:
+        snapshot = await run_against_database(user_db, agent.get_schema_snapshot, request.schemas, request.prompt)
+    except SchemaNotAllowed as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    prewarm_scheduler.touch(user_db, snapshot.loaded_schemas)
+
+    # Same question against an unchanged schema and model: reuse the earlier answer
+    cache_key = make_cache_key(user_db.id, request.prompt, snapshot.fingerprint, agent.model_name)
+    if request.bypass_cache:
+        generation_cache_stats.record("bypassed")
+    else:
+        cached = await run_blocking(get_cached_generation, session, cache_key)
+        generation_cache_stats.record("hits" if cached else "misses")
+        if cached:
+            return GenerateSQLResponse(raw_sql=cached.generated_sql, confirmation_required=True, message="Do you want to execute this SQL?", cached=True)
+
+    try:
+        sql = await run_blocking(agent.process_request, request.prompt, snapshot.structure, snapshot.full_tokens)
+    except LLMBusy as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e), headers={"Retry-After": "1"})
+
     if not sql:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Failed to generate SQL")
-    
+
+    await run_blocking(store_generation, session, cache_key, user_db.id, request.prompt, snapshot.fingerprint, agent.model_name, sql)
 
     return GenerateSQLResponse(raw_sql=sql, confirmation_required=True, message="Do you want to execute this SQL?")
+
+
+@router.post("/generate-sql/stream")
+async def generate_sql_stream(request: GenerateSQLRequest, session: Session = Depends(get_session), auth: AuthContext = Depends(get_auth_context)):
+    """
+    Generate SQL like /generate-sql, but as server-sent events.
+
+    Emits "progress" events (introspecting schema, schema cached, prompt sent), then one
+    "token" event per chunk of model output, and finally an "sql" event carrying the
+    cleaned SQL. Failures after the stream has started arrive as an "error" event.
+    """
+    user_db = await auth.database(request.db_id)
+    if not user_db:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Database not found")
+
+    async def events():
+        try:
+            yield sse_event("progress", {"stage": "introspecting schema"})
+            agent = await run_blocking(DatabaseAgent, user_db=user_db)
+            snapshot = await run_against_database(user_db, agent.get_schema_snapshot, request.schemas, request.prompt)
+            prewarm_scheduler.touch(user_db, snapshot.loaded_schemas)
+            yield sse_event("progress", {"stage": "schema cached", "fingerprint": snapshot.fingerprint,
+                                         "schemas": snapshot.loaded_schemas, "reused": not snapshot.rebuilt})
+
+            cache_key = make_cache_key(user_db.id, request.prompt, snapshot.fingerprint, agent.model_name)
+            if request.bypass_cache:
+                generation_cache_stats.record("bypassed")
+            else:
+                cached = await run_blocking(get_cached_generation, session, cache_key)
+                generation_cache_stats.record("hits" if cached else "misses")
+                if cached:
+                    yield sse_event("sql", {"raw_sql": cached.generated_sql, "confirmation_required": True, "cached": True})
+                    return
+
+            final_prompt = await run_blocking(agent.build_prompt, request.prompt, snapshot.structure, snapshot.full_tokens)
+            yield sse_event("progress", {"stage": "prompt sent", "context": agent.last_context_stats})
+
+            # The Gemini stream is a blocking iterator: pull each chunk on the worker pool
+            chunks = BlockingIterator(agent.stream_completion(final_prompt))
+            parts = []
+            try:
+                while True:
+                    text = await chunks.next()
+                    if text is None:
+                        break
+                    parts.append(text)
+                    yield sse_event("token", {"text": text})
+            finally:
+                # Also on a client disconnect: closing the stream gives back the LLM slots and
+                # ends the upstream request; shielded so the cancellation cannot skip it
+                with anyio.CancelScope(shield=True):
+                    await chunks.aclose()
+
+            sql = agent._clean_sql("".join(parts))
+            if not sql:
+                yield sse_event("error", {"detail": "Failed to generate SQL"})
+                return
+            await run_blocking(store_generation, session, cache_key, user_db.id, request.prompt, snapshot.fingerprint, agent.model_name, sql)
+            yield sse_event("sql", {"raw_sql": sql, "confirmation_required": True, "cached": False})
+        except Exception as e:
+            print(f"Error in generate_sql_stream: {e}")
+            yield sse_event("error", {"detail": str(e)})
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+
 @router.post("/execute-sql", response_model=ExecuteSQLResponse)
-async def execute_sql(request: ExecuteSQLRequest, session: Session = Depends(get_session), user: User = Depends(JWTBearer())):
+async def execute_sql(request: ExecuteSQLRequest, http_request: Request, auth: AuthContext = Depends(get_auth_context)):
     """Execute the provided raw SQL query."""
-    user_id = int(user['sub'])
-    user_databases = get_user_databases(session, user_id)
-    
-    
-    user_db = next((db for db in user_databases if db.id == request.db_id), None)
+    user_db = await auth.database(request.db_id)
     if not user_db:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Database not found")
+    prewarm_scheduler.touch(user_db)
+
+    # Runs under the database's statement/lock timeouts (and read-only mode) after the EXPLAIN cost guard
+    policy = ExecutionPolicy.for_database(user_db)
+    # Only statements proven read-only (READ ONLY transaction, or parsed as a plain read) are cached;
+    # everything else may write and drops the database's cached results
+    read_only = policy.read_only or is_read_only_candidate(request.raw_sql)
+    ttl = result_cache_ttl(user_db)
+    cache_key = make_result_key(user_db.id, request.raw_sql, request.params) if read_only and ttl > 0 else None
 
-    agent = DatabaseAgent(user_db=user_db,debug=True)
-    
-    execution_result = agent.tools.execute_query(request.raw_sql)
-    
-    if "error" in execution_result:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=execution_result["error"])
-    
-    add_query_history(session, request.db_id, request.raw_sql, request.raw_sql)
+    started = time.perf_counter()
+    if cache_key and not request.bypass_cache:
+        cached = result_cache.get(cache_key)
+        if cached is not None:
+            await history_writer.submit(request.db_id, request.prompt, request.raw_sql, duration_ms=_elapsed_ms(started))
+            return FastJSONResponse({"status": "success", "error": None, "cached": True, **cached})
+
+    agent = await run_blocking(DatabaseAgent, user_db=user_db)
+    generation = result_cache.generation(user_db.id)
+    # Listed under /agent/queries and cancelled if the client goes away before it finishes
+    running = query_registry.register(auth.user_id, user_db.id, request.raw_sql)
+    execution_started = time.perf_counter()
+    try:
+        execution = await _until_disconnect(http_request, running, run_against_database(
+            user_db, agent.tools.execute_guarded, request.raw_sql, policy, request.params, running))
+    except PlanRejected as e:
+        observe_execution("execute", "rejected", time.perf_counter() - execution_started)
+        await history_writer.submit(request.db_id, request.prompt, request.raw_sql, success=False,
+                                    error=str(e), duration_ms=_elapsed_ms(started))
+        raise _plan_rejected(e)
+    finally:
+        query_registry.unregister(running)
+    duration_ms = _elapsed_ms(started)
+    if not read_only or execution.get("wrote"):
+        result_cache.invalidate(user_db.id)
+    rows = execution.get("result")
+    observe_execution("execute", _outcome(running, "error" in execution), time.perf_counter() - execution_started,
+                      len(rows) if isinstance(rows, list) else None)
+
+    # History is written behind the response (utils.history_writer), failures included
+    if "error" in execution:
+        await history_writer.submit(request.db_id, request.prompt, request.raw_sql, success=False,
+                                    error=execution["error"], duration_ms=duration_ms)
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=execution["error"])
+
+    await history_writer.submit(request.db_id, request.prompt, request.raw_sql, duration_ms=duration_ms)
+    execution_result = execution["result"]
     if not isinstance(execution_result, list):
         execution_result = [execution_result]
-    
-    return ExecuteSQLResponse(status="success", result=execution_result)
 
+    payload = {"result": execution_result, "plan": execution["plan"]}
+    if cache_key and not execution["wrote"]:
+        await run_blocking(result_cache.put, cache_key, user_db.id, payload, ttl, generation)
+
+    # Rows are already JSON-native (utils.result_encoding); skip per-row model validation
+    return FastJSONResponse({"status": "success", "error": None, "cached": False, **payload})
+
+
+@router.post("/execute-sql/stream")
+async def execute_sql_stream(request: StreamSQLRequest, http_request: Request, auth: AuthContext = Depends(get_auth_context)):
+    """
+    Execute the provided raw SQL query and stream its rows as NDJSON or CSV.
+
+    Rows are read through a server-side cursor in batches, so memory stays constant
+    whatever the result size. When max_rows/max_bytes is hit the body ends with a
+    truncation marker line.
+    """
+    user_db = await auth.database(request.db_id)
+    if not user_db:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Database not found")
+    prewarm_scheduler.touch(user_db)
 
+    agent = await run_blocking(DatabaseAgent, user_db=user_db)
+
+    # The database slot is held for as long as the cursor is open, not just until the first batch
+    policy = ExecutionPolicy.for_database(user_db)
+    read_only = policy.read_only or is_read_only_candidate(request.raw_sql)
+    running = query_registry.register(auth.user_id, user_db.id, request.raw_sql, kind="stream")
+    slot = database_slot(user_db)
+    await slot.acquire()
+    started = time.perf_counter()
+    try:
+        stream = await _until_disconnect(http_request, running, run_blocking(
+            QueryStream, agent.tools.engine, request.raw_sql, policy=policy, params=request.params, running=running))
+    except Exception as e:
+        slot.release()
+        query_registry.unregister(running)
+        observe_execution("stream", "rejected" if isinstance(e, PlanRejected) else _outcome(running, True),
+                          time.perf_counter() - started)
+        if not read_only:
+            result_cache.invalidate(user_db.id)
+        await history_writer.submit(request.db_id, request.prompt, request.raw_sql, success=False,
+                                    error=str(e), duration_ms=_elapsed_ms(started))
+        if isinstance(e, PlanRejected):
+            raise _plan_rejected(e)
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    encoder = StreamEncoder(stream, fmt=request.format, max_rows=request.max_rows, max_bytes=request.max_bytes)
+    released = []
+    failure = []
+
+    async def cleanup():
+        if released:
+            return
+        released.append(True)
+        # On a client disconnect this runs in a cancelled task: the slot and registry entry are
+        # given back before the first await, and the rest is shielded so it cannot be cut short
+        slot.release()
+        query_registry.unregister(running)
+        with anyio.CancelScope(shield=True):
+            try:
+                await run_blocking(stream.close)
+            finally:
+                if not read_only or stream.wrote:
+                    result_cache.invalidate(user_db.id)
+                observe_execution("stream", _outcome(running, bool(failure)), time.perf_counter() - started,
+                                  encoder.rows_sent if stream.returns_rows else None)
+                # Recorded once the body is finished, so the duration covers the whole transfer
+                await history_writer.submit(request.db_id, request.prompt, request.raw_sql, success=not failure,
+                                            error=failure[0] if failure else None, duration_ms=_elapsed_ms(started))
+
+    async def body():
+        try:
+            while True:
+                chunk = await _until_disconnect(http_request, running, run_blocking(encoder.next_chunk))
+                if chunk is None:
+                    break
+                yield chunk
+        except asyncio.CancelledError:
+            # The client left while a batch was being read; recorded as a failed (cancelled) run
+            failure.append("Client disconnected")
+            raise
+        except Exception as e:
+            failure.append(str(e))
+            # Cancelled because the client left: nobody is reading, just end the body
+            if not running.cancel_requested:
+                raise
+        finally:
+            await cleanup()
+
+    media_type = "text/csv" if request.format == "csv" else "application/x-ndjson"
+    # The body is rows only, so the plan summary travels in a header
+    headers = {"X-Query-Id": running.id}
+    if stream.plan:
+        headers["X-Query-Plan"] = json.dumps(stream.plan)
+    return StreamingResponse(body(), media_type=media_type, headers=headers, background=BackgroundTask(cleanup))
+
+
+async def _owned_database(auth: AuthContext, db_id: int):
+    user_db = await auth.database(db_id)
+    if not user_db:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Database not found")
+    return user_db
+
+
+async def _current_snapshot(user_db, schemas: Optional[List[str]] = None):
+    """Schema view for the read-only schema endpoints; recently validated snapshots need no database round trip"""
+    try:
+        snapshot = None
+        directory = schema_cache.fresh_directory(user_db.id)
+        if directory is not None:
+            targets = resolve_schemas(directory, user_db.schema_allowlist, schemas)
+            snapshot = schema_cache.fresh_view(user_db.id, targets, allowed_schemas(directory, user_db.schema_allowlist))
+        if snapshot is None:
+            agent = await run_blocking(DatabaseAgent, user_db=user_db)
+            snapshot = await run_against_database(user_db, agent.get_schema_snapshot, schemas)
+    except SchemaNotAllowed as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except Exception as e:
+        print(f"Error fetching schema: {e}")
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Failed to read schema: {e}")
+    prewarm_scheduler.touch(user_db, snapshot.loaded_schemas)
+    return snapshot
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    # Weak comparison: a proxy or compression layer may have weakened the tag
+    return "*" in tags or etag in [tag[2:] if tag.startswith("W/") else tag for tag in tags]
+
+
+def _conditional_response(snapshot, if_none_match: Optional[str], build):
+    """304 when the client already holds this snapshot's representation, otherwise build the body"""
+    headers = {"ETag": snapshot.etag, "Cache-Control": "private, no-cache"}
+    if _etag_matches(if_none_match, snapshot.etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    body = build(snapshot.structure)
+    if body is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Table not found")
+    return FastJSONResponse(body, headers=headers)
+
+
+def _schemas_for_table(table_name: str, schemas: Optional[List[str]]) -> Optional[List[str]]:
+    # "sales.orders" names its schema; bare names are looked up in the selected or default schemas
+    if schemas or "." not in table_name:
+        return schemas
+    return [table_name.split(".", 1)[0]]
+
+
+# Schema endpoints carry an ETag derived from the snapshots' catalog fingerprints; a matching
+# If-None-Match gets a 304 without the body being rebuilt. They cover the schemas selected with
+# ?schemas=... (repeatable), or the database's allowlist / the default schema.
 
 @router.get("/visualize-schema")
-async def visualize_schema(db_id: int, session: Session = Depends(get_session), user: User = Depends(JWTBearer())):
+async def visualize_schema(db_id: int, schemas: Optional[List[str]] = Query(None), if_none_match: Optional[str] = Header(None), auth: AuthContext = Depends(get_auth_context)):
     """
     Returns the structure and sample data of all tables in the selected database
     for frontend visualization.
     """
-    user_id = int(user['sub'])
-    user_databases = get_user_databases(session, user_id)
+    user_db = await _owned_database(auth, db_id)
+    snapshot = await _current_snapshot(user_db, schemas)
+    return _conditional_response(snapshot, if_none_match, format_db_structure_for_visualization)
+
+
+@router.get("/schema/tables")
+async def schema_tables(db_id: int, schemas: Optional[List[str]] = Query(None), if_none_match: Optional[str] = Header(None), auth: AuthContext = Depends(get_auth_context)):
+    """Table list with row/column counts and the foreign-key edges between tables, without columns or samples."""
+    user_db = await _owned_database(auth, db_id)
+    snapshot = await _current_snapshot(user_db, schemas)
+    return _conditional_response(snapshot, if_none_match, list_tables_for_visualization)
+
 
-    user_db = next((db for db in user_databases if db.id == db_id), None)
+@router.get("/schema/tables/{table_name}")
+async def schema_table_detail(table_name: str, db_id: int, schemas: Optional[List[str]] = Query(None), if_none_match: Optional[str] = Header(None), auth: AuthContext = Depends(get_auth_context)):
+    """Columns, foreign keys and indexes of one table."""
+    user_db = await _owned_database(auth, db_id)
+    snapshot = await _current_snapshot(user_db, _schemas_for_table(table_name, schemas))
+    return _conditional_response(snapshot, if_none_match, lambda structure: table_detail_for_visualization(structure, table_name))
+
+
+@router.get("/schema/tables/{table_name}/sample")
+async def schema_table_sample(table_name: str, db_id: int, limit: int = 5, schemas: Optional[List[str]] = Query(None), auth: AuthContext = Depends(get_auth_context)):
+    """
+    Sample rows of one table, read on demand (snapshots only keep column statistics).
+
+    At most SAMPLE_MAX_ROWS rows; long values are truncated and binary/document values
+    replaced by their size. Not cached, so no ETag.
+    """
+    user_db = await _owned_database(auth, db_id)
+    snapshot = await _current_snapshot(user_db, _schemas_for_table(table_name, schemas))
+    table_data = snapshot.structure.get("tables", {}).get(table_name)
+    if table_data is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Table not found")
+
+    agent = await run_blocking(DatabaseAgent, user_db=user_db)
+    structure = table_data.get("structure", {})
+    schema = structure.get("schema", "public")
+    try:
+        rows = await run_against_database(user_db, agent.tools.preview_data, structure.get("table_name", table_name), schema, max(limit, 0))
+    except Exception as e:
+        print(f"Error sampling table {table_name}: {e}")
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Failed to sample table: {e}")
+    return FastJSONResponse(table_sample_for_visualization(snapshot.structure, table_name, rows),
+                            headers={"Cache-Control": "private, no-store"})
+
+
+@router.post("/invalidate-schema")
+async def invalidate_schema(db_id: int, auth: AuthContext = Depends(get_auth_context)):
+    """Drop the cached schema snapshots (every schema) so the next request re-introspects the database."""
+    user_db = await auth.database(db_id)
     if not user_db:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Database not found")
-    
-    agent = DatabaseAgent(user_db=user_db, debug=True)
-    print(get_db_structure_json(agent))
-    return get_db_structure_json(agent)
+
+    invalidated = schema_cache.invalidate(db_id)
+    return {"msg": "Schema cache invalidated", "db_id": db_id, "had_snapshot": invalidated}
+
+
+@router.get("/prewarm/jobs")
+async def list_prewarm_jobs(db_id: Optional[int] = None, auth: AuthContext = Depends(get_auth_context)):
+    """The current user's background schema introspection jobs in this server process: queued and running first, then finished ones, newest first."""
+    return [job.to_dict() for job in prewarm_scheduler.jobs(auth.user_id, db_id)]
+
+
+@router.get("/prewarm/jobs/{job_id}")
+async def get_prewarm_job(job_id: str, auth: AuthContext = Depends(get_auth_context)):
+    """State of one background introspection job, e.g. the prewarm_job_id returned when adding a database."""
+    job = prewarm_scheduler.get(job_id)
+    if not job or job.user_id != auth.user_id:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found")
+    return job.to_dict()
+
+
+@router.get("/queries")
+async def list_running_queries(db_id: Optional[int] = None, auth: AuthContext = Depends(get_auth_context)):
+    """The current user's executions still running in this server process, oldest first."""
+    return [running.to_dict() for running in query_registry.for_user(auth.user_id, db_id)]
+
+
+@router.post("/queries/{query_id}/cancel")
+async def cancel_running_query(query_id: str, auth: AuthContext = Depends(get_auth_context)):
+    """Cancel a running execution with pg_cancel_backend; its request then fails with the cancellation error."""
+    running = query_registry.get(query_id)
+    if not running or running.user_id != auth.user_id:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Query not found")
+    cancelled = await asyncio.wrap_future(query_registry.cancel_soon(running))
+    return {"query_id": query_id, "cancelled": cancelled}
+
+
+@router.get("/result-cache/stats")
+async def result_cache_statistics(auth: AuthContext = Depends(get_auth_context)):
+    """Hit ratio and memory use of this process's query result cache."""
+    return result_cache.stats()
+
+
+@router.get("/generation-cache/stats")
+async def generation_cache_statistics(session: Session = Depends(get_session), auth: AuthContext = Depends(get_auth_context)):
+    """Hit/miss counters of the NL-to-SQL generation cache since process start."""
+    stats = generation_cache_stats.snapshot()
+    stats["entries"] = await run_blocking(count_cached_generations, session)
+    return stats
@@ -1,21 +1,34 @@
-from pydantic import BaseModel
-from typing import Optional, List
+from pydantic import BaseModel, Field
+from typing import Any, Dict, Optional, List, Literal
 
 class GenerateSQLRequest(BaseModel):
     prompt: str
     db_id: int  # The user database ID to be used for SQL generation
+    bypass_cache: bool = False  # Always ask the model, ignoring (but refreshing) the generation cache
+    schemas: Optional[List[str]] = None  # Schemas to use; inferred from the prompt (plus the default ones) when omitted
 
 class GenerateSQLResponse(BaseModel):
     raw_sql: str
     confirmation_required: bool  # Flag to indicate if confirmation is needed before execution
     message: Optional[str] = None  # Any message that might accompany the response
+    cached: bool = False  # True when the SQL came from the generation cache
 
 class ExecuteSQLRequest(BaseModel):
     raw_sql: str
     db_id: int  # The user database ID to execute the SQL on
+    prompt: Optional[str] = None  # Natural-language request the SQL was generated from, kept in history
+    params: Optional[Dict[str, Any]] = None  # Values for :name placeholders in raw_sql
+    bypass_cache: bool = False  # Always run against the database, ignoring (but refreshing) the result cache
+
+class StreamSQLRequest(ExecuteSQLRequest):
+    format: Literal["ndjson", "csv"] = "ndjson"
+    max_rows: Optional[int] = Field(default=None, gt=0)  # Lower than the server cap to stop early
+    max_bytes: Optional[int] = Field(default=None, gt=0)  # Same, for the encoded body size
 
 class ExecuteSQLResponse(BaseModel):
     status: str
     result: Optional[List[dict]] = None  # Query result (if applicable)
     error: Optional[str] = None  # If any error occurs during SQL execution
+    plan: Optional[dict] = None  # EXPLAIN summary: cost and row estimates, scanned relations, warnings
+    cached: bool = False  # True when the result came from the result cache
 
@@ -1,5 +1,5 @@
-from typing import Optional
-from sqlmodel import SQLModel
+from typing import List, Optional, Literal
+from sqlmodel import SQLModel, Field
 from datetime import datetime
 
 
@@ -9,6 +9,15 @@ class UserDatabaseCreate(SQLModel):
     db_user: Optional[str] = None
     db_password: str
     db_name: str
+    max_concurrency: Optional[int] = Field(default=None, gt=0)
+    statement_timeout_ms: Optional[int] = Field(default=None, ge=0)
+    lock_timeout_ms: Optional[int] = Field(default=None, ge=0)
+    read_only: Optional[bool] = None
+    max_plan_cost: Optional[float] = Field(default=None, ge=0)
+    max_plan_rows: Optional[int] = Field(default=None, ge=0)
+    plan_guard_mode: Optional[Literal["reject", "warn", "off"]] = None
+    result_cache_ttl_seconds: Optional[int] = None
+    schema_allowlist: Optional[List[str]] = None
 
 
 class UserDatabaseRead(SQLModel):
@@ -18,6 +27,15 @@ class UserDatabaseRead(SQLModel):
     port: Optional[int] = None
     db_user: Optional[str] = None
     db_name: str
+    max_concurrency: Optional[int] = Field(default=None, gt=0)
+    statement_timeout_ms: Optional[int] = None
+    lock_timeout_ms: Optional[int] = None
+    read_only: Optional[bool] = None
+    max_plan_cost: Optional[float] = None
+    max_plan_rows: Optional[int] = None
+    plan_guard_mode: Optional[Literal["reject", "warn", "off"]] = None
+    result_cache_ttl_seconds: Optional[int] = None
+    schema_allowlist: Optional[List[str]] = None
     created_at: datetime
 
 class UserDatabaseUpdate(SQLModel):  # New class added for update operations
@@ -26,3 +44,12 @@ class UserDatabaseUpdate(SQLModel):  # New class added for update operations
     db_user: Optional[str] = None
     db_password: Optional[str] = None
     db_name: Optional[str] = None
+    max_concurrency: Optional[int] = Field(default=None, gt=0)
+    statement_timeout_ms: Optional[int] = Field(default=None, ge=0)
+    lock_timeout_ms: Optional[int] = Field(default=None, ge=0)
+    read_only: Optional[bool] = None
+    max_plan_cost: Optional[float] = Field(default=None, ge=0)
+    max_plan_rows: Optional[int] = Field(default=None, ge=0)
+    plan_guard_mode: Optional[Literal["reject", "warn", "off"]] = None
+    result_cache_ttl_seconds: Optional[int] = None
+    schema_allowlist: Optional[List[str]] = None
@@ -8,6 +8,7 @@ class QueryHistoryCreate(SQLModel):
     generated_sql: str
     success: bool = True
     error_message: Optional[str] = None
+    duration_ms: Optional[int] = None
 
 
 class QueryHistoryRead(SQLModel):
@@ -17,5 +18,6 @@ class QueryHistoryRead(SQLModel):
     generated_sql: str
     success: bool
     error_message: Optional[str]
+    duration_ms: Optional[int] = None
     executed_at: datetime
 
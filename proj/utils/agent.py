@@ -1,32 +1,32 @@
 import os
 import json
-from typing import Dict, Any
+from typing import Dict, Any, Iterator, List, Optional
 from sqlalchemy import create_engine
 from utils.postgres_tools import PostgreSQLTools,get_postgresql_tools
 from utils.declarations import FUNCTION_DECLARATIONS
-import google.generativeai as genai
+from utils.schema_cache import schema_cache, SchemaView
+from utils.schema_scope import allowed_schemas, resolve_schemas
+from utils.schema_context import build_schema_context, estimate_tokens
+from utils.metrics import observe_prompt
+from utils.llm import llm_client, LLMBusy
 from dotenv import load_dotenv
 
 
 load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), "..", ".env"))
 
+# Print schema context stats and prompt progress; timings are on /metrics either way
+AGENT_DEBUG = os.getenv("AGENT_DEBUG", "false").lower() in ("1", "true", "yes")
+
 
 class DatabaseAgent:
-    def __init__(self,user_db,debug=True,):
+    def __init__(self,user_db,debug=AGENT_DEBUG,):
         """Initialize the DatabaseAgent"""
         self.debug = debug
+        self.user_db = user_db
+        # The model is reached through the shared utils.llm client only when generating
+        self.model_name = llm_client.model_name
+        self.last_context_stats = None
         self.tools = get_postgresql_tools(user_db) 
-        self.ai_model = self._initialize_ai()  
-    
-    def _initialize_ai(self):
-        """Initialize the AI model"""
-        try:
-            genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
-            return genai.GenerativeModel('gemini-1.5-pro')  # or whatever model you're using
-        except Exception as e:
-            print(f"AI initialization failed: {e}")
-            raise
-
     
     def _clean_sql(self, sql: str) -> str:
         sql = sql.strip()  # Strip leading/trailing whitespaces
@@ -57,72 +57,105 @@ class DatabaseAgent:
                 return {"preview": self.tools.preview_data(table_name=table_name, schema=schema, limit=limit)}
             elif function_name == "count_table_rows":
                 schema = parameters.get("schema", "public")
-                return {"row_counts": self.tools.count_table_rows(schema=schema)}
+                exact = parameters.get("exact", False)
+                return {"row_counts": self.tools.count_table_rows(schema=schema, exact=exact)}
             else:
                 return {"error": f"Unknown function {function_name}"}
         except Exception as e:
             return {"error": str(e)}
 
-    def _gather_database_structure(self) -> Dict[str, Any]:
-        """Directly gather database structure information without relying on AI"""
-        db_structure = {}
+    def _gather_schema_structure(self, schema: str = "public") -> Dict[str, Any]:
+        """Directly gather the structure of one schema without relying on AI"""
+        tables = self.tools.describe_schema(schema=schema)
+        row_counts = self.tools.count_table_rows(schema=schema)
+        # Value summaries from planner statistics instead of reading rows; raw rows are fetched on demand
+        try:
+            column_stats = self.tools.column_stats(schema=schema)
+        except Exception as e:
+            print(f"Error reading column statistics of {schema}: {e}")
+            column_stats = {}
+
+        structure = {"schema": schema, "tables": {}}
+        for table, table_info in tables.items():
+            structure["tables"][table] = {
+                "structure": table_info,
+                "column_stats": column_stats.get(table, {}),
+                "row_count": row_counts.get(table, {}).get("row_count"),
+                "row_count_estimated": row_counts.get(table, {}).get("estimated", True)
+            }
+        return structure
+
+    def get_schema_snapshot(self, schemas: Optional[List[str]] = None, prompt: Optional[str] = None,
+                            max_age: Optional[float] = None) -> SchemaView:
+        """
+        Cached structure of the schemas this request targets (see utils.schema_scope.resolve_schemas);
+        each schema is re-introspected only when its catalog fingerprint changes, or once older than max_age.
+
+        Raises:
+            SchemaNotAllowed: When a selected schema does not exist or is not allowed
+        """
+        directory = schema_cache.directory(self.user_db.id, self.tools)
+        allowlist = self.user_db.schema_allowlist
+        targets = resolve_schemas(directory, allowlist, schemas, prompt)
+        return schema_cache.view(self.user_db.id, targets, allowed_schemas(directory, allowlist), self.tools,
+                                 self._gather_schema_structure, max_age)
+
+    def build_prompt(self, prompt: str, db_structure: Dict[str, Any] = None, full_tokens: Optional[int] = None) -> str:
+        """Final generation prompt: the schema context for this request followed by the user's request"""
+        if db_structure is None:
+            snapshot = self.get_schema_snapshot(prompt=prompt)
+            db_structure, full_tokens = snapshot.structure, snapshot.full_tokens
         
-        # Get all schemas
-        schemas = self.tools.list_schemas()
-        db_structure["schemas"] = schemas
+        # Only the tables relevant to the prompt (plus FK neighbours), as compact DDL under a token budget
+        schema_context, self.last_context_stats = build_schema_context(prompt, db_structure, full_tokens=full_tokens)
         
-        # Focus on public schema as default
-        schema = "public"
-        if schema in schemas:
-            tables = self.tools.list_tables(schema=schema)
-            db_structure["tables"] = {}
-            
-            
-            for table in tables:
-                table_info = self.tools.describe_table(table_name=table, schema=schema)
-                preview = self.tools.preview_data(table_name=table, schema=schema, limit=3)
-                row_count = self.tools.count_rows_in_table(table_name=table, schema=schema)
-                db_structure["tables"][table] = {
-                    "structure": table_info,
-                    "sample_data": preview,
-                    "row_count": row_count
-                }
-                
-        return db_structure
-
-    def process_request(self, prompt: str) -> str:
-        """Two-phase approach: first gather schema info, then generate SQL"""
-        try:
-            
-            db_structure = self._gather_database_structure()
-            
-            if self.debug:
-                print(f"Database structure gathered: {json.dumps(db_structure, indent=2,default=str)}")
-            
-            
-            final_prompt = f"""Database Structure:
-            {json.dumps(db_structure, indent=2, default=str)}
+        if self.debug:
+            print(f"Schema context: {self.last_context_stats}")
+        
+        
+        final_prompt = f"""Database Structure:
+            {schema_context}
             
             User Request:
             {prompt}
             
             Generate the most appropriate PostgreSQL query based on the actual database structure above.
             Return ONLY the SQL code, no explanations or markdown.
-            The SQL should be valid for PostgreSQL and match the exact column names and table structure shown above take row counts into consideration for insert queries."""
+            The SQL should be valid for PostgreSQL and match the exact column names and table structure shown above take row counts into consideration for insert queries (counts flagged row_count_estimated are planner estimates)."""
+        observe_prompt(final_prompt, estimate_tokens(final_prompt))
+        return final_prompt
+
+    def process_request(self, prompt: str, db_structure: Dict[str, Any] = None, full_tokens: Optional[int] = None) -> str:
+        """Two-phase approach: first gather schema info, then generate SQL"""
+        try:
+            final_prompt = self.build_prompt(prompt, db_structure, full_tokens)
             
             if self.debug:
                 print(f"Sending final prompt to AI...")
                 
-            sql_response = self.ai_model.generate_content(final_prompt)
+            sql_response = llm_client.generate(final_prompt, user_id=self.user_db.user_id)
             
-            if sql_response and hasattr(sql_response, 'text'):
-                return self._clean_sql(sql_response.text)
+            if sql_response:
+                return self._clean_sql(sql_response)
             else:
                 print("No valid text response from AI")
                 return None
+        except LLMBusy:
+            raise
         except Exception as e:
             print(f"Error in process_request: {e}")
             import traceback
             traceback.print_exc()
             return None
 
+    def stream_completion(self, final_prompt: str) -> Iterator[str]:
+        """
+        Send a prompt from build_prompt in streaming mode and yield the model's text as it arrives.
+
+        The chunks may still contain markdown fences; run their concatenation through
+        _clean_sql for the final SQL. Errors (including LLMBusy) are raised to the caller.
+        """
+        if self.debug:
+            print(f"Streaming final prompt to AI...")
+        
+        yield from llm_client.stream(final_prompt, user_id=self.user_db.user_id)
@@ -0,0 +1,311 @@
+from typing import Dict, Any, List, Optional
+from sqlalchemy import text, bindparam
+from sqlalchemy.engine import Connection
+
+
+# One row per column of every ordinary/partitioned table in the schema
+COLUMNS_SQL = """
+    SELECT c.relname AS table_name,
+           pg_catalog.obj_description(c.oid, 'pg_class') AS table_comment,
+           a.attname AS column_name,
+           pg_catalog.format_type(a.atttypid, a.atttypmod) AS data_type,
+           NOT a.attnotnull AS nullable,
+           pg_catalog.col_description(c.oid, a.attnum) AS column_comment
+    FROM pg_catalog.pg_class c
+    JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace
+    LEFT JOIN pg_catalog.pg_attribute a
+        ON a.attrelid = c.oid AND a.attnum > 0 AND NOT a.attisdropped
+    WHERE n.nspname = :schema
+      AND c.relkind IN ('r', 'p')
+      {table_filter}
+    ORDER BY c.relname, a.attnum
+"""
+
+# Primary and foreign keys, with column lists resolved in key order
+CONSTRAINTS_SQL = """
+    SELECT c.relname AS table_name,
+           con.conname AS name,
+           con.contype AS kind,
+           ARRAY(
+               SELECT a.attname::text
+               FROM unnest(con.conkey) WITH ORDINALITY AS k(attnum, ord)
+               JOIN pg_catalog.pg_attribute a ON a.attrelid = con.conrelid AND a.attnum = k.attnum
+               ORDER BY k.ord
+           ) AS constrained_columns,
+           rn.nspname AS referred_schema,
+           rc.relname AS referred_table,
+           ARRAY(
+               SELECT a.attname::text
+               FROM unnest(con.confkey) WITH ORDINALITY AS k(attnum, ord)
+               JOIN pg_catalog.pg_attribute a ON a.attrelid = con.confrelid AND a.attnum = k.attnum
+               ORDER BY k.ord
+           ) AS referred_columns,
+           con.confupdtype AS on_update,
+           con.confdeltype AS on_delete,
+           con.condeferrable AS deferrable,
+           con.condeferred AS deferred,
+           con.confmatchtype AS match_type,
+           pg_catalog.obj_description(con.oid, 'pg_constraint') AS comment
+    FROM pg_catalog.pg_constraint con
+    JOIN pg_catalog.pg_class c ON c.oid = con.conrelid
+    JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace
+    LEFT JOIN pg_catalog.pg_class rc ON rc.oid = con.confrelid
+    LEFT JOIN pg_catalog.pg_namespace rn ON rn.oid = rc.relnamespace
+    WHERE n.nspname = :schema
+      AND con.contype IN ('p', 'f')
+      {table_filter}
+    ORDER BY c.relname, con.conname
+"""
+
+# Non-primary-key indexes; expression columns come back as NULL names
+INDEXES_SQL = """
+    SELECT c.relname AS table_name,
+           i.relname AS name,
+           ix.indisunique AS is_unique,
+           ARRAY(
+               SELECT a.attname::text
+               FROM unnest(ix.indkey::int2[]) WITH ORDINALITY AS k(attnum, ord)
+               LEFT JOIN pg_catalog.pg_attribute a ON a.attrelid = ix.indrelid AND a.attnum = k.attnum
+               WHERE k.ord <= ix.indnkeyatts
+               ORDER BY k.ord
+           ) AS column_names,
+           ARRAY(
+               SELECT pg_catalog.pg_get_indexdef(ix.indexrelid, k.ord, true)
+               FROM generate_series(1, ix.indnkeyatts::int) AS k(ord)
+           ) AS expressions,
+           EXISTS (
+               SELECT 1 FROM pg_catalog.pg_constraint con
+               WHERE con.conindid = ix.indexrelid AND con.contype = 'u'
+           ) AS is_constraint
+    FROM pg_catalog.pg_index ix
+    JOIN pg_catalog.pg_class c ON c.oid = ix.indrelid
+    JOIN pg_catalog.pg_class i ON i.oid = ix.indexrelid
+    JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace
+    WHERE n.nspname = :schema
+      AND NOT ix.indisprimary
+      {table_filter}
+    ORDER BY c.relname, i.relname
+"""
+
+FK_ACTIONS = {"a": None, "r": "RESTRICT", "c": "CASCADE", "n": "SET NULL", "d": "SET DEFAULT"}
+FK_MATCH = {"f": "FULL", "p": "PARTIAL", "s": None}
+
+
+def _run(conn: Connection, sql: str, schema: str, tables: Optional[List[str]]):
+    params = {"schema": schema}
+    if tables is None:
+        return conn.execute(text(sql.format(table_filter="")), params)
+    stmt = text(sql.format(table_filter="AND c.relname IN :tables")).bindparams(
+        bindparam("tables", expanding=True)
+    )
+    params["tables"] = list(tables)
+    return conn.execute(stmt, params)
+
+
+def _foreign_key(row, schema: str) -> Dict[str, Any]:
+    """Shape a pg_constraint row like Inspector.get_foreign_keys does"""
+    options = {}
+    if FK_ACTIONS.get(row.on_update):
+        options["onupdate"] = FK_ACTIONS[row.on_update]
+    if FK_ACTIONS.get(row.on_delete):
+        options["ondelete"] = FK_ACTIONS[row.on_delete]
+    if row.deferrable:
+        options["deferrable"] = True
+        options["initially"] = "DEFERRED" if row.deferred else "IMMEDIATE"
+    if FK_MATCH.get(row.match_type):
+        options["match"] = FK_MATCH[row.match_type]
+    return {
+        "name": row.name,
+        "constrained_columns": list(row.constrained_columns),
+        "referred_schema": None if row.referred_schema == schema else row.referred_schema,
+        "referred_table": row.referred_table,
+        "referred_columns": list(row.referred_columns),
+        "options": options,
+        "comment": row.comment,
+    }
+
+
+def load_schema_catalog(conn: Connection, schema: str = 'public',
+                        tables: Optional[List[str]] = None) -> Dict[str, Dict[str, Any]]:
+    """
+    Describe every table of a schema from pg_catalog in three set-based queries.
+
+    Args:
+        conn: An open connection to the target PostgreSQL database
+        schema: Schema to describe
+        tables: Optional subset of table names; all tables when omitted
+
+    Returns:
+        dict: table name -> the same structure PostgreSQLTools.describe_table returns
+    """
+    catalog: Dict[str, Dict[str, Any]] = {}
+
+    for row in _run(conn, COLUMNS_SQL, schema, tables):
+        table = catalog.get(row.table_name)
+        if table is None:
+            table = catalog[row.table_name] = {
+                "schema": schema,
+                "table_name": row.table_name,
+                "comment": row.table_comment,
+                "columns": [],
+                "foreign_keys": [],
+                "indexes": [],
+            }
+        if row.column_name is not None:
+            table["columns"].append({
+                "name": row.column_name,
+                "type": row.data_type,
+                "nullable": row.nullable,
+                "primary_key": False,
+                "comment": row.column_comment,
+            })
+
+    for row in _run(conn, CONSTRAINTS_SQL, schema, tables):
+        table = catalog.get(row.table_name)
+        if table is None:
+            continue
+        if row.kind == "p":
+            pk_columns = set(row.constrained_columns)
+            for column in table["columns"]:
+                column["primary_key"] = column["name"] in pk_columns
+        else:
+            table["foreign_keys"].append(_foreign_key(row, schema))
+
+    for row in _run(conn, INDEXES_SQL, schema, tables):
+        table = catalog.get(row.table_name)
+        if table is None:
+            continue
+        index = {
+            "name": row.name,
+            "column_names": list(row.column_names),
+            "unique": row.is_unique,
+        }
+        if None in index["column_names"]:
+            index["expressions"] = list(row.expressions)
+        if row.is_constraint:
+            index["duplicates_constraint"] = row.name
+        table["indexes"].append(index)
+
+    return catalog
+
+
+# Every object that can change the described structure contributes its oid and row version (xmin),
+# grouped per schema so each schema's snapshot is validated on its own.
+# ANALYZE/VACUUM update pg_class in place, so statistics refreshes do not change the fingerprint.
+FINGERPRINT_SQL = """
+    WITH rels AS (
+        SELECT c.oid, n.nspname
+        FROM pg_catalog.pg_class c
+        JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname IN :schemas
+    )
+    SELECT schema_name, md5(string_agg(part, ',' ORDER BY part)) AS fingerprint FROM (
+        SELECT n.nspname AS schema_name, 'n' || n.oid || ':' || n.xmin::text AS part
+        FROM pg_catalog.pg_namespace n
+        WHERE n.nspname IN :schemas
+        UNION ALL
+        SELECT r.nspname, 'c' || c.oid || ':' || c.xmin::text
+        FROM pg_catalog.pg_class c JOIN rels r ON r.oid = c.oid
+        UNION ALL
+        SELECT r.nspname, 'a' || a.attrelid || '.' || a.attnum || ':' || a.xmin::text
+        FROM pg_catalog.pg_attribute a JOIN rels r ON r.oid = a.attrelid
+        WHERE a.attnum > 0
+        UNION ALL
+        SELECT r.nspname, 'k' || con.oid || ':' || con.xmin::text
+        FROM pg_catalog.pg_constraint con JOIN rels r ON r.oid = con.conrelid
+        UNION ALL
+        SELECT r.nspname, 'd' || d.objoid || '.' || d.objsubid || ':' || d.xmin::text
+        FROM pg_catalog.pg_description d JOIN rels r ON r.oid = d.objoid
+        WHERE d.classoid = 'pg_catalog.pg_class'::regclass
+    ) parts
+    GROUP BY schema_name
+"""
+
+
+def schema_fingerprints(conn: Connection, schemas: List[str]) -> Dict[str, str]:
+    """Cheap hash per schema over catalog row versions; changes whenever DDL touches that schema. Missing schemas are left out."""
+    stmt = text(FINGERPRINT_SQL).bindparams(bindparam("schemas", expanding=True))
+    return {row.schema_name: row.fingerprint for row in conn.execute(stmt, {"schemas": list(schemas)})}
+
+
+# Names of all user schemas and their tables; enough to pick the schemas a request needs
+DIRECTORY_SQL = """
+    SELECT n.nspname AS schema_name, c.relname AS table_name
+    FROM pg_catalog.pg_namespace n
+    LEFT JOIN pg_catalog.pg_class c ON c.relnamespace = n.oid AND c.relkind IN ('r', 'p')
+    WHERE n.nspname NOT LIKE 'pg\\_%' AND n.nspname <> 'information_schema'
+    ORDER BY n.nspname, c.relname
+"""
+
+
+def load_schema_directory(conn: Connection) -> Dict[str, List[str]]:
+    """schema name -> table names, for every schema outside pg_catalog/information_schema (empty schemas included)"""
+    directory: Dict[str, List[str]] = {}
+    for row in conn.execute(text(DIRECTORY_SQL)):
+        tables = directory.setdefault(row.schema_name, [])
+        if row.table_name is not None:
+            tables.append(row.table_name)
+    return directory
+
+
+# Planner and statistics-collector row estimates for every table of a schema.
+# Partitioned tables are summed over their leaf partitions. reltuples is unknown (NULL) when
+# -1 (never analyzed, PostgreSQL 14+) or, before 14, when 0 with relpages 0: those versions
+# report a never-analyzed table that way, indistinguishable from an empty one.
+ROW_ESTIMATES_SQL = """
+    SELECT c.relname AS table_name,
+           sum(CASE WHEN l.reltuples > 0 THEN l.reltuples
+                    WHEN l.reltuples = 0
+                         AND (l.relpages > 0 OR pg_catalog.current_setting('server_version_num')::int >= 140000)
+                    THEN 0 END)::bigint AS reltuples,
+           sum(s.n_live_tup)::bigint AS n_live_tup,
+           sum(pg_catalog.pg_relation_size(l.oid))::bigint AS relation_bytes
+    FROM pg_catalog.pg_class c
+    JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace
+    JOIN LATERAL (
+        SELECT c.oid AS relid WHERE c.relkind = 'r'
+        UNION ALL
+        SELECT t.relid FROM pg_catalog.pg_partition_tree(c.oid) t WHERE c.relkind = 'p' AND t.isleaf
+    ) leaf ON true
+    JOIN pg_catalog.pg_class l ON l.oid = leaf.relid
+    LEFT JOIN pg_catalog.pg_stat_user_tables s ON s.relid = l.oid
+    WHERE n.nspname = :schema
+      AND c.relkind IN ('r', 'p')
+    GROUP BY c.relname
+"""
+
+
+def estimate_row_counts(conn: Connection, schema: str = 'public') -> Dict[str, Dict[str, Any]]:
+    """
+    Read row estimates for a whole schema in one query, without scanning any table.
+
+    Returns:
+        dict: table name -> {"estimate": int or None when never analyzed, "relation_bytes": int}
+    """
+    estimates = {}
+    for row in conn.execute(text(ROW_ESTIMATES_SQL), {"schema": schema}):
+        # n_live_tup tracks inserts/deletes continuously; reltuples only moves on VACUUM/ANALYZE.
+        # A zero n_live_tup is not trusted (stats reset, standby, bulk load not yet counted): the
+        # table then falls back to reltuples, and stays None when never analyzed so its size is checked
+        if row.n_live_tup:
+            estimate = row.n_live_tup
+        else:
+            estimate = row.reltuples
+        estimates[row.table_name] = {"estimate": estimate, "relation_bytes": row.relation_bytes or 0}
+    return estimates
+
+
+def exact_row_counts(conn: Connection, schema: str, tables: List[str], batch_size: int = 50) -> Dict[str, int]:
+    """COUNT(*) several tables per round trip by combining them with UNION ALL"""
+    quote = conn.dialect.identifier_preparer.quote
+    counts = {}
+    for start in range(0, len(tables), batch_size):
+        batch = tables[start:start + batch_size]
+        parts = [
+            f"SELECT :t{i} AS table_name, COUNT(*) AS row_count FROM {quote(schema)}.{quote(table)}"
+            for i, table in enumerate(batch)
+        ]
+        params = {f"t{i}": table for i, table in enumerate(batch)}
+        for row in conn.execute(text(" UNION ALL ".join(parts)), params):
+            counts[row.table_name] = row.row_count
+    return counts
@@ -0,0 +1,76 @@
+import os
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterator, Tuple
+from dotenv import load_dotenv
+
+
+load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), "..", ".env"))
+
+# Threads available for blocking work (psycopg2, SQLite sessions, Gemini calls) across all requests
+AGENT_WORKER_THREADS = int(os.getenv("AGENT_WORKER_THREADS", "32"))
+# Default number of simultaneous operations against one user database; UserDatabase.max_concurrency overrides it
+DB_MAX_CONCURRENCY = int(os.getenv("DB_MAX_CONCURRENCY", "4"))
+
+_executor = ThreadPoolExecutor(max_workers=AGENT_WORKER_THREADS, thread_name_prefix="agent-worker")
+# db_id -> (limit, semaphore); rebuilt when the configured limit changes
+_database_slots: Dict[int, Tuple[int, asyncio.Semaphore]] = {}
+
+
+async def run_blocking(fn: Callable, *args, **kwargs) -> Any:
+    """Run a blocking call on the bounded worker pool so the event loop keeps serving other requests"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, functools.partial(fn, *args, **kwargs))
+
+
+class BlockingIterator:
+    """
+    A blocking iterator (e.g. a model stream) advanced on the worker pool. aclose() waits for a
+    pull still running on a worker thread, then closes the iterator so its finally blocks run now
+    rather than whenever it is garbage collected.
+    """
+
+    def __init__(self, iterator: Iterator):
+        self._iterator = iterator
+        self._lock = threading.Lock()
+
+    def _next(self, default):
+        with self._lock:
+            return next(self._iterator, default)
+
+    def _close(self):
+        with self._lock:
+            close = getattr(self._iterator, "close", None)
+            if close is not None:
+                close()
+
+    async def next(self, default=None) -> Any:
+        return await run_blocking(self._next, default)
+
+    async def aclose(self) -> None:
+        await run_blocking(self._close)
+
+
+def database_slot(user_db) -> asyncio.Semaphore:
+    """Semaphore bounding simultaneous work against one user database (max_concurrency, or DB_MAX_CONCURRENCY when unset)"""
+    limit = getattr(user_db, "max_concurrency", None) or DB_MAX_CONCURRENCY
+    current = _database_slots.get(user_db.id)
+    if current is None or current[0] != limit:
+        current = _database_slots[user_db.id] = (limit, asyncio.Semaphore(limit))
+    return current[1]
+
+
+async def run_against_database(user_db, fn: Callable, *args, **kwargs) -> Any:
+    """Like run_blocking, but waits for one of the target database's concurrency slots first"""
+    async with database_slot(user_db):
+        return await run_blocking(fn, *args, **kwargs)
+
+
+def forget_database(db_id: int) -> None:
+    _database_slots.pop(db_id, None)
+
+
+def shutdown_executor() -> None:
+    _executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,164 @@
+import os
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple
+from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine
+from dotenv import load_dotenv
+from utils.encryption import decrypt_password
+
+
+load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), "..", ".env"))
+
+POOL_SIZE = int(os.getenv("USER_DB_POOL_SIZE", "5"))
+MAX_OVERFLOW = int(os.getenv("USER_DB_MAX_OVERFLOW", "5"))
+POOL_TIMEOUT = int(os.getenv("USER_DB_POOL_TIMEOUT", "30"))
+POOL_RECYCLE = int(os.getenv("USER_DB_POOL_RECYCLE", "1800"))
+MAX_ENGINES = int(os.getenv("USER_DB_MAX_ENGINES", "64"))
+IDLE_SECONDS = int(os.getenv("USER_DB_IDLE_SECONDS", "900"))
+# How often a background thread disposes idle engines, so pools close even when no request comes
+REAP_INTERVAL_SECONDS = int(os.getenv("USER_DB_REAP_INTERVAL_SECONDS", "60"))
+
+
+def credential_fingerprint(user_db) -> str:
+    """Hash of everything that identifies a connection, so edited credentials never reuse an old pool"""
+    raw = "|".join(str(part) for part in (
+        user_db.host,
+        user_db.port,
+        user_db.db_user,
+        user_db.db_name,
+        user_db.db_password_encrypted,
+    ))
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def build_database_url(user_db) -> str:
+    db_password = decrypt_password(user_db.db_password_encrypted)
+    host = user_db.host or "localhost"
+    port = user_db.port or 5432
+    return f"postgresql+psycopg2://{user_db.db_user}:{db_password}@{host}:{port}/{user_db.db_name}"
+
+
+class EngineRegistry:
+    """Process-wide pooled engines for user databases, keyed by UserDatabase.id and credential fingerprint"""
+
+    def __init__(self, pool_size: int = POOL_SIZE, max_overflow: int = MAX_OVERFLOW,
+                 pool_timeout: int = POOL_TIMEOUT, pool_recycle: int = POOL_RECYCLE,
+                 max_engines: int = MAX_ENGINES, idle_seconds: int = IDLE_SECONDS,
+                 reap_interval: int = REAP_INTERVAL_SECONDS):
+        self.pool_size = pool_size
+        self.max_overflow = max_overflow
+        self.pool_timeout = pool_timeout
+        self.pool_recycle = pool_recycle
+        self.max_engines = max_engines
+        self.idle_seconds = idle_seconds
+        self.reap_interval = reap_interval
+        # (db_id, fingerprint) -> [engine, last_used]; ordered from least to most recently used
+        self._engines: "OrderedDict[Tuple[int, str], list]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._reaper: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def _create_engine(self, user_db) -> Engine:
+        return create_engine(
+            build_database_url(user_db),
+            pool_size=self.pool_size,
+            max_overflow=self.max_overflow,
+            pool_timeout=self.pool_timeout,
+            pool_recycle=self.pool_recycle,
+            pool_pre_ping=True,
+        )
+
+    def get_engine(self, user_db) -> Engine:
+        """Return the shared engine for this database, creating it on first use"""
+        key = (user_db.id, credential_fingerprint(user_db))
+        stale = []
+        with self._lock:
+            entry = self._engines.get(key)
+            if entry is None:
+                # Credentials changed underneath us: drop pools built for the old ones
+                for other in [k for k in self._engines if k[0] == user_db.id]:
+                    stale.append(self._engines.pop(other)[0])
+                entry = [self._create_engine(user_db), time.monotonic()]
+                self._engines[key] = entry
+            else:
+                entry[1] = time.monotonic()
+                self._engines.move_to_end(key)
+            stale.extend(self._evict_locked(keep=key))
+        for engine in stale:
+            engine.dispose()
+        return entry[0]
+
+    def _evict_locked(self, keep) -> list:
+        """Pop idle and least recently used engines; caller disposes them outside the lock"""
+        now = time.monotonic()
+        evicted = []
+        for key in list(self._engines):
+            if key != keep and now - self._engines[key][1] > self.idle_seconds:
+                evicted.append(self._engines.pop(key)[0])
+        while len(self._engines) > self.max_engines:
+            key = next(iter(self._engines))
+            if key == keep:
+                break
+            evicted.append(self._engines.pop(key)[0])
+        return evicted
+
+    def reap_idle(self) -> int:
+        """Dispose engines that have not been used for idle_seconds"""
+        with self._lock:
+            evicted = self._evict_locked(keep=None)
+        for engine in evicted:
+            engine.dispose()
+        return len(evicted)
+
+    def start_reaper(self) -> None:
+        """Dispose idle engines every reap_interval seconds on a background thread"""
+        with self._lock:
+            if self._reaper is not None and self._reaper.is_alive():
+                return
+            self._stop.clear()
+            self._reaper = threading.Thread(target=self._reap_periodically, name="engine-reaper", daemon=True)
+            self._reaper.start()
+
+    def _reap_periodically(self) -> None:
+        while not self._stop.wait(self.reap_interval):
+            try:
+                self.reap_idle()
+            except Exception as e:
+                print(f"Error disposing idle database pools: {e}")
+
+    def invalidate(self, db_id: int) -> None:
+        """Dispose every engine built for a database, e.g. after its connection was edited or removed"""
+        with self._lock:
+            evicted = [self._engines.pop(key)[0] for key in list(self._engines) if key[0] == db_id]
+        for engine in evicted:
+            engine.dispose()
+
+    def dispose_all(self) -> None:
+        self._stop.set()
+        with self._lock:
+            evicted = [entry[0] for entry in self._engines.values()]
+            self._engines.clear()
+        for engine in evicted:
+            engine.dispose()
+
+    def stats(self) -> Dict[int, Dict[str, Any]]:
+        """Pool usage per database id"""
+        with self._lock:
+            entries = list(self._engines.items())
+        result = {}
+        for (db_id, _), (engine, last_used) in entries:
+            pool = engine.pool
+            result[db_id] = {
+                "size": pool.size() if hasattr(pool, "size") else None,
+                "checked_out": pool.checkedout() if hasattr(pool, "checkedout") else None,
+                "checked_in": pool.checkedin() if hasattr(pool, "checkedin") else None,
+                "overflow": pool.overflow() if hasattr(pool, "overflow") else None,
+                "idle_seconds": round(time.monotonic() - last_used, 1),
+            }
+        return result
+
+
+engine_registry = EngineRegistry()
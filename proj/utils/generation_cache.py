@@ -0,0 +1,55 @@
+import os
+import re
+import hashlib
+import threading
+from typing import Dict
+from dotenv import load_dotenv
+
+
+load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), "..", ".env"))
+
+GENERATION_CACHE_TTL = int(os.getenv("GENERATION_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+GENERATION_CACHE_MAX_ENTRIES = int(os.getenv("GENERATION_CACHE_MAX_ENTRIES", "10000"))
+
+# Quotes, and sentence punctuation where it ends a word; operators, %, - and punctuation inside
+# tokens ("1.5", "sales.orders", "10:30") change the question and are kept
+_PUNCTUATION = re.compile(r"""["'`\u2018\u2019\u201c\u201d]|[.,;:!?]+(?=\s|$)""")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Fold case, sentence punctuation, quotes and whitespace so trivially different phrasings share a cache entry"""
+    prompt = _PUNCTUATION.sub(" ", prompt.lower())
+    return _WHITESPACE.sub(" ", prompt).strip()
+
+
+def make_cache_key(db_id: int, prompt: str, schema_fingerprint: str, model_name: str) -> str:
+    raw = "\x1f".join([str(db_id), model_name, schema_fingerprint, normalize_prompt(prompt)])
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+class GenerationCacheStats:
+    """In-process hit/miss counters for the persistent generation cache"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+
+    def record(self, outcome: str) -> None:
+        with self._lock:
+            setattr(self, outcome, getattr(self, outcome) + 1)
+
+    def snapshot(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "bypassed": self.bypassed,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+generation_cache_stats = GenerationCacheStats()
@@ -0,0 +1,208 @@
+import os
+import time
+import queue
+import threading
+from datetime import datetime
+from typing import Any, Dict, List, NamedTuple, Optional
+from dotenv import load_dotenv
+from sqlalchemy import insert, update, bindparam
+from sqlmodel import Session
+from models.query_model import QueryHistory
+from models.cache_model import GenerationCache
+from database import engine
+from utils.concurrency import run_blocking
+
+
+load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), "..", ".env"))
+
+# A batch is written once it holds HISTORY_BATCH_SIZE rows or its oldest row waited HISTORY_FLUSH_INTERVAL_MS
+HISTORY_BATCH_SIZE = int(os.getenv("HISTORY_BATCH_SIZE", "200"))
+HISTORY_FLUSH_INTERVAL_MS = int(os.getenv("HISTORY_FLUSH_INTERVAL_MS", "500"))
+# Rows waiting to be written; bounds memory if the metadata store stalls
+HISTORY_QUEUE_MAX = int(os.getenv("HISTORY_QUEUE_MAX", "10000"))
+# "drop": discard new rows while the queue is full; "block": make the request wait up to HISTORY_BLOCK_TIMEOUT_MS first
+HISTORY_QUEUE_FULL_POLICY = os.getenv("HISTORY_QUEUE_FULL_POLICY", "drop").lower()
+HISTORY_BLOCK_TIMEOUT_MS = int(os.getenv("HISTORY_BLOCK_TIMEOUT_MS", "1000"))
+HISTORY_WRITE_RETRIES = 3
+
+_STOP = object()
+
+
+class _CacheHit(NamedTuple):
+    cache_key: str
+    used_at: datetime
+
+
+class HistoryWriter:
+    """
+    Write-behind recorder for query history and generation cache hits.
+
+    Requests only put a row on a bounded queue; a single background thread inserts the
+    queued rows in batches (one transaction each), so executing SQL never waits on a
+    metadata commit. Rows are timestamped when recorded, not when written, and appear in
+    /query-history within HISTORY_FLUSH_INTERVAL_MS. Cache hits ride along: a batch adds
+    them to hit_count / last_used_at with one UPDATE per cache key.
+    """
+
+    def __init__(self, bind=engine, batch_size: int = HISTORY_BATCH_SIZE,
+                 flush_interval_ms: int = HISTORY_FLUSH_INTERVAL_MS, max_queue: int = HISTORY_QUEUE_MAX,
+                 policy: str = HISTORY_QUEUE_FULL_POLICY, block_timeout_ms: int = HISTORY_BLOCK_TIMEOUT_MS):
+        self.bind = bind
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval_ms / 1000
+        self.policy = policy
+        self.block_timeout = block_timeout_ms / 1000
+        self._queue: "queue.Queue[Any]" = queue.Queue(maxsize=max_queue)
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self.recorded = 0
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self.batches = 0
+
+    def start(self) -> None:
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="history-writer", daemon=True)
+                self._thread.start()
+
+    def _entry(self, db_id: int, prompt: Optional[str], sql: str, success: bool,
+               error: Optional[str], duration_ms: Optional[int]) -> Dict[str, Any]:
+        return {
+            "user_database_id": db_id,
+            "original_prompt": prompt if prompt is not None else sql,
+            "generated_sql": sql,
+            "success": success,
+            "error_message": error,
+            "duration_ms": duration_ms,
+            "executed_at": datetime.utcnow(),
+        }
+
+    def _offer(self, entry: Dict[str, Any], wait: bool) -> bool:
+        self.start()
+        try:
+            if wait:
+                self._queue.put(entry, timeout=self.block_timeout)
+            else:
+                self._queue.put_nowait(entry)
+        except queue.Full:
+            self.dropped += 1
+            return False
+        self.recorded += 1
+        return True
+
+    def record(self, db_id: int, prompt: Optional[str], sql: str, success: bool = True,
+               error: Optional[str] = None, duration_ms: Optional[int] = None) -> bool:
+        """
+        Queue one history row from a worker thread.
+
+        Returns:
+            bool: False when the row was dropped because the queue stayed full
+        """
+        entry = self._entry(db_id, prompt, sql, success, error, duration_ms)
+        return self._offer(entry, wait=self.policy == "block")
+
+    async def submit(self, db_id: int, prompt: Optional[str], sql: str, success: bool = True,
+                     error: Optional[str] = None, duration_ms: Optional[int] = None) -> bool:
+        """Same as record, for the event loop: never blocks it, waiting happens on the worker pool"""
+        entry = self._entry(db_id, prompt, sql, success, error, duration_ms)
+        if self.policy != "block":
+            return self._offer(entry, wait=False)
+        self.start()
+        try:
+            self._queue.put_nowait(entry)
+        except queue.Full:
+            return await run_blocking(self._offer, entry, True)
+        self.recorded += 1
+        return True
+
+    def record_cache_hit(self, cache_key: str) -> None:
+        """Queue the hit bookkeeping of a generation cache entry; skipped while the queue is full"""
+        self.start()
+        try:
+            self._queue.put_nowait(_CacheHit(cache_key, datetime.utcnow()))
+        except queue.Full:
+            pass
+
+    def _collect(self, first: Any) -> List[Any]:
+        batch = [first]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size and batch[-1] is not _STOP:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, rows: List[Dict[str, Any]], hits: List[_CacheHit]) -> None:
+        # Hits on the same entry within a batch become one UPDATE
+        counts: Dict[str, List[Any]] = {}
+        for hit in hits:
+            entry = counts.setdefault(hit.cache_key, [0, hit.used_at])
+            entry[0] += 1
+            entry[1] = max(entry[1], hit.used_at)
+        hit_params = [{"key": key, "hits": n, "used_at": used_at} for key, (n, used_at) in counts.items()]
+        table = GenerationCache.__table__
+        for attempt in range(HISTORY_WRITE_RETRIES):
+            try:
+                with Session(self.bind) as session:
+                    if rows:
+                        session.execute(insert(QueryHistory), rows)
+                    if hit_params:
+                        session.connection().execute(
+                            update(table)
+                            .where(table.c.cache_key == bindparam("key"))
+                            .values(hit_count=table.c.hit_count + bindparam("hits"), last_used_at=bindparam("used_at")),
+                            hit_params,
+                        )
+                    session.commit()
+                self.written += len(rows)
+                self.batches += 1
+                return
+            except Exception as e:
+                print(f"Error writing query history batch ({len(rows)} rows, attempt {attempt + 1}): {e}")
+                time.sleep(0.1 * 2 ** attempt)
+        self.failed += len(rows)
+
+    def _run(self) -> None:
+        while True:
+            batch = self._collect(self._queue.get())
+            rows = [entry for entry in batch if isinstance(entry, dict)]
+            hits = [entry for entry in batch if isinstance(entry, _CacheHit)]
+            try:
+                if rows or hits:
+                    self._write(rows, hits)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+            if batch[-1] is _STOP:
+                return
+
+    def flush(self) -> None:
+        """Block until every row queued so far has been written (or given up on)"""
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.join()
+
+    def shutdown(self, timeout: float = 10) -> None:
+        """Write what is still queued and stop the writer thread; called on graceful shutdown"""
+        with self._lock:
+            thread = self._thread
+        if thread is None or not thread.is_alive():
+            return
+        self._queue.put(_STOP)
+        thread.join(timeout)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "queued": self._queue.qsize(),
+            "recorded": self.recorded,
+            "written": self.written,
+            "batches": self.batches,
+            "dropped": self.dropped,
+            "failed": self.failed,
+        }
+
+
+history_writer = HistoryWriter()
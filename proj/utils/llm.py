@@ -0,0 +1,310 @@
+import os
+import time
+import random
+import hashlib
+import threading
+from typing import Callable, Dict, Iterator, List, Optional
+from dotenv import load_dotenv
+from utils.single_flight import SingleFlight
+from utils.metrics import LLM_SECONDS, LLM_FIRST_TOKEN_SECONDS, LLM_CALLS, LLM_RETRIES, LLM_IN_FLIGHT, ERRORS
+
+
+load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), "..", ".env"))
+
+# "gemini", or "fake" for tests and offline runs
+LLM_PROVIDER = os.getenv("LLM_PROVIDER", "gemini").lower()
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-1.5-pro")
+# Model calls in flight across the process, and per user
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))
+LLM_USER_MAX_CONCURRENCY = int(os.getenv("LLM_USER_MAX_CONCURRENCY", "2"))
+# How long a call may wait for a slot before it is rejected with LLMBusy
+LLM_QUEUE_TIMEOUT_SECONDS = float(os.getenv("LLM_QUEUE_TIMEOUT_SECONDS", "30"))
+# Retries of rate-limited/unavailable calls, sleeping a random time up to base * 2^attempt (capped)
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "4"))
+LLM_BACKOFF_BASE_MS = int(os.getenv("LLM_BACKOFF_BASE_MS", "500"))
+LLM_BACKOFF_MAX_MS = int(os.getenv("LLM_BACKOFF_MAX_MS", "10000"))
+
+
+class LLMBusy(Exception):
+    """Raised when no concurrency slot freed up within LLM_QUEUE_TIMEOUT_SECONDS"""
+
+
+class LLMProvider:
+    """A text generation backend; implementations must be safe to call from several threads"""
+
+    model_name: str = ""
+
+    def generate(self, prompt: str) -> str:
+        raise NotImplementedError
+
+    def stream(self, prompt: str) -> Iterator[str]:
+        raise NotImplementedError
+
+    def is_retryable(self, error: Exception) -> bool:
+        """Whether the error is transient (rate limit, overload) and the call may be repeated"""
+        return False
+
+
+class GeminiProvider(LLMProvider):
+    """
+    Gemini through google.generativeai. The library is configured once and the model object (with
+    its client and channel) is shared, so calls reuse connections instead of opening new ones.
+    """
+
+    def __init__(self, model_name: str = GEMINI_MODEL, api_key: Optional[str] = None):
+        import google.generativeai as genai
+        from google.api_core import exceptions
+
+        genai.configure(api_key=api_key or os.getenv("GEMINI_API_KEY"))
+        self.model_name = model_name
+        self.model = genai.GenerativeModel(model_name)
+        self._retryable = (exceptions.TooManyRequests, exceptions.ResourceExhausted, exceptions.ServiceUnavailable)
+
+    def generate(self, prompt: str) -> str:
+        return self.model.generate_content(prompt).text
+
+    def stream(self, prompt: str) -> Iterator[str]:
+        for chunk in self.model.generate_content(prompt, stream=True):
+            try:
+                text = chunk.text
+            except ValueError:
+                # Chunks without text parts (e.g. only a finish reason)
+                continue
+            if text:
+                yield text
+
+    def is_retryable(self, error: Exception) -> bool:
+        return isinstance(error, self._retryable)
+
+
+class FakeRateLimited(Exception):
+    """Rate-limit error understood by FakeProvider, to exercise retries"""
+
+
+class FakeProvider(LLMProvider):
+    """
+    Deterministic local provider for tests and benchmarks.
+
+    Answers with answer(prompt) (a fixed query by default) after latency seconds and streams the
+    answer in chunk_size pieces. Every prompt is kept in prompts. Errors queued in fail_with are
+    raised by the next calls, one each.
+    """
+
+    def __init__(self, answer: Optional[Callable[[str], str]] = None, latency: float = 0.0,
+                 chunk_size: int = 16, model_name: str = "fake"):
+        self.answer = answer or (lambda prompt: "SELECT 1")
+        self.latency = latency
+        self.chunk_size = chunk_size
+        self.model_name = model_name
+        self.prompts: List[str] = []
+        self.fail_with: List[Exception] = []
+        self._lock = threading.Lock()
+
+    def _call(self, prompt: str) -> str:
+        with self._lock:
+            self.prompts.append(prompt)
+            error = self.fail_with.pop(0) if self.fail_with else None
+        time.sleep(self.latency)
+        if error is not None:
+            raise error
+        return self.answer(prompt)
+
+    def generate(self, prompt: str) -> str:
+        return self._call(prompt)
+
+    def stream(self, prompt: str) -> Iterator[str]:
+        text = self._call(prompt)
+        for i in range(0, len(text), self.chunk_size):
+            yield text[i:i + self.chunk_size]
+
+    def is_retryable(self, error: Exception) -> bool:
+        return isinstance(error, FakeRateLimited)
+
+
+class _UserSlots:
+    """Per-user semaphores, dropped again once nobody holds or waits for them"""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        # user_id -> [semaphore, holders and waiters]
+        self._slots: Dict[int, list] = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, user_id: int, timeout: float) -> bool:
+        with self._lock:
+            entry = self._slots.setdefault(user_id, [threading.BoundedSemaphore(self.limit), 0])
+            entry[1] += 1
+        if entry[0].acquire(timeout=max(timeout, 0)):
+            return True
+        self._forget(user_id, entry)
+        return False
+
+    def release(self, user_id: int) -> None:
+        with self._lock:
+            entry = self._slots[user_id]
+        entry[0].release()
+        self._forget(user_id, entry)
+
+    def _forget(self, user_id: int, entry: list) -> None:
+        with self._lock:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._slots[user_id]
+
+
+class LLMClient:
+    """
+    Process-wide entry point for model calls.
+
+    Identical prompts in flight at the same time share one call; calls hold a global and a
+    per-user slot while they run, and rate-limit errors are retried with jittered exponential
+    backoff. Blocking: call from worker threads (utils.concurrency.run_blocking).
+    """
+
+    def __init__(self, provider: Optional[LLMProvider] = None, max_concurrency: int = LLM_MAX_CONCURRENCY,
+                 user_max_concurrency: int = LLM_USER_MAX_CONCURRENCY, queue_timeout: float = LLM_QUEUE_TIMEOUT_SECONDS,
+                 max_retries: int = LLM_MAX_RETRIES, backoff_base_ms: int = LLM_BACKOFF_BASE_MS,
+                 backoff_max_ms: int = LLM_BACKOFF_MAX_MS):
+        self._provider = provider
+        self.queue_timeout = queue_timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base_ms / 1000
+        self.backoff_max = backoff_max_ms / 1000
+        self._global = threading.BoundedSemaphore(max_concurrency)
+        self._users = _UserSlots(user_max_concurrency)
+        self._flight = SingleFlight()
+        self._lock = threading.Lock()
+
+    @property
+    def provider(self) -> LLMProvider:
+        # Built on first use, so processes that never generate never configure the SDK
+        with self._lock:
+            if self._provider is None:
+                self._provider = FakeProvider() if LLM_PROVIDER == "fake" else GeminiProvider()
+            return self._provider
+
+    def use(self, provider: LLMProvider) -> None:
+        """Swap the provider, e.g. for a FakeProvider in tests"""
+        with self._lock:
+            self._provider = provider
+
+    @property
+    def model_name(self) -> str:
+        # Known without building the provider: cache keys need it even when nothing is generated
+        provider = self._provider
+        if provider is not None:
+            return provider.model_name
+        return "fake" if LLM_PROVIDER == "fake" else GEMINI_MODEL
+
+    def _acquire(self, user_id: Optional[int]) -> None:
+        deadline = time.monotonic() + self.queue_timeout
+        # The user's own slot first, so one user's backlog never sits on global slots
+        if user_id is not None and not self._users.acquire(user_id, self.queue_timeout):
+            LLM_CALLS.labels(outcome="rejected").inc()
+            raise LLMBusy("Too many generation requests for this user")
+        if not self._global.acquire(timeout=max(deadline - time.monotonic(), 0)):
+            if user_id is not None:
+                self._users.release(user_id)
+            LLM_CALLS.labels(outcome="rejected").inc()
+            raise LLMBusy("Too many generation requests")
+        LLM_IN_FLIGHT.inc()
+
+    def _release(self, user_id: Optional[int]) -> None:
+        LLM_IN_FLIGHT.dec()
+        self._global.release()
+        if user_id is not None:
+            self._users.release(user_id)
+
+    def backoff(self, attempt: int) -> float:
+        """Full jitter: uniform between 0 and the capped exponential delay"""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def _with_retries(self, provider: LLMProvider, call: Callable[[], str]) -> str:
+        attempt = 0
+        while True:
+            started = time.perf_counter()
+            try:
+                return call()
+            except Exception as e:
+                if attempt >= self.max_retries or not provider.is_retryable(e):
+                    raise
+                print(f"Model call rate-limited (attempt {attempt + 1}): {e}")
+                LLM_RETRIES.inc()
+            finally:
+                LLM_SECONDS.labels(model=provider.model_name, mode="complete").observe(time.perf_counter() - started)
+            time.sleep(self.backoff(attempt))
+            attempt += 1
+
+    def _generate(self, prompt: str, user_id: Optional[int]) -> str:
+        provider = self.provider
+        self._acquire(user_id)
+        try:
+            text = self._with_retries(provider, lambda: provider.generate(prompt))
+        except Exception:
+            LLM_CALLS.labels(outcome="error").inc()
+            ERRORS.labels(stage="llm").inc()
+            raise
+        finally:
+            self._release(user_id)
+        LLM_CALLS.labels(outcome="success").inc()
+        return text
+
+    def generate(self, prompt: str, user_id: Optional[int] = None) -> str:
+        """
+        Complete a prompt.
+
+        Raises:
+            LLMBusy: When no slot became free within queue_timeout
+        """
+        key = (self.model_name, hashlib.sha256(prompt.encode()).hexdigest())
+        led = []
+
+        def call():
+            led.append(True)
+            return self._generate(prompt, user_id)
+
+        text = self._flight.do(key, call)
+        if not led:
+            LLM_CALLS.labels(outcome="coalesced").inc()
+        return text
+
+    def stream(self, prompt: str, user_id: Optional[int] = None) -> Iterator[str]:
+        """
+        Complete a prompt, yielding text as it arrives. Not coalesced; a rate-limited call is only
+        retried while nothing has been yielded yet. The slots are held until the iterator finishes.
+
+        Raises:
+            LLMBusy: When no slot became free within queue_timeout
+        """
+        provider = self.provider
+        self._acquire(user_id)
+        started = time.perf_counter()
+        attempt = 0
+        yielded = False
+        try:
+            while True:
+                try:
+                    for text in provider.stream(prompt):
+                        if not yielded:
+                            yielded = True
+                            LLM_FIRST_TOKEN_SECONDS.labels(model=provider.model_name).observe(time.perf_counter() - started)
+                        yield text
+                    break
+                except Exception as e:
+                    if yielded or attempt >= self.max_retries or not provider.is_retryable(e):
+                        raise
+                    print(f"Model stream rate-limited (attempt {attempt + 1}): {e}")
+                    LLM_RETRIES.inc()
+                time.sleep(self.backoff(attempt))
+                attempt += 1
+        except Exception:
+            LLM_CALLS.labels(outcome="error").inc()
+            ERRORS.labels(stage="llm").inc()
+            raise
+        finally:
+            LLM_SECONDS.labels(model=provider.model_name, mode="stream").observe(time.perf_counter() - started)
+            self._release(user_id)
+        LLM_CALLS.labels(outcome="success").inc()
+
+
+llm_client = LLMClient()
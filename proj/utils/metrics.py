@@ -0,0 +1,219 @@
+import os
+import time
+from contextlib import contextmanager
+from typing import Optional
+from dotenv import load_dotenv
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, generate_latest, CONTENT_TYPE_LATEST
+from prometheus_client import ProcessCollector, PlatformCollector, GCCollector
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from prometheus_client.registry import Collector
+from auth.password_pool import password_hasher
+from utils.engine_registry import engine_registry
+from utils.generation_cache import generation_cache_stats
+from utils.history_writer import history_writer
+from utils.ownership_cache import ownership_cache
+from utils.query_registry import query_registry
+from utils.prewarm import prewarm_scheduler
+from utils.result_cache import result_cache
+from utils.schema_cache import schema_cache
+
+
+load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), "..", ".env"))
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() in ("1", "true", "yes")
+# /metrics requires "Authorization: Bearer <METRICS_TOKEN>"; without a token it is not served at all,
+# unless METRICS_ALLOW_ANONYMOUS opts in (e.g. when only a private scrape network can reach the port)
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+METRICS_ALLOW_ANONYMOUS = os.getenv("METRICS_ALLOW_ANONYMOUS", "false").lower() in ("1", "true", "yes")
+
+# Own registry, so only this process's collectors end up on /metrics
+registry = CollectorRegistry()
+ProcessCollector(registry=registry)
+PlatformCollector(registry=registry)
+GCCollector(registry=registry)
+
+_LLM_BUCKETS = (0.25, 0.5, 1, 2, 4, 8, 16, 32, 64, 128)
+_EXECUTION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "speakql_http_request_seconds", "Request latency until the response body is complete",
+    ["method", "route", "status"], registry=registry,
+)
+INTROSPECTION_SECONDS = Histogram(
+    "speakql_introspection_seconds", "Schema introspection time per phase (list, describe, stats, preview, count, fingerprint)",
+    ["phase"], registry=registry,
+)
+PROMPT_BYTES = Histogram(
+    "speakql_prompt_bytes", "Size of the final generation prompt in bytes",
+    buckets=(1024, 2048, 4096, 8192, 16384, 32768, 65536, 131072, 262144), registry=registry,
+)
+PROMPT_TOKENS = Histogram(
+    "speakql_prompt_tokens", "Estimated tokens of the final generation prompt",
+    buckets=(256, 512, 1024, 2048, 4096, 8192, 16384, 32768, 65536), registry=registry,
+)
+LLM_SECONDS = Histogram(
+    "speakql_llm_seconds", "Model latency until the full response arrived",
+    ["model", "mode"], buckets=_LLM_BUCKETS, registry=registry,
+)
+LLM_FIRST_TOKEN_SECONDS = Histogram(
+    "speakql_llm_first_token_seconds", "Streaming model latency until the first text chunk",
+    ["model"], buckets=_LLM_BUCKETS, registry=registry,
+)
+EXECUTION_SECONDS = Histogram(
+    "speakql_execution_seconds", "SQL execution time including plan guard and waiting for a database slot",
+    ["kind", "outcome"], buckets=_EXECUTION_BUCKETS, registry=registry,
+)
+EXECUTION_ROWS = Histogram(
+    "speakql_execution_rows", "Rows returned by successful executions",
+    ["kind"], buckets=(0, 1, 10, 100, 1000, 10000, 100000, 1000000), registry=registry,
+)
+LLM_CALLS = Counter(
+    "speakql_llm_calls", "Generation calls by outcome (success, error, coalesced onto an identical call, rejected while waiting for a slot)",
+    ["outcome"], registry=registry,
+)
+LLM_RETRIES = Counter(
+    "speakql_llm_retries", "Model calls retried after a rate-limit or unavailable error", registry=registry,
+)
+LLM_IN_FLIGHT = Gauge(
+    "speakql_llm_in_flight", "Model calls holding a concurrency slot", registry=registry,
+)
+ERRORS = Counter(
+    "speakql_errors", "Failures by stage (introspection, llm, execution, plan_guard)",
+    ["stage"], registry=registry,
+)
+
+
+@contextmanager
+def timed(histogram: Histogram, stage: Optional[str] = None, **labels):
+    """Observe the block's duration; exceptions are counted under ERRORS[stage] (if given) and re-raised"""
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        if stage:
+            ERRORS.labels(stage=stage).inc()
+        raise
+    finally:
+        (histogram.labels(**labels) if labels else histogram).observe(time.perf_counter() - started)
+
+
+def observe_prompt(prompt: str, tokens: int) -> None:
+    PROMPT_BYTES.observe(len(prompt.encode()))
+    PROMPT_TOKENS.observe(tokens)
+
+
+def observe_execution(kind: str, outcome: str, seconds: float, rows: Optional[int] = None) -> None:
+    """
+    Record one execution. outcome is "success", "error", "cancelled" or "rejected"
+    (plan guard); cached results are not executions and are counted by the result cache.
+    """
+    EXECUTION_SECONDS.labels(kind=kind, outcome=outcome).observe(seconds)
+    if outcome == "success" and rows is not None:
+        EXECUTION_ROWS.labels(kind=kind).observe(rows)
+    elif outcome != "success":
+        ERRORS.labels(stage="plan_guard" if outcome == "rejected" else "execution").inc()
+
+
+_CACHE_OUTCOMES = {"hits": "hit", "misses": "miss", "bypassed": "bypassed"}
+
+
+class ServiceStatsCollector(Collector):
+    """Reads the in-process counters the services already keep (caches, queues, pools) at scrape time"""
+
+    def _cache(self, name: str, stats) -> list:
+        family = CounterMetricFamily(f"speakql_{name}_cache_lookups", f"Lookups in the {name} cache", labels=["outcome"])
+        for key, outcome in _CACHE_OUTCOMES.items():
+            if key in stats:
+                family.add_metric([outcome], stats[key])
+        return [family]
+
+    def collect(self):
+        yield from self._cache("generation", generation_cache_stats.snapshot())
+        yield from self._cache("schema", schema_cache.stats())
+        yield from self._cache("ownership", ownership_cache.stats())
+
+        results = result_cache.stats()
+        yield from self._cache("result", results)
+        yield GaugeMetricFamily("speakql_result_cache_bytes", "Encoded size of the cached query results", value=results["bytes"])
+        yield GaugeMetricFamily("speakql_result_cache_entries", "Cached query results", value=results["entries"])
+        yield CounterMetricFamily("speakql_result_cache_evictions", "Results evicted to stay under RESULT_CACHE_MAX_BYTES", value=results["evictions"])
+        yield CounterMetricFamily("speakql_result_cache_invalidations", "Result cache invalidations caused by writes", value=results["invalidations"])
+
+        history = history_writer.stats()
+        yield GaugeMetricFamily("speakql_history_queue_rows", "History rows waiting to be written", value=history["queued"])
+        rows = CounterMetricFamily("speakql_history_rows", "History rows by fate", labels=["state"])
+        for state in ("recorded", "written", "dropped", "failed"):
+            rows.add_metric([state], history[state])
+        yield rows
+
+        hashing = password_hasher.stats()
+        yield GaugeMetricFamily("speakql_password_hash_in_flight", "bcrypt calls running or waiting for a worker", value=hashing["in_flight"])
+        yield CounterMetricFamily("speakql_password_hash_rejected", "bcrypt calls rejected with 503 because the pool was saturated", value=hashing["rejected"])
+
+        prewarm = prewarm_scheduler.stats()
+        jobs = GaugeMetricFamily("speakql_prewarm_jobs", "Background introspection jobs queued or running", labels=["state"])
+        for state in ("queued", "running"):
+            jobs.add_metric([state], prewarm[state])
+        yield jobs
+        finished = CounterMetricFamily("speakql_prewarm_jobs_finished", "Background introspection jobs by outcome", labels=["outcome"])
+        for outcome in ("completed", "failed", "dropped"):
+            finished.add_metric([outcome], prewarm[outcome])
+        yield finished
+
+        yield GaugeMetricFamily("speakql_running_queries", "Executions in flight against user databases", value=query_registry.count())
+        yield CounterMetricFamily("speakql_query_cancels", "Cancel requests delivered to PostgreSQL", value=query_registry.cancelled)
+
+        pools = GaugeMetricFamily("speakql_db_pool_connections", "Connections of each user database's pool by state", labels=["db_id", "state"])
+        limits = GaugeMetricFamily("speakql_db_pool_limit", "Most connections a user database's pool will open", labels=["db_id"])
+        for db_id, pool in engine_registry.stats().items():
+            for state in ("checked_out", "checked_in"):
+                if pool.get(state) is not None:
+                    pools.add_metric([str(db_id), state], pool[state])
+            if pool.get("size") is not None:
+                limits.add_metric([str(db_id)], pool["size"] + engine_registry.max_overflow)
+        yield pools
+        yield limits
+
+
+registry.register(ServiceStatsCollector())
+
+
+def render_metrics():
+    """Exposition body and content type for /metrics"""
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def _route_template(scope) -> str:
+    """The matched route with its parameters put back, e.g. /agent/queries/{query_id}/cancel"""
+    if scope.get("route") is None:
+        return "unmatched"
+    path = scope["path"]
+    for name, value in scope.get("path_params", {}).items():
+        path = path.replace(f"/{value}", f"/{{{name}}}", 1)
+    return path
+
+
+class MetricsMiddleware:
+    """ASGI middleware timing every HTTP request by method, route template and status; streams are timed to their last chunk"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        response_status = [500]
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                response_status[0] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # Template, not the raw path, so ids do not create a series each
+            HTTP_REQUEST_SECONDS.labels(method=scope["method"], route=_route_template(scope),
+                                        status=str(response_status[0])).observe(time.perf_counter() - started)
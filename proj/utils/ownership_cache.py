@@ -0,0 +1,81 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional, Tuple
+from dotenv import load_dotenv
+from models.db_model import UserDatabase
+
+
+load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), "..", ".env"))
+
+# Bounds how long another worker process can keep serving a database that was changed or deleted
+OWNERSHIP_CACHE_TTL = int(os.getenv("OWNERSHIP_CACHE_TTL_SECONDS", "30"))
+OWNERSHIP_CACHE_MAX_USERS = int(os.getenv("OWNERSHIP_CACHE_MAX_USERS", "10000"))
+
+
+def _detached_copy(user_db: UserDatabase) -> UserDatabase:
+    # Plain column values only, so entries are safe to share between requests and sessions
+    return UserDatabase(**user_db.model_dump())
+
+
+class OwnershipCache:
+    """user_id -> {db_id: UserDatabase} so authorization checks need no metadata query"""
+
+    def __init__(self, ttl: int = OWNERSHIP_CACHE_TTL, max_users: int = OWNERSHIP_CACHE_MAX_USERS):
+        self.ttl = ttl
+        self.max_users = max_users
+        self._entries: "OrderedDict[int, Tuple[float, Dict[int, UserDatabase]]]" = OrderedDict()
+        # Bumped on invalidation so a load that started before it is not stored afterwards
+        self._generations: Dict[int, int] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def peek(self, user_id: int) -> Optional[Dict[int, UserDatabase]]:
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None or time.monotonic() - entry[0] >= self.ttl:
+                self._entries.pop(user_id, None)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+            return entry[1]
+
+    def generation(self, user_id: int) -> int:
+        with self._lock:
+            return self._generations.get(user_id, 0)
+
+    def store(self, user_id: int, databases: Iterable[UserDatabase], generation: int) -> Dict[int, UserDatabase]:
+        """
+        Cache a user's databases as loaded from the metadata store.
+
+        Args:
+            user_id: Owner of the databases
+            databases: Result of get_user_databases
+            generation: Value of generation(user_id) taken before loading
+
+        Returns:
+            dict: db_id -> detached UserDatabase copy
+        """
+        mapping = {db.id: _detached_copy(db) for db in databases}
+        with self._lock:
+            if self._generations.get(user_id, 0) == generation:
+                self._entries[user_id] = (time.monotonic(), mapping)
+                self._entries.move_to_end(user_id)
+                while len(self._entries) > self.max_users:
+                    self._entries.popitem(last=False)
+        return mapping
+
+    def invalidate(self, user_id: int) -> None:
+        with self._lock:
+            self._entries.pop(user_id, None)
+            self._generations[user_id] = self._generations.get(user_id, 0) + 1
+
+    def stats(self):
+        with self._lock:
+            return {"users": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+ownership_cache = OwnershipCache()
@@ -1,11 +1,27 @@
 from sqlalchemy.engine import Engine
 from sqlalchemy import inspect, text
+from sqlalchemy.exc import NoSuchTableError
 from typing import List, Dict, Any, Optional, Union
 from sqlalchemy.orm import sessionmaker
 from cryptography.fernet import Fernet
 from models.db_model import UserDatabase
-from utils.encryption import decrypt_password
-from sqlalchemy import create_engine
+from utils.engine_registry import engine_registry
+from utils.catalog import load_schema_catalog, schema_fingerprints, load_schema_directory, estimate_row_counts, exact_row_counts
+from utils.sampling import load_column_stats, sample_rows
+from utils.result_encoding import encode_result_rows
+from utils.query_registry import RunningQuery, query_registry
+from utils.query_guard import ExecutionPolicy, PlanRejected, prepare_transaction, driver_statement, transaction_wrote, ensure_single_statement
+from utils.metrics import INTROSPECTION_SECONDS, timed
+from dotenv import load_dotenv
+import os
+
+
+load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), "..", ".env"))
+
+# Tables estimated at or below this many rows get an exact COUNT(*); larger ones keep the estimate
+ROW_COUNT_EXACT_THRESHOLD = int(os.getenv("ROW_COUNT_EXACT_THRESHOLD", "10000"))
+# Never-analyzed tables have no estimate; count them exactly only if their heap is this small
+ROW_COUNT_EXACT_MAX_BYTES = int(os.getenv("ROW_COUNT_EXACT_MAX_BYTES", str(8 * 1024 * 1024)))
 
 class PostgreSQLTools:
     def __init__(self, engine: Engine = None):
@@ -17,50 +33,37 @@ class PostgreSQLTools:
 
     def list_schemas(self) -> List[str]:
         """List all schemas in the database"""
-        return inspect(self.engine).get_schema_names()
+        with timed(INTROSPECTION_SECONDS, "introspection", phase="list"):
+            return inspect(self.engine).get_schema_names()
 
     def list_tables(self, schema: str = 'public') -> List[str]:
         """List tables in a specific schema"""
-        return inspect(self.engine).get_table_names(schema=schema)
+        with timed(INTROSPECTION_SECONDS, "introspection", phase="list"):
+            return inspect(self.engine).get_table_names(schema=schema)
 
     def describe_table(self, table_name: str, schema: str = 'public') -> Dict[str, Any]:
         """Get complete table metadata"""
-        inspector = inspect(self.engine)
-        cols = inspector.get_columns(table_name, schema=schema)
-        pks = inspector.get_pk_constraint(table_name, schema=schema).get("constrained_columns", [])
-        fks = inspector.get_foreign_keys(table_name, schema=schema)
-        indexes = inspector.get_indexes(table_name, schema=schema)
-        
-        return {
-            "schema": schema,
-            "table_name": table_name,
-            "columns": [
-                {
-                    "name": c["name"],
-                    "type": str(c["type"]),
-                    "nullable": c["nullable"],
-                    "primary_key": c["name"] in pks,
-                    **self._get_column_metadata(table_name, schema, c["name"])
-                } for c in cols
-            ],
-            "foreign_keys": fks,
-            "indexes": indexes
-        }
-
-    def _get_column_metadata(self, table: str, schema: str, column: str) -> Dict[str, Any]:
-        """Get additional column metadata like comments"""
-        with self.engine.connect() as conn:
-            try:
-                comment = conn.execute(text("""
-                    SELECT pgd.description FROM pg_catalog.pg_description pgd
-                    JOIN pg_catalog.pg_class pgc ON pgd.objoid = pgc.oid
-                    JOIN pg_catalog.pg_namespace pgn ON pgc.relnamespace = pgn.oid
-                    JOIN pg_attribute pga ON pgd.objoid = pga.attrelid AND pgd.objsubid = pga.attnum
-                    WHERE pgn.nspname = :schema AND pgc.relname = :table AND pga.attname = :column
-                """), {'schema': schema, 'table': table, 'column': column}).scalar()
-                return {"comment": comment}
-            except:
-                return {}
+        with timed(INTROSPECTION_SECONDS, "introspection", phase="describe"), self.engine.connect() as conn:
+            catalog = load_schema_catalog(conn, schema=schema, tables=[table_name])
+        if table_name not in catalog:
+            raise NoSuchTableError(f"{schema}.{table_name}")
+        return catalog[table_name]
+
+    def describe_schema(self, schema: str = 'public') -> Dict[str, Dict[str, Any]]:
+        """Get metadata for every table of a schema in a few catalog queries"""
+        with timed(INTROSPECTION_SECONDS, "introspection", phase="describe"), self.engine.connect() as conn:
+            return load_schema_catalog(conn, schema=schema)
+
+    def schema_fingerprints(self, schemas: List[str] = ('public',)) -> Dict[str, str]:
+        """Hash of the catalog state of each given schema, used to validate cached snapshots"""
+        with timed(INTROSPECTION_SECONDS, "introspection", phase="fingerprint"), self.engine.connect() as conn:
+            return schema_fingerprints(conn, list(schemas))
+
+    def schema_directory(self) -> Dict[str, List[str]]:
+        """Every user schema with the names of its tables, in one catalog query"""
+        with timed(INTROSPECTION_SECONDS, "introspection", phase="list"), self.engine.connect() as conn:
+            return load_schema_directory(conn)
+
     def count_rows_in_table(self, table_name: str, schema: str = 'public') -> int:
         """Count rows in a specific table"""
         with self.engine.connect() as conn:
@@ -69,14 +72,44 @@ class PostgreSQLTools:
             )
             return result.scalar()
 
+    def count_table_rows(self, schema: str = 'public', exact: bool = False) -> Dict[str, Dict[str, Any]]:
+        """
+        Row counts for every table of a schema, from planner statistics where possible.
+
+        Args:
+            schema: Schema to count
+            exact: Force COUNT(*) for every table
+
+        Returns:
+            dict: table name -> {"row_count": int or None, "estimated": bool}
+        """
+        with timed(INTROSPECTION_SECONDS, "introspection", phase="count"), self.engine.connect() as conn:
+            estimates = estimate_row_counts(conn, schema=schema)
+            to_count = [
+                table for table, info in estimates.items()
+                if exact
+                or (info["estimate"] is not None and info["estimate"] <= ROW_COUNT_EXACT_THRESHOLD)
+                or (info["estimate"] is None and info["relation_bytes"] <= ROW_COUNT_EXACT_MAX_BYTES)
+            ]
+            exact_counts = exact_row_counts(conn, schema, to_count) if to_count else {}
+
+        counts = {}
+        for table, info in estimates.items():
+            if table in exact_counts:
+                counts[table] = {"row_count": exact_counts[table], "estimated": False}
+            else:
+                counts[table] = {"row_count": info["estimate"], "estimated": True}
+        return counts
+
     def preview_data(self, table_name: str, schema: str = 'public', limit: int = 5) -> List[Dict[str, Any]]:
-        """Preview table data"""
-        with self.engine.connect() as conn:
-            result = conn.execute(
-                text(f'SELECT * FROM "{schema}"."{table_name}" LIMIT :limit'),
-                {"limit": limit}
-            )
-            return [dict(row._mapping) for row in result]
+        """Preview table data, with large values truncated or elided (see utils.sampling)"""
+        with timed(INTROSPECTION_SECONDS, "introspection", phase="preview"), self.engine.connect() as conn:
+            return sample_rows(conn, schema, table_name, limit=limit)
+
+    def column_stats(self, schema: str = 'public', tables: Optional[List[str]] = None) -> Dict[str, Dict[str, Any]]:
+        """Per-column value summaries of a schema from pg_stats, in one query"""
+        with timed(INTROSPECTION_SECONDS, "introspection", phase="stats"), self.engine.connect() as conn:
+            return load_column_stats(conn, schema=schema, tables=tables)
 
     def execute_query(self, sql: str, params: Optional[Dict] = None) -> Union[List[Dict[str, Any]], Dict[str, str]]:
         """Execute any SQL query safely"""
@@ -86,15 +119,46 @@ class PostgreSQLTools:
                 if not result.returns_rows:
                     conn.commit()
                 if result.returns_rows:
-                    return [dict(row._mapping) for row in result]
+                    return encode_result_rows(result)
                 return {"status": "success", "rows_affected": result.rowcount}
             except Exception as e:
                 return {"error": str(e)}
 
+    def execute_guarded(self, sql: str, policy: ExecutionPolicy, params: Optional[Dict] = None,
+                        running: Optional[RunningQuery] = None) -> Dict[str, Any]:
+        """
+        Execute SQL in one transaction under the policy's timeouts and read-only setting, after the EXPLAIN guard.
+
+        With a registry entry, the backend pid is recorded for the duration so the query can be cancelled.
+
+        Returns:
+            dict: {"result": rows or status, "plan": summary, "wrote": whether the transaction wrote anything}
+                or {"error": message, "plan": summary}
+
+        Raises:
+            PlanRejected: When sql holds several statements, or the estimated plan exceeds the
+                policy's limits in "reject" mode
+        """
+        ensure_single_statement(sql)
+        plan = None
+        with self.engine.connect() as conn:
+            try:
+                with query_registry.attached(running, conn), conn.begin():
+                    explain_sql, explain_params = driver_statement(conn.dialect, sql, params)
+                    plan = prepare_transaction(conn.connection, explain_sql, policy, params=explain_params)
+                    result = conn.execute(text(sql), params or {})
+                    if result.returns_rows:
+                        rows = encode_result_rows(result)
+                    else:
+                        rows = {"status": "success", "rows_affected": result.rowcount}
+                    wrote = transaction_wrote(conn.connection)
+                return {"result": rows, "plan": plan, "wrote": wrote}
+            except PlanRejected:
+                raise
+            except Exception as e:
+                return {"error": str(e), "plan": plan}
+
 
 def get_postgresql_tools(user_db):
-    db_password = decrypt_password(user_db.db_password_encrypted)
-    url = f"postgresql://{user_db.db_user}:{db_password}@{user_db.host}:{user_db.port}/{user_db.db_name}"
-    engine = create_engine(url)
-    return PostgreSQLTools(engine)
+    return PostgreSQLTools(engine_registry.get_engine(user_db))
 
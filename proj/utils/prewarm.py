@@ -0,0 +1,350 @@
+import os
+import time
+import asyncio
+import uuid
+import heapq
+import random
+import itertools
+import threading
+import concurrent.futures
+from collections import deque
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence
+from dotenv import load_dotenv
+from utils.schema_cache import schema_cache
+from utils.concurrency import run_against_database
+from utils.schema_scope import SchemaNotAllowed, SCHEMA_MAX_PER_REQUEST
+
+
+load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), "..", ".env"))
+
+PREWARM_ENABLED = os.getenv("PREWARM_ENABLED", "true").lower() in ("1", "true", "yes")
+# Background introspection threads; each works on one database at a time
+PREWARM_WORKERS = int(os.getenv("PREWARM_WORKERS", "2"))
+# Jobs queued or running at once; beyond this, requests simply introspect inline as before
+PREWARM_QUEUE_MAX = int(os.getenv("PREWARM_QUEUE_MAX", "1000"))
+# Every job first waits a random 0..PREWARM_JITTER_SECONDS, so logins and sweeps do not hit servers in lockstep
+PREWARM_JITTER_SECONDS = float(os.getenv("PREWARM_JITTER_SECONDS", "5"))
+# How often databases used within PREWARM_ACTIVE_WINDOW_SECONDS are revalidated in the background
+PREWARM_INTERVAL_SECONDS = int(os.getenv("PREWARM_INTERVAL_SECONDS", "600"))
+PREWARM_ACTIVE_WINDOW_SECONDS = int(os.getenv("PREWARM_ACTIVE_WINDOW_SECONDS", "3600"))
+# Finished jobs kept for the status endpoint
+PREWARM_HISTORY = int(os.getenv("PREWARM_HISTORY", "500"))
+
+# Lower runs first: a database just added is about to be queried, a login's databases soon, a sweep's eventually
+REASON_PRIORITY = {"created": 0, "login": 1, "periodic": 2}
+# A database whose job failed is skipped by the sweep for interval * 2^(failures - 1), at most this many intervals
+_MAX_BACKOFF_INTERVALS = 16
+
+
+class PrewarmJob:
+    """One background introspection of a database"""
+
+    def __init__(self, user_db, reason: str, schemas: Optional[List[str]], priority: tuple):
+        self.id = uuid.uuid4().hex
+        self.user_db = user_db
+        self.user_id = user_db.user_id
+        self.db_id = user_db.id
+        self.reason = reason
+        self.schemas = schemas
+        self.priority = priority
+        # queued -> running -> done / failed; queued jobs of a database that was edited or removed are cancelled
+        self.state = "queued"
+        self.enqueued_at = datetime.utcnow()
+        self.started_at: Optional[datetime] = None
+        self.finished_at: Optional[datetime] = None
+        self.duration_ms: Optional[int] = None
+        self.loaded_schemas: Optional[List[str]] = None
+        self.rebuilt: Optional[List[str]] = None
+        self.error: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.id,
+            "db_id": self.db_id,
+            "reason": self.reason,
+            "state": self.state,
+            "enqueued_at": self.enqueued_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "duration_ms": self.duration_ms,
+            "schemas": self.loaded_schemas if self.loaded_schemas is not None else self.schemas,
+            "rebuilt": self.rebuilt,
+            "error": self.error,
+        }
+
+
+class PrewarmScheduler:
+    """
+    Introspects databases in the background so the first request after adding a database or
+    logging in finds its schema snapshot already cached.
+
+    Jobs are queued when a database is created, for all of a user's databases on login, and by a
+    periodic sweep over recently used databases, which also rebuilds snapshots before they reach
+    the schema cache TTL. A fixed set of worker threads runs them, highest priority first (by
+    reason, then by how recently the owner was active), each after a random delay; a database
+    has at most one job queued or running. Introspection takes one of the database's concurrency
+    slots on the server's event loop, like introspection during a request.
+    """
+
+    def __init__(self, enabled: bool = PREWARM_ENABLED, workers: int = PREWARM_WORKERS,
+                 max_queue: int = PREWARM_QUEUE_MAX, jitter: float = PREWARM_JITTER_SECONDS,
+                 interval: int = PREWARM_INTERVAL_SECONDS, active_window: int = PREWARM_ACTIVE_WINDOW_SECONDS,
+                 history: int = PREWARM_HISTORY):
+        self.enabled = enabled
+        self.workers = workers
+        self.max_queue = max_queue
+        self.jitter = jitter
+        self.interval = interval
+        self.active_window = active_window
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        # (not before, seq, job) until the job's jitter has passed, then (priority, seq, job)
+        self._delayed: list = []
+        self._ready: list = []
+        self._seq = itertools.count()
+        # db_id -> its queued or running job
+        self._pending: Dict[int, PrewarmJob] = {}
+        self._finished: "deque[PrewarmJob]" = deque(maxlen=history)
+        # db_id -> {"user_db", "used_at", "schemas", "failures", "retry_at"}
+        self._active: Dict[int, Dict[str, Any]] = {}
+        # user_id -> last request or login
+        self._users: Dict[int, float] = {}
+        self.completed = 0
+        self.failed = 0
+        self.dropped = 0
+
+    def start(self) -> None:
+        """Start the workers; called on the server's event loop, whose database slots jobs share"""
+        if not self.enabled:
+            return
+        with self._lock:
+            if self._threads:
+                return
+            self._stop.clear()
+            try:
+                self._loop = asyncio.get_running_loop()
+            except RuntimeError:
+                self._loop = None
+            self._threads = [threading.Thread(target=self._work, name=f"prewarm-worker-{i}", daemon=True)
+                             for i in range(self.workers)]
+            self._threads.append(threading.Thread(target=self._sweep_periodically, name="prewarm-sweeper", daemon=True))
+        for thread in self._threads:
+            thread.start()
+
+    def shutdown(self, timeout: float = 5) -> None:
+        """Stop the threads; queued jobs are discarded, and running ones stop waiting for the event loop"""
+        with self._lock:
+            threads, self._threads = self._threads, []
+            self._stop.set()
+            self._wakeup.notify_all()
+        deadline = time.monotonic() + timeout
+        for thread in threads:
+            thread.join(max(deadline - time.monotonic(), 0))
+
+    def touch(self, user_db, schemas: Optional[Sequence[str]] = None) -> None:
+        """
+        Note that a request used this database (and these schemas), so the sweep keeps it warm.
+
+        The schemas of recent requests accumulate, most recent first, up to SCHEMA_MAX_PER_REQUEST.
+        """
+        if not self.enabled:
+            return
+        now = time.monotonic()
+        with self._lock:
+            self._users[user_db.user_id] = now
+            entry = self._active.get(user_db.id)
+            if entry is None:
+                entry = self._active[user_db.id] = {"user_db": user_db, "schemas": [], "failures": 0, "retry_at": 0.0}
+            entry["user_db"] = user_db
+            entry["used_at"] = now
+            if schemas:
+                entry["schemas"] = list(dict.fromkeys(list(schemas) + entry["schemas"]))[:SCHEMA_MAX_PER_REQUEST]
+
+    def submit(self, user_db, reason: str, schemas: Optional[List[str]] = None) -> Optional[PrewarmJob]:
+        """
+        Queue a background introspection of a database.
+
+        Without schemas, those its recent requests used are warmed, or the default selection for a
+        database not used yet. Returns the job already queued or running for the database if there
+        is one, and None when disabled or the queue is full.
+        """
+        if not self.enabled:
+            return None
+        self.start()
+        now = time.monotonic()
+        with self._lock:
+            job = self._pending.get(user_db.id)
+            if job is not None:
+                return job
+            if len(self._pending) >= self.max_queue:
+                self.dropped += 1
+                return None
+            if schemas is None and user_db.id in self._active:
+                schemas = self._active[user_db.id]["schemas"] or None
+            # Recently active owners first; never seen counts as least recent
+            priority = (REASON_PRIORITY[reason], -self._users.get(user_db.user_id, float("-inf")))
+            job = PrewarmJob(user_db, reason, schemas, priority)
+            self._pending[user_db.id] = job
+            heapq.heappush(self._delayed, (now + random.uniform(0, self.jitter), next(self._seq), job))
+            self._wakeup.notify()
+        return job
+
+    def submit_user(self, user_id: int, databases: Sequence[Any], reason: str = "login") -> List[PrewarmJob]:
+        """Queue every database of a user who just became active"""
+        if not self.enabled:
+            return []
+        with self._lock:
+            self._users[user_id] = time.monotonic()
+        jobs = [self.submit(user_db, reason) for user_db in databases]
+        return [job for job in jobs if job is not None]
+
+    def forget(self, db_id: int) -> None:
+        """Drop a database whose connection settings changed or that was removed, cancelling its queued job"""
+        with self._lock:
+            self._active.pop(db_id, None)
+            job = self._pending.get(db_id)
+            if job is not None and job.state == "queued":
+                # Left in the heaps; workers skip jobs that are no longer queued
+                del self._pending[db_id]
+                job.state = "cancelled"
+                job.finished_at = datetime.utcnow()
+                self._finished.append(job)
+
+    def sweep(self) -> int:
+        """Queue a periodic job for each database used within the active window; returns how many were queued"""
+        now = time.monotonic()
+        with self._lock:
+            for db_id in [db_id for db_id, entry in self._active.items() if now - entry["used_at"] > self.active_window]:
+                del self._active[db_id]
+            for user_id in [user_id for user_id, seen in self._users.items() if now - seen > self.active_window]:
+                del self._users[user_id]
+            due = [entry for entry in self._active.values() if now >= entry["retry_at"]]
+        due.sort(key=lambda entry: entry["used_at"], reverse=True)
+        return sum(1 for entry in due if self.submit(entry["user_db"], "periodic") is not None)
+
+    def _sweep_periodically(self) -> None:
+        # The interval itself is jittered too, so several server processes drift apart
+        while not self._stop.wait(self.interval * random.uniform(0.9, 1.1)):
+            try:
+                self.sweep()
+            except Exception as e:
+                print(f"Error sweeping databases to prewarm: {e}")
+
+    def _next(self) -> Optional[PrewarmJob]:
+        with self._lock:
+            while not self._stop.is_set():
+                now = time.monotonic()
+                while self._delayed and self._delayed[0][0] <= now:
+                    _, seq, job = heapq.heappop(self._delayed)
+                    heapq.heappush(self._ready, (job.priority, seq, job))
+                while self._ready:
+                    job = heapq.heappop(self._ready)[2]
+                    if job.state == "queued":
+                        job.state = "running"
+                        job.started_at = datetime.utcnow()
+                        return job
+                self._wakeup.wait(self._delayed[0][0] - now if self._delayed else None)
+        return None
+
+    def _work(self) -> None:
+        while True:
+            job = self._next()
+            if job is None:
+                return
+            started = time.perf_counter()
+            try:
+                self._run(job)
+                job.state = "done"
+            except Exception as e:
+                print(f"Error prewarming schema of database {job.db_id}: {e}")
+                job.state = "failed"
+                job.error = str(e) or type(e).__name__
+            job.duration_ms = int((time.perf_counter() - started) * 1000)
+            self._finish(job)
+
+    def _refresh_ahead(self) -> Optional[float]:
+        # Rebuild snapshots that would otherwise expire before the next sweep gets to them
+        max_age = schema_cache.ttl - self.interval * 1.1 - self.jitter
+        return max_age if max_age > 0 else None
+
+    def _run(self, job: PrewarmJob) -> None:
+        # Imported here: utils.agent imports utils.metrics, which reports this scheduler's stats
+        from utils.agent import DatabaseAgent
+
+        agent = DatabaseAgent(user_db=job.user_db)
+        if self._loop is None:
+            view = self._introspect(agent, job)
+        else:
+            # Within the database's max_concurrency, shared with the requests running against it
+            view = self._on_loop(run_against_database(job.user_db, self._introspect, agent, job))
+        job.loaded_schemas = view.loaded_schemas
+        job.rebuilt = view.rebuilt
+
+    def _introspect(self, agent, job: PrewarmJob):
+        try:
+            return agent.get_schema_snapshot(job.schemas, max_age=self._refresh_ahead())
+        except SchemaNotAllowed:
+            # Schemas used earlier were removed or taken off the allowlist since
+            return agent.get_schema_snapshot(max_age=self._refresh_ahead())
+
+    def _on_loop(self, coroutine):
+        # shutdown() joins the workers on the event loop thread, so waiting there must give up once stopped
+        future = asyncio.run_coroutine_threadsafe(coroutine, self._loop)
+        while True:
+            try:
+                return future.result(timeout=0.5)
+            except concurrent.futures.TimeoutError:
+                if self._stop.is_set():
+                    future.cancel()
+                    raise RuntimeError("Prewarm scheduler stopped")
+
+    def _finish(self, job: PrewarmJob) -> None:
+        with self._lock:
+            job.finished_at = datetime.utcnow()
+            if self._pending.get(job.db_id) is job:
+                del self._pending[job.db_id]
+            self._finished.append(job)
+            entry = self._active.get(job.db_id)
+            if job.state == "done":
+                self.completed += 1
+                if entry is not None:
+                    entry["failures"] = 0
+                    entry["retry_at"] = 0.0
+            else:
+                self.failed += 1
+                if entry is not None:
+                    entry["failures"] += 1
+                    backoff = min(2 ** (entry["failures"] - 1), _MAX_BACKOFF_INTERVALS)
+                    entry["retry_at"] = time.monotonic() + self.interval * backoff
+
+    def jobs(self, user_id: int, db_id: Optional[int] = None) -> List[PrewarmJob]:
+        """A user's jobs: queued and running ones first, then finished ones, newest first"""
+        with self._lock:
+            jobs = list(self._pending.values()) + list(reversed(self._finished))
+        return [job for job in jobs if job.user_id == user_id and (db_id is None or job.db_id == db_id)]
+
+    def get(self, job_id: str) -> Optional[PrewarmJob]:
+        with self._lock:
+            for job in list(self._pending.values()) + list(self._finished):
+                if job.id == job_id:
+                    return job
+        return None
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            running = sum(1 for job in self._pending.values() if job.state == "running")
+            return {
+                "queued": len(self._pending) - running,
+                "running": running,
+                "completed": self.completed,
+                "failed": self.failed,
+                "dropped": self.dropped,
+                "active_databases": len(self._active),
+            }
+
+
+prewarm_scheduler = PrewarmScheduler()
@@ -0,0 +1,219 @@
+import os
+from typing import Any, Dict, List, Optional, Tuple
+from sqlalchemy import text
+from dotenv import load_dotenv
+from utils.result_cache import code_only
+
+
+load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), "..", ".env"))
+
+# Defaults for databases that leave the matching UserDatabase column empty; 0 disables a limit
+EXECUTE_STATEMENT_TIMEOUT_MS = int(os.getenv("EXECUTE_STATEMENT_TIMEOUT_MS", "30000"))
+EXECUTE_LOCK_TIMEOUT_MS = int(os.getenv("EXECUTE_LOCK_TIMEOUT_MS", "5000"))
+EXECUTE_READ_ONLY = os.getenv("EXECUTE_READ_ONLY", "false").lower() in ("1", "true", "yes")
+PLAN_GUARD_MAX_COST = float(os.getenv("PLAN_GUARD_MAX_COST", "10000000"))
+PLAN_GUARD_MAX_ROWS = int(os.getenv("PLAN_GUARD_MAX_ROWS", "10000000"))
+# "reject": refuse statements over a limit, "warn": run them and report why, "off": skip EXPLAIN
+PLAN_GUARD_MODE = os.getenv("PLAN_GUARD_MODE", "reject").lower()
+# Sequential scans expected to read more rows than this are reported as warnings
+PLAN_GUARD_SEQ_SCAN_ROWS = int(os.getenv("PLAN_GUARD_SEQ_SCAN_ROWS", "1000000"))
+
+PLAN_GUARD_MODES = ("reject", "warn", "off")
+# Statements EXPLAIN does not accept that have no plan to guard (DDL, settings, privileges);
+# anything else that cannot be explained is refused in "reject" mode
+_UNPLANNED_STATEMENTS = ("create", "alter", "drop", "truncate", "comment", "grant", "revoke", "set", "reset", "show")
+
+
+class PlanRejected(Exception):
+    """Raised before execution when the estimated plan exceeds a database's limits or cannot be checked (plan is then None)"""
+
+    def __init__(self, message: str, plan: Optional[Dict[str, Any]]):
+        super().__init__(message)
+        self.plan = plan
+
+
+def ensure_single_statement(sql: str) -> None:
+    """
+    Refuse input holding several statements: the driver would run all of them, past the plan
+    guard (which only explains one) and past SET LOCAL limits a COMMIT in between would end.
+
+    Raises:
+        PlanRejected: When a semicolon separates statements outside literals and comments
+    """
+    if ";" in code_only(sql):
+        raise PlanRejected("Query rejected: run one statement at a time", None)
+
+
+def _pick(value, default):
+    return default if value is None else value
+
+
+class ExecutionPolicy:
+    """Timeouts, read-only mode and plan limits applied to one execution"""
+
+    def __init__(self, statement_timeout_ms: int = EXECUTE_STATEMENT_TIMEOUT_MS,
+                 lock_timeout_ms: int = EXECUTE_LOCK_TIMEOUT_MS, read_only: bool = EXECUTE_READ_ONLY,
+                 max_plan_cost: float = PLAN_GUARD_MAX_COST, max_plan_rows: int = PLAN_GUARD_MAX_ROWS,
+                 guard_mode: str = PLAN_GUARD_MODE):
+        self.statement_timeout_ms = statement_timeout_ms
+        self.lock_timeout_ms = lock_timeout_ms
+        self.read_only = read_only
+        self.max_plan_cost = max_plan_cost
+        self.max_plan_rows = max_plan_rows
+        self.guard_mode = guard_mode if guard_mode in PLAN_GUARD_MODES else "reject"
+
+    @classmethod
+    def for_database(cls, user_db) -> "ExecutionPolicy":
+        """Policy from a UserDatabase's own settings, falling back to the server defaults"""
+        return cls(
+            statement_timeout_ms=_pick(getattr(user_db, "statement_timeout_ms", None), EXECUTE_STATEMENT_TIMEOUT_MS),
+            lock_timeout_ms=_pick(getattr(user_db, "lock_timeout_ms", None), EXECUTE_LOCK_TIMEOUT_MS),
+            read_only=_pick(getattr(user_db, "read_only", None), EXECUTE_READ_ONLY),
+            max_plan_cost=_pick(getattr(user_db, "max_plan_cost", None), PLAN_GUARD_MAX_COST),
+            max_plan_rows=_pick(getattr(user_db, "max_plan_rows", None), PLAN_GUARD_MAX_ROWS),
+            guard_mode=_pick(getattr(user_db, "plan_guard_mode", None), PLAN_GUARD_MODE),
+        )
+
+    def session_statements(self) -> List[str]:
+        """Statements that open the transaction; SET LOCAL keeps them from leaking into the pooled connection"""
+        statements = []
+        if self.read_only:
+            statements.append("SET TRANSACTION READ ONLY")
+        if self.statement_timeout_ms:
+            statements.append(f"SET LOCAL statement_timeout = {int(self.statement_timeout_ms)}")
+        if self.lock_timeout_ms:
+            statements.append(f"SET LOCAL lock_timeout = {int(self.lock_timeout_ms)}")
+        return statements
+
+
+def apply_limits(cursor, policy: ExecutionPolicy) -> None:
+    for statement in policy.session_statements():
+        cursor.execute(statement)
+
+
+def driver_statement(dialect, sql: str, params: Optional[Dict[str, Any]] = None) -> Tuple[str, Optional[Dict[str, Any]]]:
+    """SQL and parameters in the DB-API driver's own format; :name placeholders are only bound when params are given"""
+    if not params:
+        return sql, None
+    compiled = text(sql).compile(dialect=dialect)
+    return compiled.string, compiled.construct_params(params)
+
+
+def explain(cursor, sql: str, params: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+    """
+    Top plan node of EXPLAIN (FORMAT JSON). The attempt runs in a savepoint, so a statement that
+    cannot be explained (DDL, syntax errors) raises without aborting the surrounding transaction.
+    """
+    cursor.execute("SAVEPOINT plan_guard")
+    try:
+        cursor.execute("EXPLAIN (FORMAT JSON) " + sql, params)
+        document = cursor.fetchone()[0]
+    except Exception:
+        cursor.execute("ROLLBACK TO SAVEPOINT plan_guard")
+        raise
+    cursor.execute("RELEASE SAVEPOINT plan_guard")
+    return document[0]["Plan"]
+
+
+def _walk(node: Dict[str, Any]):
+    yield node
+    for child in node.get("Plans", []):
+        yield from _walk(child)
+
+
+def summarize_plan(plan: Dict[str, Any]) -> Dict[str, Any]:
+    """Totals of the top node plus the shapes most likely to make a query run away"""
+    warnings = []
+    relations = set()
+    for node in _walk(plan):
+        if node.get("Relation Name"):
+            relations.add(node["Relation Name"])
+        if node["Node Type"] == "Seq Scan" and node.get("Plan Rows", 0) > PLAN_GUARD_SEQ_SCAN_ROWS:
+            warnings.append(f"sequential scan of {node['Relation Name']} (~{node['Plan Rows']} rows)")
+        if node["Node Type"] == "Nested Loop" and "Join Filter" not in node:
+            children = node.get("Plans", [])
+            product = 1
+            for child in children:
+                product *= max(child.get("Plan Rows", 1), 1)
+            # A Cartesian product returns every pair of input rows
+            if len(children) == 2 and product > 1000 and node.get("Plan Rows", 0) >= product:
+                warnings.append(f"cross join producing ~{node['Plan Rows']} rows")
+    return {
+        "node_type": plan["Node Type"],
+        "startup_cost": plan.get("Startup Cost"),
+        "total_cost": plan.get("Total Cost"),
+        "plan_rows": plan.get("Plan Rows"),
+        "plan_width": plan.get("Plan Width"),
+        "relations": sorted(relations),
+        "warnings": warnings,
+    }
+
+
+def check_plan(summary: Dict[str, Any], policy: ExecutionPolicy) -> List[str]:
+    violations = []
+    if policy.max_plan_cost and summary["total_cost"] > policy.max_plan_cost:
+        violations.append(f"estimated cost {summary['total_cost']:.0f} exceeds the limit of {policy.max_plan_cost:.0f}")
+    if policy.max_plan_rows and summary["plan_rows"] > policy.max_plan_rows:
+        violations.append(f"estimated {summary['plan_rows']} rows exceeds the limit of {policy.max_plan_rows}")
+    return violations
+
+
+def guard_plan(cursor, sql: str, policy: ExecutionPolicy, params: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+    """
+    EXPLAIN a statement inside the transaction that will run it and compare the estimate with the policy.
+
+    Returns:
+        dict: Plan summary (violations added to its warnings in "warn" mode), or None when not explained
+
+    Raises:
+        PlanRejected: In "reject" mode, when a limit is exceeded or the statement cannot be
+            explained and is not one without a plan (DDL, SET, SHOW, GRANT...)
+    """
+    if policy.guard_mode == "off":
+        return None
+    try:
+        plan = explain(cursor, sql, params)
+    except Exception as e:
+        code = code_only(sql)
+        unplanned = bool(code) and code.split(None, 1)[0] in _UNPLANNED_STATEMENTS
+        if policy.guard_mode == "reject" and not unplanned:
+            raise PlanRejected(f"Query rejected: its plan could not be checked ({str(e).strip()})", None)
+        return None
+    summary = summarize_plan(plan)
+    violations = check_plan(summary, policy)
+    if violations and policy.guard_mode == "reject":
+        raise PlanRejected("Query rejected: " + "; ".join(violations), summary)
+    summary["warnings"] = violations + summary["warnings"]
+    return summary
+
+
+def prepare_transaction(dbapi_connection, sql: str, policy: Optional[ExecutionPolicy], check: bool = True,
+                        params: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+    """
+    Apply the policy's limits to the connection's open transaction and, if asked, run the plan guard.
+
+    sql and params are in driver format (see driver_statement).
+    """
+    if policy is None:
+        return None
+    cursor = dbapi_connection.cursor()
+    try:
+        apply_limits(cursor, policy)
+        return guard_plan(cursor, sql, policy, params) if check else None
+    finally:
+        cursor.close()
+
+
+def transaction_wrote(dbapi_connection) -> bool:
+    """
+    Whether the connection's open transaction has written anything: PostgreSQL assigns a
+    transaction id on the first write. An aborted transaction will be rolled back, so it counts as no write.
+    """
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute("SELECT txid_current_if_assigned() IS NOT NULL")
+        return bool(cursor.fetchone()[0])
+    except Exception:
+        return False
+    finally:
+        cursor.close()
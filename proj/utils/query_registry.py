@@ -0,0 +1,162 @@
+import os
+import time
+import uuid
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from dotenv import load_dotenv
+
+
+load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), "..", ".env"))
+
+# How often a request waiting on a query checks whether its client went away
+QUERY_DISCONNECT_POLL_SECONDS = float(os.getenv("QUERY_DISCONNECT_POLL_SECONDS", "0.5"))
+# Seconds to wait for the connection used to send a cancel request
+QUERY_CANCEL_CONNECT_TIMEOUT = int(os.getenv("QUERY_CANCEL_CONNECT_TIMEOUT", "5"))
+SQL_PREVIEW_CHARS = 1000
+
+
+class QueryCancelled(Exception):
+    """Raised when a query is cancelled before it reached the database"""
+
+
+class RunningQuery:
+    """One execution in flight against a user database"""
+
+    def __init__(self, user_id: int, db_id: int, sql: str, kind: str):
+        self.id = uuid.uuid4().hex
+        self.user_id = user_id
+        self.db_id = db_id
+        self.sql = sql
+        self.kind = kind
+        self.started_at = datetime.utcnow()
+        self.backend_pid: Optional[int] = None
+        self.cancel_requested = False
+        self._started = time.monotonic()
+        self._engine = None
+        # Held while the pid is cleared or used, so a cancel never reaches a connection back in the pool
+        self._lock = threading.Lock()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "query_id": self.id,
+            "db_id": self.db_id,
+            "kind": self.kind,
+            "backend_pid": self.backend_pid,
+            "started_at": self.started_at,
+            "elapsed_ms": int((time.monotonic() - self._started) * 1000),
+            "sql": self.sql[:SQL_PREVIEW_CHARS],
+            "cancel_requested": self.cancel_requested,
+        }
+
+
+class QueryRegistry:
+    """
+    In-flight executions of this process, so they can be listed and cancelled.
+
+    Cancelling sends pg_cancel_backend over a separate, unpooled connection from a dedicated
+    thread, so it works even while every pooled connection and worker thread is busy.
+    """
+
+    def __init__(self):
+        self._queries: Dict[str, RunningQuery] = {}
+        self._lock = threading.Lock()
+        self._cancel_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="query-cancel")
+        self.cancelled = 0
+
+    def register(self, user_id: int, db_id: int, sql: str, kind: str = "execute") -> RunningQuery:
+        running = RunningQuery(user_id, db_id, sql, kind)
+        with self._lock:
+            self._queries[running.id] = running
+        return running
+
+    def unregister(self, running: Optional[RunningQuery]) -> None:
+        # The pid stays until the execution detaches, so a cancel issued just before still lands
+        if running is None:
+            return
+        with self._lock:
+            self._queries.pop(running.id, None)
+
+    def attach(self, running: Optional[RunningQuery], connection) -> None:
+        """Record the backend pid of the SQLAlchemy connection the query runs on"""
+        if running is None:
+            return
+        with running._lock:
+            if running.cancel_requested:
+                raise QueryCancelled("Query was cancelled before it started")
+            running._engine = connection.engine
+            running.backend_pid = connection.connection.dbapi_connection.get_backend_pid()
+
+    def detach(self, running: Optional[RunningQuery]) -> None:
+        """Forget the pid before the connection goes back to the pool"""
+        if running is None:
+            return
+        with running._lock:
+            running.backend_pid = None
+
+    @contextmanager
+    def attached(self, running: Optional[RunningQuery], connection):
+        self.attach(running, connection)
+        try:
+            yield
+        finally:
+            self.detach(running)
+
+    def get(self, query_id: str) -> Optional[RunningQuery]:
+        with self._lock:
+            return self._queries.get(query_id)
+
+    def for_user(self, user_id: int, db_id: Optional[int] = None) -> List[RunningQuery]:
+        with self._lock:
+            queries = [q for q in self._queries.values() if q.user_id == user_id]
+        if db_id is not None:
+            queries = [q for q in queries if q.db_id == db_id]
+        return sorted(queries, key=lambda q: q.started_at)
+
+    def count(self) -> int:
+        with self._lock:
+            return len(self._queries)
+
+    def cancel(self, running: RunningQuery) -> bool:
+        """
+        Ask PostgreSQL to cancel the query's current statement.
+
+        Returns:
+            bool: True when a cancel request was delivered to a backend still running this query
+        """
+        running.cancel_requested = True
+        with running._lock:
+            if running.backend_pid is None or running._engine is None:
+                return False
+            engine = running._engine
+            cargs, cparams = engine.dialect.create_connect_args(engine.url)
+            cparams.setdefault("connect_timeout", QUERY_CANCEL_CONNECT_TIMEOUT)
+            try:
+                conn = engine.dialect.connect(*cargs, **cparams)
+            except Exception as e:
+                print(f"Error connecting to cancel query {running.id}: {e}")
+                return False
+            try:
+                cursor = conn.cursor()
+                cursor.execute("SELECT pg_cancel_backend(%s)", (running.backend_pid,))
+                delivered = bool(cursor.fetchone()[0])
+            except Exception as e:
+                print(f"Error cancelling query {running.id}: {e}")
+                delivered = False
+            finally:
+                conn.close()
+        if delivered:
+            self.cancelled += 1
+        return delivered
+
+    def cancel_soon(self, running: RunningQuery) -> Future:
+        """cancel() on the dedicated cancel threads; usable where the caller cannot wait (disconnects)"""
+        return self._cancel_executor.submit(self.cancel, running)
+
+    def shutdown(self) -> None:
+        self._cancel_executor.shutdown(wait=False)
+
+
+query_registry = QueryRegistry()
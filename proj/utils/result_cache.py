@@ -0,0 +1,173 @@
+import os
+import re
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+from dotenv import load_dotenv
+from utils.result_encoding import dumps
+
+
+load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), "..", ".env"))
+
+# Seconds a result stays valid for databases that leave UserDatabase.result_cache_ttl_seconds empty; 0 = no caching
+RESULT_CACHE_TTL = int(os.getenv("RESULT_CACHE_TTL_SECONDS", "0"))
+# Memory bound over the encoded size of all cached results; larger results are never cached
+RESULT_CACHE_MAX_BYTES = int(os.getenv("RESULT_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+RESULT_CACHE_MAX_ENTRY_BYTES = int(os.getenv("RESULT_CACHE_MAX_ENTRY_BYTES", str(4 * 1024 * 1024)))
+
+# String literals, quoted identifiers, dollar-quoted bodies, and runs of whitespace and comments
+_SQL_TOKENS = re.compile(
+    r"('(?:[^']|'')*')|(\"(?:[^\"]|\"\")*\")|(\$([A-Za-z_]\w*|)\$.*?\$\4\$)|((?:\s|--[^\n]*|/\*.*?\*/)+)",
+    re.DOTALL,
+)
+_READ_STATEMENTS = ("select", "with", "values", "table")
+# Anything that can write, lock rows or end the surrounding transaction
+_WRITE_KEYWORDS = re.compile(
+    r"\b(insert|update|delete|merge|into|copy|call|do|lock|create|alter|drop|truncate|grant|revoke|"
+    r"commit|rollback|begin|set|reset|notify|listen|vacuum|analyze|cluster|refresh|reindex|share)\b"
+)
+
+
+def normalize_sql(sql: str) -> str:
+    """
+    Drop comments, collapse whitespace and fold case outside literals and quoted names (unquoted
+    identifiers are case-insensitive in PostgreSQL), so formatting does not split cache entries.
+    """
+    parts = []
+    position = 0
+    for match in _SQL_TOKENS.finditer(sql):
+        parts.append(sql[position:match.start()].lower())
+        parts.append(" " if match.group(5) else match.group(0))
+        position = match.end()
+    parts.append(sql[position:].lower())
+    return "".join(parts).strip().rstrip(";").strip()
+
+
+def code_only(sql: str) -> str:
+    """Lowercased SQL with literals and quoted names blanked and comments dropped, so only code is inspected"""
+    def replace(match):
+        return " " if match.group(5) else " _ "
+    return _SQL_TOKENS.sub(replace, sql).lower().strip().rstrip(";")
+
+
+def is_read_only_candidate(sql: str) -> bool:
+    """
+    True when the text alone shows a single read statement (SELECT/WITH/VALUES/TABLE without
+    data-modifying CTEs, SELECT INTO or row locks). Functions with side effects are invisible
+    here, so execution still checks that no transaction id was assigned before caching.
+    """
+    code = code_only(sql)
+    if not code or ";" in code:
+        return False
+    if code.split(None, 1)[0] not in _READ_STATEMENTS:
+        return False
+    return _WRITE_KEYWORDS.search(code) is None
+
+
+def make_result_key(db_id: int, sql: str, params: Optional[Dict[str, Any]] = None) -> str:
+    raw = "\x1f".join([str(db_id), normalize_sql(sql), dumps(params or {}).decode()])
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def result_cache_ttl(user_db) -> int:
+    ttl = getattr(user_db, "result_cache_ttl_seconds", None)
+    return RESULT_CACHE_TTL if ttl is None else ttl
+
+
+class ResultCache:
+    """
+    In-process LRU of query results, bounded by their encoded size.
+
+    Entries belong to a database; any write executed through the API against that database
+    drops all of its entries. Each worker process has its own cache.
+    """
+
+    def __init__(self, max_bytes: int = RESULT_CACHE_MAX_BYTES, max_entry_bytes: int = RESULT_CACHE_MAX_ENTRY_BYTES):
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes
+        # key -> (db_id, expires_at, size, value)
+        self._entries: "OrderedDict[str, Tuple[int, float, int, Any]]" = OrderedDict()
+        self._keys_by_db: Dict[int, set] = {}
+        # Bumped on invalidation so a read that started before a write is not stored after it
+        self._generations: Dict[int, int] = {}
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.stored = 0
+        self.too_large = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def _remove(self, key: str) -> None:
+        db_id, _, size, _ = self._entries.pop(key)
+        self.bytes -= size
+        keys = self._keys_by_db.get(db_id)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_db[db_id]
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] <= time.monotonic():
+                if entry is not None:
+                    self._remove(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[3]
+
+    def generation(self, db_id: int) -> int:
+        with self._lock:
+            return self._generations.get(db_id, 0)
+
+    def put(self, key: str, db_id: int, value: Any, ttl: int, generation: int) -> bool:
+        """Cache a JSON-native value; False when it is too large or the database was written to meanwhile"""
+        size = len(dumps(value))
+        with self._lock:
+            if self._generations.get(db_id, 0) != generation:
+                return False
+            if size > self.max_entry_bytes or size > self.max_bytes:
+                self.too_large += 1
+                return False
+            if key in self._entries:
+                self._remove(key)
+            while self._entries and self.bytes + size > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+            self._entries[key] = (db_id, time.monotonic() + ttl, size, value)
+            self._keys_by_db.setdefault(db_id, set()).add(key)
+            self.bytes += size
+            self.stored += 1
+            return True
+
+    def invalidate(self, db_id: int) -> None:
+        with self._lock:
+            self._generations[db_id] = self._generations.get(db_id, 0) + 1
+            for key in self._keys_by_db.pop(db_id, ()):
+                self.bytes -= self._entries.pop(key)[2]
+            self.invalidations += 1
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "entries": len(self._entries),
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "stored": self.stored,
+                "too_large": self.too_large,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+result_cache = ResultCache()
@@ -0,0 +1,138 @@
+import os
+import json
+import datetime
+import decimal
+from typing import Any, Callable, Dict, List, Optional, Sequence
+from fastapi.responses import JSONResponse
+from dotenv import load_dotenv
+
+try:
+    import orjson
+except ImportError:  # optional; the standard library encoder is used instead
+    orjson = None
+
+
+load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), "..", ".env"))
+
+# Responses larger than this are gzip-compressed for clients that accept it
+RESPONSE_GZIP_MIN_BYTES = int(os.getenv("RESPONSE_GZIP_MIN_BYTES", "1024"))
+RESPONSE_GZIP_ENABLED = os.getenv("RESPONSE_GZIP", "true").lower() in ("1", "true", "yes")
+
+
+def _bytea(value) -> str:
+    return "\\x" + bytes(value).hex()
+
+
+def _encode_value(value: Any) -> Any:
+    """Slow path for values whose column type gives no hint (unknown OIDs, array elements)"""
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    if isinstance(value, decimal.Decimal):
+        # Kept as text so numeric precision survives the round trip through JSON
+        return str(value)
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, (bytes, memoryview)):
+        return _bytea(value)
+    if isinstance(value, (list, tuple)):
+        return [_encode_value(v) for v in value]
+    if isinstance(value, dict):
+        return {str(k): _encode_value(v) for k, v in value.items()}
+    return str(value)
+
+
+def _nullable(fn: Callable[[Any], Any]) -> Callable[[Any], Any]:
+    return lambda value: None if value is None else fn(value)
+
+
+_to_str = _nullable(str)
+_isoformat = _nullable(lambda value: value.isoformat())
+
+# PostgreSQL type OIDs (pg_type.oid) -> encoder; None means the driver value is already JSON-native
+_OID_ENCODERS: Dict[int, Optional[Callable[[Any], Any]]] = {
+    16: None,            # bool
+    20: None,            # int8
+    21: None,            # int2
+    23: None,            # int4
+    26: None,            # oid
+    700: None,           # float4
+    701: None,           # float8
+    25: None,            # text
+    19: None,            # name
+    1042: None,          # bpchar
+    1043: None,          # varchar
+    114: None,           # json (decoded by psycopg2)
+    3802: None,          # jsonb
+    1700: _to_str,       # numeric
+    1082: _isoformat,    # date
+    1083: _isoformat,    # time
+    1266: _isoformat,    # timetz
+    1114: _isoformat,    # timestamp
+    1184: _isoformat,    # timestamptz
+    1186: _to_str,       # interval
+    2950: _to_str,       # uuid
+    869: _to_str,        # inet
+    650: _to_str,        # cidr
+    829: _to_str,        # macaddr
+    17: _nullable(_bytea),  # bytea
+}
+
+
+def encoder_for_oid(type_code: Any) -> Optional[Callable[[Any], Any]]:
+    """Encoder for one column, or None when its values can be passed through unchanged"""
+    if isinstance(type_code, int) and type_code in _OID_ENCODERS:
+        return _OID_ENCODERS[type_code]
+    # Arrays, enums, ranges, domains and anything else: decide per value
+    return _encode_value
+
+
+class RowEncoder:
+    """
+    Converts result rows to JSON-native values using one encoder per column.
+
+    The encoders are picked once from the DB-API cursor description (type OIDs), so the
+    per-value work is a single call, or nothing at all for columns that are already
+    JSON-native (integers, text, booleans, json).
+    """
+
+    def __init__(self, description: Sequence[Sequence[Any]]):
+        self.columns: List[str] = [col[0] for col in description]
+        self.encoders = [encoder_for_oid(col[1]) for col in description]
+        self._converted = [(i, fn) for i, fn in enumerate(self.encoders) if fn is not None]
+
+    def encode_values(self, row: Sequence[Any]) -> list:
+        values = list(row)
+        for i, fn in self._converted:
+            values[i] = fn(values[i])
+        return values
+
+    def encode_row(self, row: Sequence[Any]) -> Dict[str, Any]:
+        return dict(zip(self.columns, self.encode_values(row) if self._converted else row))
+
+    def encode_rows(self, rows) -> List[Dict[str, Any]]:
+        columns = self.columns
+        if not self._converted:
+            return [dict(zip(columns, row)) for row in rows]
+        return [dict(zip(columns, self.encode_values(row))) for row in rows]
+
+
+def encode_result_rows(result) -> List[Dict[str, Any]]:
+    """Fetch all rows of a SQLAlchemy CursorResult as JSON-native dicts"""
+    return RowEncoder(result.cursor.description).encode_rows(result.fetchall())
+
+
+if orjson is not None:
+    def dumps(obj: Any) -> bytes:
+        """Serialize to compact JSON bytes (orjson when installed)"""
+        return orjson.dumps(obj, default=_encode_value, option=orjson.OPT_NON_STR_KEYS)
+else:
+    def dumps(obj: Any) -> bytes:
+        """Serialize to compact JSON bytes (orjson when installed)"""
+        return json.dumps(obj, default=_encode_value, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with the fast encoder above; the application's default response class"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
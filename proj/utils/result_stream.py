@@ -0,0 +1,187 @@
+import os
+import io
+import csv
+import uuid
+from typing import Any, Dict, List, Optional
+from sqlalchemy.engine import Engine
+from dotenv import load_dotenv
+from utils.result_encoding import RowEncoder, dumps
+from utils.query_registry import RunningQuery, query_registry
+from utils.query_guard import ExecutionPolicy, prepare_transaction, driver_statement, transaction_wrote, ensure_single_statement
+
+
+load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), "..", ".env"))
+
+STREAM_BATCH_SIZE = int(os.getenv("STREAM_BATCH_SIZE", "1000"))
+# Server-side ceilings; a request may ask for less but never more
+STREAM_MAX_ROWS = int(os.getenv("STREAM_MAX_ROWS", "1000000"))
+STREAM_MAX_BYTES = int(os.getenv("STREAM_MAX_BYTES", str(256 * 1024 * 1024)))
+
+# What DECLARE ... CURSOR FOR raises for non-queries: syntax_error (INSERT/UPDATE/DDL) and
+# feature_not_supported (data-modifying CTEs)
+_NOT_DECLARABLE = ("42601", "0A000")
+
+
+class QueryStream:
+    """
+    A query executed through a server-side (named) cursor, read in fetchmany batches.
+
+    Statements that cannot be declared as a cursor (INSERT/UPDATE/DDL, data-modifying CTEs)
+    fall back to a regular cursor and are committed on close. With a policy, the transaction
+    gets its timeouts and read-only setting first and the plan guard runs before execution
+    (PlanRejected is raised from the constructor, as it is for several statements at once).
+    """
+
+    def __init__(self, engine: Engine, sql: str, batch_size: int = STREAM_BATCH_SIZE,
+                 policy: Optional[ExecutionPolicy] = None, params: Optional[Dict[str, Any]] = None,
+                 running: Optional[RunningQuery] = None):
+        self.batch_size = batch_size
+        self.rows_affected = None
+        # Set on close: whether the statement wrote anything (used to invalidate cached results)
+        self.wrote = False
+        self._is_write = False
+        self._running = running
+        ensure_single_statement(sql)
+        self._conn = engine.connect()
+        dbapi_conn = self._conn.connection
+        try:
+            query_registry.attach(running, self._conn)
+            sql, params = driver_statement(engine.dialect, sql, params)
+            self.plan = prepare_transaction(dbapi_conn, sql, policy, params=params)
+            try:
+                self._cursor = dbapi_conn.cursor(name=f"speakql_{uuid.uuid4().hex}")
+                self._cursor.itersize = batch_size
+                self._cursor.execute(sql, params)
+                # Named cursors only describe their columns after the first fetch
+                self._pending = self._cursor.fetchmany(batch_size)
+            except Exception as e:
+                # Only a statement that cannot be declared as a cursor is run again; any other error
+                # (a failure deep into the scan, a lock or statement timeout) would only repeat the work
+                if getattr(e, "pgcode", None) not in _NOT_DECLARABLE:
+                    raise
+                dbapi_conn.rollback()
+                prepare_transaction(dbapi_conn, sql, policy, check=False)
+                self._cursor = dbapi_conn.cursor()
+                self._cursor.execute(sql, params)
+                self._is_write = True
+                self._pending = self._cursor.fetchmany(batch_size) if self._cursor.description else []
+                if self._cursor.description is None:
+                    self.rows_affected = self._cursor.rowcount
+        except Exception:
+            query_registry.detach(running)
+            self._conn.close()
+            raise
+        self.columns: List[str] = [col[0] for col in self._cursor.description or []]
+        self.encoder = RowEncoder(self._cursor.description or [])
+
+    @property
+    def returns_rows(self) -> bool:
+        return bool(self.columns)
+
+    def fetch(self) -> list:
+        """Next batch of rows as tuples, empty when exhausted"""
+        if self._pending is not None:
+            rows, self._pending = self._pending, None
+            return rows
+        if not self.returns_rows:
+            return []
+        return self._cursor.fetchmany(self.batch_size)
+
+    def close(self) -> None:
+        if self._conn.closed:
+            return
+        try:
+            try:
+                self._cursor.close()
+            except Exception:
+                # A named cursor of a failed or cancelled transaction cannot be closed; the rollback
+                # when the connection goes back to the pool drops it
+                pass
+            self.wrote = transaction_wrote(self._conn.connection)
+            if self._is_write:
+                self._conn.connection.commit()
+        finally:
+            query_registry.detach(self._running)
+            self._conn.close()
+
+
+class StreamEncoder:
+    """Turns a QueryStream into NDJSON or CSV chunks while enforcing row and byte caps"""
+
+    def __init__(self, stream: QueryStream, fmt: str = "ndjson",
+                 max_rows: Optional[int] = None, max_bytes: Optional[int] = None):
+        self.stream = stream
+        self.fmt = fmt
+        self.max_rows = min(max_rows or STREAM_MAX_ROWS, STREAM_MAX_ROWS)
+        self.max_bytes = min(max_bytes or STREAM_MAX_BYTES, STREAM_MAX_BYTES)
+        self.rows_sent = 0
+        self.bytes_sent = 0
+        self.truncated = None
+        self._started = False
+        self._finished = False
+
+    def _marker(self) -> bytes:
+        if self.fmt == "csv":
+            return f"# truncated: {self.truncated} reached after {self.rows_sent} rows\n".encode()
+        return dumps({"_truncated": True, "reason": self.truncated, "rows": self.rows_sent}) + b"\n"
+
+    def _encode_rows(self, rows) -> List[bytes]:
+        encoder = self.stream.encoder
+        if self.fmt == "csv":
+            # One buffer and writer for the whole batch; each row is cut out as its own line
+            buf = io.StringIO()
+            writer = csv.writer(buf)
+            lines = []
+            for row in rows:
+                buf.seek(0)
+                buf.truncate()
+                # Arrays and json values are written as JSON text rather than Python reprs
+                writer.writerow([dumps(v).decode() if isinstance(v, (list, dict)) else v for v in encoder.encode_values(row)])
+                lines.append(buf.getvalue().encode())
+            return lines
+        return [dumps(row) + b"\n" for row in encoder.encode_rows(rows)]
+
+    def _header(self) -> bytes:
+        if not self.stream.returns_rows:
+            status = {"status": "success", "rows_affected": self.stream.rows_affected}
+            if self.fmt == "csv":
+                return f"status,rows_affected\nsuccess,{self.stream.rows_affected}\n".encode()
+            return dumps(status) + b"\n"
+        if self.fmt == "csv":
+            buf = io.StringIO()
+            csv.writer(buf).writerow(self.stream.columns)
+            return buf.getvalue().encode()
+        return b""
+
+    def next_chunk(self) -> Optional[bytes]:
+        """Encode the next batch; None once the stream is exhausted or a cap was hit"""
+        if self._finished:
+            return None
+        chunk = b""
+        if not self._started:
+            self._started = True
+            chunk = self._header()
+            self.bytes_sent += len(chunk)
+            if not self.stream.returns_rows:
+                self._finished = True
+                return chunk
+
+        rows = self.stream.fetch()
+        if not rows:
+            self._finished = True
+            return chunk or None
+
+        parts = [chunk]
+        for line in self._encode_rows(rows):
+            if self.rows_sent >= self.max_rows:
+                self.truncated = "max_rows"
+            elif self.bytes_sent + len(line) > self.max_bytes:
+                self.truncated = "max_bytes"
+            if self.truncated:
+                self._finished = True
+                parts.append(self._marker())
+                break
+            parts.append(line)
+            self.rows_sent += 1
+            self.bytes_sent += len(line)
+        return b"".join(parts)
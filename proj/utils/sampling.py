@@ -0,0 +1,151 @@
+import os
+from typing import Any, Dict, List, Optional
+from sqlalchemy import text, bindparam
+from sqlalchemy.engine import Connection
+from dotenv import load_dotenv
+from utils.result_encoding import encode_result_rows
+
+
+load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), "..", ".env"))
+
+# Most common values kept per column from pg_stats
+SAMPLE_COMMON_VALUES = int(os.getenv("SAMPLE_COMMON_VALUES", "5"))
+# Every sampled value (common value, histogram bound or row value) is cut to this many UTF-8 bytes
+SAMPLE_VALUE_MAX_BYTES = int(os.getenv("SAMPLE_VALUE_MAX_BYTES", "64"))
+# Upper bound for rows requested through preview_data and the sample endpoint
+SAMPLE_MAX_ROWS = int(os.getenv("SAMPLE_MAX_ROWS", "20"))
+
+# Values of these types say little in a prompt and can be huge; only their size is reported
+ELIDED_TYPES = ("bytea", "json", "jsonb", "xml", "tsvector", "tsquery", "geometry", "geography")
+# Type categories (pg_type.typcategory) whose values are read as text and truncated server-side
+_TEXT_CATEGORIES = ("S", "A", "U", "C", "G")
+
+# Per-column planner statistics of a whole schema. pg_stats only shows columns the current user
+# may read; values of elided types and arrays (whose text form does not parse back as text[])
+# never leave the server, and of the histogram only its outer bounds do. Inheritance-wide statistics win over the parent's own when both exist.
+COLUMN_STATS_SQL = """
+    SELECT DISTINCT ON (s.tablename, s.attname)
+           s.tablename AS table_name,
+           s.attname AS column_name,
+           s.null_frac,
+           s.n_distinct,
+           s.avg_width,
+           t.typname IN :elided OR t.typcategory = 'A' AS elided,
+           CASE WHEN t.typname IN :elided OR t.typcategory = 'A' THEN NULL
+                ELSE (s.most_common_vals::text::text[])[1 : :common] END AS common_values,
+           s.most_common_freqs[1 : :common] AS common_freqs,
+           CASE WHEN t.typname IN :elided OR t.typcategory = 'A' THEN NULL
+                ELSE ARRAY[(s.histogram_bounds::text::text[])[1],
+                           (s.histogram_bounds::text::text[])[array_length(s.histogram_bounds, 1)]] END AS bounds
+    FROM pg_catalog.pg_stats s
+    JOIN pg_catalog.pg_namespace n ON n.nspname = s.schemaname
+    JOIN pg_catalog.pg_class c ON c.relnamespace = n.oid AND c.relname = s.tablename
+    JOIN pg_catalog.pg_attribute a ON a.attrelid = c.oid AND a.attname = s.attname
+    JOIN pg_catalog.pg_type t ON t.oid = a.atttypid
+    WHERE s.schemaname = :schema
+      {table_filter}
+    ORDER BY s.tablename, s.attname, s.inherited DESC
+"""
+
+# Column names and types of one table, in column order
+TABLE_COLUMNS_SQL = """
+    SELECT a.attname AS column_name, t.typname, t.typcategory
+    FROM pg_catalog.pg_attribute a
+    JOIN pg_catalog.pg_class c ON c.oid = a.attrelid
+    JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace
+    JOIN pg_catalog.pg_type t ON t.oid = a.atttypid
+    WHERE n.nspname = :schema AND c.relname = :table
+      AND a.attnum > 0 AND NOT a.attisdropped
+    ORDER BY a.attnum
+"""
+
+
+def truncate_value(value: Any, max_bytes: int = SAMPLE_VALUE_MAX_BYTES) -> Any:
+    """Cut strings to max_bytes of UTF-8 (marking the cut with an ellipsis); other values pass through"""
+    if not isinstance(value, str):
+        return value
+    encoded = value.encode("utf-8")
+    if len(encoded) <= max_bytes:
+        return value
+    return encoded[:max_bytes].decode("utf-8", "ignore") + "…"
+
+
+def _column_summary(row, max_bytes: int) -> Dict[str, Any]:
+    summary: Dict[str, Any] = {
+        "null_frac": round(row.null_frac, 4),
+        # Negative: minus the fraction of rows that are distinct (-1 means unique)
+        "n_distinct": round(row.n_distinct, 4),
+        "avg_width": row.avg_width,
+    }
+    if row.elided:
+        summary["elided"] = True
+    if row.common_values:
+        summary["common_values"] = [truncate_value(v, max_bytes) for v in row.common_values]
+        summary["common_freqs"] = [round(f, 4) for f in row.common_freqs or []]
+    if row.bounds and row.bounds[0] is not None:
+        summary["range"] = [truncate_value(v, max_bytes) for v in row.bounds]
+    return summary
+
+
+def load_column_stats(conn: Connection, schema: str = 'public', tables: Optional[List[str]] = None,
+                      common_values: int = SAMPLE_COMMON_VALUES,
+                      max_bytes: int = SAMPLE_VALUE_MAX_BYTES) -> Dict[str, Dict[str, Dict[str, Any]]]:
+    """
+    Summarize the columns of a schema from pg_stats in one query, without reading any table.
+
+    Tables that were never analyzed have no statistics and are missing from the result.
+
+    Returns:
+        dict: table name -> column name -> {"null_frac", "n_distinct", "avg_width",
+            "common_values"/"common_freqs" and "range" when known, "elided" for binary/document types}
+    """
+    params: Dict[str, Any] = {"schema": schema, "elided": list(ELIDED_TYPES), "common": common_values}
+    if tables is None:
+        stmt = text(COLUMN_STATS_SQL.format(table_filter=""))
+    else:
+        stmt = text(COLUMN_STATS_SQL.format(table_filter="AND s.tablename IN :tables")).bindparams(
+            bindparam("tables", expanding=True)
+        )
+        params["tables"] = list(tables)
+    stmt = stmt.bindparams(bindparam("elided", expanding=True))
+
+    stats: Dict[str, Dict[str, Dict[str, Any]]] = {}
+    for row in conn.execute(stmt, params):
+        stats.setdefault(row.table_name, {})[row.column_name] = _column_summary(row, max_bytes)
+    return stats
+
+
+def sample_rows(conn: Connection, schema: str, table: str, limit: int = 5,
+                max_bytes: int = SAMPLE_VALUE_MAX_BYTES) -> List[Dict[str, Any]]:
+    """
+    A few raw rows of a table with every value bounded.
+
+    Text-like and array values are cut server-side, and elided types are replaced by a
+    "<type: N bytes>" marker, so large values never cross the wire.
+    """
+    def quote(name: str) -> str:
+        # Colons inside quoted names would otherwise be read as bind parameters by text()
+        return conn.dialect.identifier_preparer.quote(name).replace(":", "\\:")
+
+    columns = conn.execute(text(TABLE_COLUMNS_SQL), {"schema": schema, "table": table}).fetchall()
+    if not columns:
+        return []
+
+    expressions = []
+    for column in columns:
+        name = quote(column.column_name)
+        if column.typname in ELIDED_TYPES:
+            expr = (f"CASE WHEN {name} IS NULL THEN NULL "
+                    f"ELSE '<{column.typname}: ' || pg_catalog.pg_column_size({name}) || ' bytes>' END")
+        elif column.typcategory in _TEXT_CATEGORIES:
+            # A byte bound is also a character bound; the exact cut happens in truncate_value
+            expr = f"pg_catalog.left({name}::text, {int(max_bytes) + 1})"
+        else:
+            expr = name
+        expressions.append(f"{expr} AS {name}")
+
+    result = conn.execute(
+        text(f"SELECT {', '.join(expressions)} FROM {quote(schema)}.{quote(table)} LIMIT :limit"),
+        {"limit": min(limit, SAMPLE_MAX_ROWS)},
+    )
+    return [{k: truncate_value(v, max_bytes) for k, v in row.items()} for row in encode_result_rows(result)]
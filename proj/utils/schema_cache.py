@@ -0,0 +1,254 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Callable, List, Optional, Tuple
+from dotenv import load_dotenv
+from utils.single_flight import SingleFlight
+
+
+load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), "..", ".env"))
+
+# Hard upper bound on a snapshot's age, also bounds how stale column statistics and row counts get
+SCHEMA_CACHE_TTL = int(os.getenv("SCHEMA_CACHE_TTL_SECONDS", "3600"))
+# Within this window a snapshot (or schema directory) is served without even running the fingerprint query
+SCHEMA_CACHE_RECHECK = int(os.getenv("SCHEMA_CACHE_RECHECK_SECONDS", "30"))
+# Snapshots are per schema, so a database with several loaded schemas holds several entries
+SCHEMA_CACHE_MAX_ENTRIES = int(os.getenv("SCHEMA_CACHE_MAX_ENTRIES", "512"))
+
+
+def table_key(schema: Optional[str], table: str) -> str:
+    """Key of a table in a combined structure: bare for public, "schema.table" otherwise"""
+    return table if not schema or schema == "public" else f"{schema}.{table}"
+
+
+class SchemaSnapshot:
+    """Introspected structure of one schema of one database"""
+
+    def __init__(self, db_id: int, schema: str, fingerprint: str, structure: Dict[str, Any]):
+        self.db_id = db_id
+        self.schema = schema
+        self.fingerprint = fingerprint
+        self.structure = structure
+        self.built_at = time.monotonic()
+        self.checked_at = self.built_at
+        self._etag = None
+        self._full_tokens = None
+
+    def age(self) -> float:
+        return time.monotonic() - self.built_at
+
+    @property
+    def etag(self) -> str:
+        """
+        Validator for HTTP caching, derived from the catalog fingerprint and the snapshot contents.
+
+        Row counts and column statistics can change without a catalog change, so they are part of it;
+        a rebuild that finds everything unchanged keeps the same ETag.
+        """
+        if self._etag is None:
+            content = json.dumps(self.structure, sort_keys=True, default=str)
+            digest = hashlib.md5(f"{self.fingerprint}:{content}".encode()).hexdigest()
+            self._etag = f'"{digest}"'
+        return self._etag
+
+    @property
+    def full_tokens(self) -> int:
+        """Estimated tokens of the snapshot as an indented JSON dump, the baseline for schema context stats"""
+        if self._full_tokens is None:
+            self._full_tokens = (len(json.dumps(self.structure, indent=2, default=str)) + 3) // 4
+        return self._full_tokens
+
+
+class SchemaView:
+    """
+    The snapshots of the schemas one request targets, presented as a single structure.
+
+    structure has "schemas" (every schema the database may use), "loaded_schemas" and "tables"
+    keyed by table_key. rebuilt lists the schemas that had to be introspected for this view.
+    """
+
+    def __init__(self, db_id: int, snapshots: List[SchemaSnapshot], schemas: List[str], rebuilt: List[str] = ()):
+        self.db_id = db_id
+        self.snapshots = snapshots
+        self.schemas = schemas
+        self.rebuilt = list(rebuilt)
+        self._structure = None
+
+    @property
+    def loaded_schemas(self) -> List[str]:
+        return [snapshot.schema for snapshot in self.snapshots]
+
+    @property
+    def fingerprint(self) -> str:
+        parts = ",".join(f"{snapshot.schema}:{snapshot.fingerprint}" for snapshot in self.snapshots)
+        return hashlib.md5(parts.encode()).hexdigest()
+
+    @property
+    def etag(self) -> str:
+        # From the per-schema ETags, so a view never serializes its (possibly large) structure for this
+        parts = ",".join([snapshot.etag for snapshot in self.snapshots] + self.schemas)
+        return f'"{hashlib.md5(parts.encode()).hexdigest()}"'
+
+    @property
+    def full_tokens(self) -> int:
+        return sum(snapshot.full_tokens for snapshot in self.snapshots)
+
+    @property
+    def structure(self) -> Dict[str, Any]:
+        if self._structure is None:
+            tables = {}
+            for snapshot in self.snapshots:
+                for name, table_data in snapshot.structure.get("tables", {}).items():
+                    tables[table_key(snapshot.schema, name)] = table_data
+            self._structure = {"schemas": self.schemas, "loaded_schemas": self.loaded_schemas, "tables": tables}
+        return self._structure
+
+
+class SchemaCache:
+    """Per-(database, schema) snapshots of the introspected schema, validated by a catalog fingerprint"""
+
+    def __init__(self, ttl: int = SCHEMA_CACHE_TTL, recheck: int = SCHEMA_CACHE_RECHECK,
+                 max_entries: int = SCHEMA_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.recheck = recheck
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[int, str], SchemaSnapshot]" = OrderedDict()
+        # db_id -> (loaded at, schema name -> table names)
+        self._directories: Dict[int, Tuple[float, Dict[str, List[str]]]] = {}
+        self._lock = threading.Lock()
+        self._flight = SingleFlight()
+        self.hits = 0
+        self.misses = 0
+
+    def directory(self, db_id: int, tools) -> Dict[str, List[str]]:
+        """Schemas of a database and their table names, reloaded once the recheck window has passed"""
+        directory = self.fresh_directory(db_id)
+        if directory is not None:
+            return directory
+
+        def load():
+            loaded = tools.schema_directory()
+            with self._lock:
+                self._directories[db_id] = (time.monotonic(), loaded)
+            return loaded
+        return self._flight.do(("directory", db_id), load)
+
+    def fresh_directory(self, db_id: int) -> Optional[Dict[str, List[str]]]:
+        with self._lock:
+            entry = self._directories.get(db_id)
+        if entry is not None and time.monotonic() - entry[0] < self.recheck:
+            return entry[1]
+        return None
+
+    def get(self, db_id: int, schemas: List[str], tools, builder: Callable[[str], Dict[str, Any]],
+            max_age: Optional[float] = None) -> List[SchemaSnapshot]:
+        """
+        Return the snapshots of the given schemas, rebuilding only those whose catalog changed or whose TTL expired.
+
+        Args:
+            db_id: UserDatabase.id the snapshots belong to
+            schemas: Schemas to return, in this order
+            tools: PostgreSQLTools connected to that database
+            builder: Callable that introspects one schema and returns its structure
+            max_age: Also rebuild snapshots older than this many seconds (refresh ahead of the TTL)
+
+        Returns:
+            list: The cached or freshly built SchemaSnapshot of each schema
+        """
+        snapshots = {}
+        stale = []
+        for schema in schemas:
+            entry = self.fresh(db_id, schema)
+            if entry is not None and (max_age is None or entry.age() < max_age):
+                snapshots[schema] = entry
+            else:
+                stale.append(schema)
+        with self._lock:
+            self.hits += len(snapshots)
+        if stale:
+            # Concurrent requests for the same schemas share one validation; the stale ones are checked in one query
+            key = (db_id, tuple(stale))
+            snapshots.update(self._flight.do(key, lambda: self._refresh(db_id, stale, tools, builder, max_age)))
+        return [snapshots[schema] for schema in schemas]
+
+    def view(self, db_id: int, schemas: List[str], available: List[str], tools,
+             builder: Callable[[str], Dict[str, Any]], max_age: Optional[float] = None) -> SchemaView:
+        """get() combined into one SchemaView; available lists the schemas the database may use"""
+        previous = {schema: self.peek(db_id, schema) for schema in schemas}
+        snapshots = self.get(db_id, schemas, tools, builder, max_age)
+        rebuilt = [s.schema for s in snapshots if s is not previous[s.schema]]
+        return SchemaView(db_id, snapshots, available, rebuilt)
+
+    def fresh_view(self, db_id: int, schemas: List[str], available: List[str]) -> Optional[SchemaView]:
+        """A view served without any database round trip, or None if a schema needs validating"""
+        snapshots = [self.fresh(db_id, schema) for schema in schemas]
+        if any(snapshot is None for snapshot in snapshots):
+            return None
+        with self._lock:
+            self.hits += len(snapshots)
+        return SchemaView(db_id, snapshots, available)
+
+    def _refresh(self, db_id: int, schemas: List[str], tools, builder,
+                 max_age: Optional[float] = None) -> Dict[str, SchemaSnapshot]:
+        fingerprints = tools.schema_fingerprints(schemas)
+        max_age = self.ttl if max_age is None else min(max_age, self.ttl)
+        refreshed = {}
+        for schema in schemas:
+            # A schema that vanished gets an empty snapshot rather than an error
+            fingerprint = fingerprints.get(schema, "")
+            entry = self.peek(db_id, schema)
+            if entry is not None and entry.fingerprint == fingerprint and entry.age() < max_age:
+                entry.checked_at = time.monotonic()
+                with self._lock:
+                    self.hits += 1
+                refreshed[schema] = entry
+                continue
+
+            # Fingerprint is taken before building so a change during introspection is caught next time
+            entry = SchemaSnapshot(db_id, schema, fingerprint, builder(schema))
+            with self._lock:
+                self.misses += 1
+                self._entries[(db_id, schema)] = entry
+                self._entries.move_to_end((db_id, schema))
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+            refreshed[schema] = entry
+        return refreshed
+
+    def peek(self, db_id: int, schema: str) -> Optional[SchemaSnapshot]:
+        """Return the cached snapshot without touching the database, or None if absent or expired"""
+        with self._lock:
+            entry = self._entries.get((db_id, schema))
+            if entry is None:
+                return None
+            if entry.age() >= self.ttl:
+                del self._entries[(db_id, schema)]
+                return None
+            self._entries.move_to_end((db_id, schema))
+            return entry
+
+    def fresh(self, db_id: int, schema: str) -> Optional[SchemaSnapshot]:
+        """The cached snapshot if it was validated within the recheck window, so it can be served without a database round trip"""
+        entry = self.peek(db_id, schema)
+        if entry is not None and time.monotonic() - entry.checked_at < self.recheck:
+            return entry
+        return None
+
+    def invalidate(self, db_id: int) -> bool:
+        """Drop every schema snapshot and the directory of a database"""
+        with self._lock:
+            keys = [key for key in self._entries if key[0] == db_id]
+            for key in keys:
+                del self._entries[key]
+            had_directory = self._directories.pop(db_id, None) is not None
+            return bool(keys) or had_directory
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"entries": len(self._entries), "databases": len(self._directories), "hits": self.hits, "misses": self.misses}
+
+
+schema_cache = SchemaCache()
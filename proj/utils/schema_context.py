@@ -0,0 +1,245 @@
+import os
+import re
+import json
+import math
+from collections import Counter
+from typing import Dict, Any, List, Optional, Tuple
+from dotenv import load_dotenv
+from utils.schema_cache import table_key
+
+
+load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), "..", ".env"))
+
+SCHEMA_CONTEXT_TOKEN_BUDGET = int(os.getenv("SCHEMA_CONTEXT_TOKEN_BUDGET", "6000"))
+# Tables ranked as relevant before FK neighbours are added
+SCHEMA_CONTEXT_TOP_TABLES = int(os.getenv("SCHEMA_CONTEXT_TOP_TABLES", "12"))
+# Tables wider than this only list key columns and columns that match the prompt
+SCHEMA_CONTEXT_MAX_COLUMNS = int(os.getenv("SCHEMA_CONTEXT_MAX_COLUMNS", "40"))
+SAMPLE_VALUE_CHARS = 40
+
+_PLAIN_IDENTIFIER = re.compile(r"^[a-z_][a-z0-9_]*$")
+_CAMEL = re.compile(r"([a-z0-9])([A-Z])")
+_WORD = re.compile(r"[a-z0-9]+")
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about four characters per token for English text and SQL)"""
+    return (len(text) + 3) // 4
+
+
+def _stem(word: str) -> str:
+    if len(word) > 4 and word.endswith("ies"):
+        return word[:-3] + "y"
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+
+def tokenize(text: str) -> List[str]:
+    """Lower-cased, stemmed words; snake_case and camelCase identifiers are split into their parts"""
+    if not text:
+        return []
+    text = _CAMEL.sub(r"\1 \2", str(text)).lower()
+    return [_stem(word) for word in _WORD.findall(text)]
+
+
+class BM25:
+    def __init__(self, documents: List[List[str]], k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.term_freqs = [Counter(doc) for doc in documents]
+        self.lengths = [len(doc) for doc in documents]
+        self.avg_length = (sum(self.lengths) / len(documents)) if documents else 0
+        doc_freq = Counter(term for doc in documents for term in set(doc))
+        n = len(documents)
+        self.idf = {term: math.log(1 + (n - df + 0.5) / (df + 0.5)) for term, df in doc_freq.items()}
+
+    def score(self, query: List[str], index: int) -> float:
+        freqs = self.term_freqs[index]
+        norm = self.k1 * (1 - self.b + self.b * self.lengths[index] / (self.avg_length or 1))
+        total = 0.0
+        for term in set(query):
+            tf = freqs.get(term)
+            if tf:
+                total += self.idf[term] * tf * (self.k1 + 1) / (tf + norm)
+        return total
+
+
+def _table_document(name: str, structure: Dict[str, Any]) -> List[str]:
+    # Names are repeated so they outweigh free-text comments
+    words = tokenize(name) * 3
+    if structure.get("comment"):
+        words += tokenize(structure["comment"])
+    for column in structure.get("columns", []):
+        words += tokenize(column["name"]) * 2
+        if column.get("comment"):
+            words += tokenize(column["comment"])
+    return words
+
+
+def _ident(name: str) -> str:
+    """Quote identifiers the model would otherwise have to guess the casing of"""
+    return name if _PLAIN_IDENTIFIER.match(name) else '"' + name.replace('"', '""') + '"'
+
+
+def _qualified(table: str, structure: Dict[str, Any]) -> str:
+    schema = structure.get("schema")
+    table = structure.get("table_name", table)
+    return _ident(table) if not schema or schema == "public" else f"{_ident(schema)}.{_ident(table)}"
+
+
+def _foreign_keys_by_column(structure: Dict[str, Any]) -> Dict[str, str]:
+    refs = {}
+    for fk in structure.get("foreign_keys", []):
+        target = _ident(fk["referred_table"])
+        # Same-schema references leave referred_schema empty; outside public they still need qualifying
+        schema = fk.get("referred_schema") or structure.get("schema")
+        if schema and schema != "public":
+            target = f"{_ident(schema)}.{target}"
+        for local, remote in zip(fk["constrained_columns"], fk["referred_columns"]):
+            refs[local] = f"{target}({_ident(remote)})"
+    return refs
+
+
+def _table_ddl(table: str, table_data: Dict[str, Any], query_terms: set, with_values: bool) -> str:
+    structure = table_data.get("structure", {})
+    refs = _foreign_keys_by_column(structure)
+    columns = structure.get("columns", [])
+
+    shown = columns
+    if len(columns) > SCHEMA_CONTEXT_MAX_COLUMNS:
+        shown = [
+            c for c in columns
+            if c.get("primary_key") or c["name"] in refs or query_terms.intersection(tokenize(c["name"]))
+        ][:SCHEMA_CONTEXT_MAX_COLUMNS]
+
+    parts = []
+    for column in shown:
+        part = f"{_ident(column['name'])} {column['type']}"
+        if column.get("primary_key"):
+            part += " PRIMARY KEY"
+        elif not column.get("nullable", True):
+            part += " NOT NULL"
+        if column["name"] in refs:
+            part += f" REFERENCES {refs[column['name']]}"
+        if column.get("comment"):
+            part += f" /* {column['comment']} */"
+        parts.append(part)
+    if len(shown) < len(columns):
+        parts.append(f"/* {len(columns) - len(shown)} more columns */")
+
+    line = f"CREATE TABLE {_qualified(table, structure)} ({', '.join(parts)});"
+    notes = []
+    if table_data.get("row_count") is not None:
+        prefix = "~" if table_data.get("row_count_estimated") else ""
+        notes.append(f"{prefix}{table_data['row_count']} rows")
+    if structure.get("comment"):
+        notes.append(structure["comment"])
+    if notes:
+        line += " -- " + "; ".join(notes)
+
+    if with_values:
+        values = _value_notes(shown, table_data.get("column_stats") or {})
+        if values:
+            line += f"\n-- values: {'; '.join(values)}"
+    return line
+
+
+def _literal(value: Any) -> str:
+    return json.dumps(str(value)[:SAMPLE_VALUE_CHARS], ensure_ascii=False)
+
+
+def _value_notes(columns: List[Dict[str, Any]], column_stats: Dict[str, Dict[str, Any]]) -> List[str]:
+    """Most common values (with frequency) or the value range of each shown column, from pg_stats"""
+    notes = []
+    for column in columns:
+        stats = column_stats.get(column["name"])
+        if not stats or stats.get("elided"):
+            continue
+        common = stats.get("common_values") or []
+        freqs = stats.get("common_freqs") or []
+        if common:
+            listed = ", ".join(f"{_literal(v)} {round(f * 100)}%" for v, f in zip(common, freqs))
+            notes.append(f"{_ident(column['name'])} often {listed}")
+        elif stats.get("range"):
+            low, high = stats["range"]
+            notes.append(f"{_ident(column['name'])} {_literal(low)}..{_literal(high)}")
+    return notes
+
+
+def build_schema_context(prompt: str, db_structure: Dict[str, Any],
+                         token_budget: int = SCHEMA_CONTEXT_TOKEN_BUDGET,
+                         top_tables: int = SCHEMA_CONTEXT_TOP_TABLES,
+                         full_tokens: Optional[int] = None) -> Tuple[str, Dict[str, int]]:
+    """
+    Serialize the parts of a schema snapshot most relevant to a prompt as compact DDL.
+
+    Tables are ranked with BM25 over table names, column names and comments; the top hits
+    and their foreign-key neighbours come first, then the remaining tables in rank order
+    while the token budget lasts. Tables that do not fit are still listed by name.
+
+    Returns:
+        tuple: (context text, stats with tokens used, tokens of the full JSON dump and tokens saved)
+    """
+    tables: Dict[str, Any] = db_structure.get("tables", {})
+    names = list(tables)
+    query = tokenize(prompt)
+    query_terms = set(query)
+
+    bm25 = BM25([_table_document(name, tables[name].get("structure", {})) for name in names])
+    scores = {name: bm25.score(query, i) for i, name in enumerate(names)}
+    ranked = sorted(names, key=lambda name: (-scores[name], name))
+    hits = [name for name in ranked if scores[name] > 0][:top_tables]
+
+    # Joins usually need the tables on the other side of a foreign key
+    neighbours = []
+    hit_set = set(hits)
+    for name in names:
+        structure = tables[name].get("structure", {})
+        referred = {
+            table_key(fk.get("referred_schema") or structure.get("schema"), fk["referred_table"])
+            for fk in structure.get("foreign_keys", [])
+        }
+        if name in hit_set:
+            candidates = referred
+        elif referred & hit_set:
+            candidates = {name}
+        else:
+            continue
+        for candidate in sorted(candidates):
+            if candidate in tables and candidate not in hit_set and candidate not in neighbours:
+                neighbours.append(candidate)
+
+    ordered = hits + neighbours + [name for name in ranked if name not in hit_set and name not in neighbours]
+
+    lines = []
+    used = 0
+    omitted = []
+    for name in ordered:
+        ddl = _table_ddl(name, tables[name], query_terms, with_values=name in hit_set)
+        cost = estimate_tokens(ddl) + 1
+        if used + cost > token_budget:
+            omitted.append(name)
+            continue
+        lines.append(ddl)
+        used += cost
+
+    if omitted:
+        listing = f"-- Other tables (columns not shown): {', '.join(omitted)}"
+        if used + estimate_tokens(listing) <= token_budget:
+            lines.append(listing)
+            used += estimate_tokens(listing)
+
+    context = "\n".join(lines)
+    if full_tokens is None:
+        # Callers holding a SchemaView pass its cached count; only raw structures are serialized here
+        full_tokens = estimate_tokens(json.dumps(db_structure, indent=2, default=str))
+    stats = {
+        "tables_total": len(names),
+        "tables_included": len(names) - len(omitted),
+        "relevant_tables": len(hits),
+        "tokens_used": estimate_tokens(context),
+        "tokens_full": full_tokens,
+        "tokens_saved": max(full_tokens - estimate_tokens(context), 0),
+    }
+    return context, stats
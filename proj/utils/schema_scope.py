@@ -0,0 +1,85 @@
+import os
+import re
+from typing import Dict, List, Optional, Sequence
+from dotenv import load_dotenv
+from utils.schema_context import tokenize
+
+
+load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), "..", ".env"))
+
+# Schema loaded when a request names none and the database has no allowlist
+SCHEMA_DEFAULT = os.getenv("SCHEMA_DEFAULT", "public")
+# Most schemas introspected for one request
+SCHEMA_MAX_PER_REQUEST = int(os.getenv("SCHEMA_MAX_PER_REQUEST", "8"))
+
+_QUALIFIED_NAME = re.compile(r'"?([A-Za-z_][\w$]*)"?\s*\.\s*"?[A-Za-z_]')
+
+
+class SchemaNotAllowed(ValueError):
+    """Raised when a request selects a schema that does not exist or is not on the database's allowlist"""
+
+
+def allowed_schemas(directory: Dict[str, List[str]], allowlist: Optional[Sequence[str]] = None) -> List[str]:
+    """Schemas of the directory a database may use, in allowlist order when one is set"""
+    if not allowlist:
+        return list(directory)
+    return [schema for schema in dict.fromkeys(allowlist) if schema in directory]
+
+
+def infer_schemas(prompt: str, directory: Dict[str, List[str]], candidates: List[str]) -> List[str]:
+    """
+    Schemas a prompt refers to, best match first.
+
+    A schema counts when it is written as a qualifier ("sales.orders"), when its name appears
+    as words in the prompt, or when one of its tables does; naming the schema weighs most.
+    """
+    words = set(tokenize(prompt))
+    qualifiers = set(_QUALIFIED_NAME.findall(prompt or ""))
+    scores = {}
+    for schema in candidates:
+        schema_words = set(tokenize(schema))
+        score = 0
+        if schema in qualifiers:
+            score += 100
+        elif schema_words and schema_words <= words:
+            score += 10
+        for table in directory.get(schema, []):
+            table_words = set(tokenize(table))
+            if table_words and table_words <= words:
+                score += 1
+        if score:
+            scores[schema] = score
+    return sorted(scores, key=lambda schema: (-scores[schema], candidates.index(schema)))
+
+
+def resolve_schemas(directory: Dict[str, List[str]], allowlist: Optional[Sequence[str]] = None,
+                    requested: Optional[Sequence[str]] = None, prompt: Optional[str] = None,
+                    limit: int = SCHEMA_MAX_PER_REQUEST) -> List[str]:
+    """
+    Pick the schemas to introspect for one request.
+
+    Schemas selected by the client are used as given. Otherwise the schemas inferred from the
+    prompt come first, followed by the allowlist (or SCHEMA_DEFAULT when there is none, or the
+    first schema if that does not exist either), up to limit schemas.
+
+    Raises:
+        SchemaNotAllowed: When a selected schema is unknown or not allowed, or too many are selected
+    """
+    allowed = allowed_schemas(directory, allowlist)
+    if requested:
+        selected = list(dict.fromkeys(requested))
+        unknown = [schema for schema in selected if schema not in allowed]
+        if unknown:
+            raise SchemaNotAllowed(f"Unknown or not allowed schema: {', '.join(unknown)}")
+        if len(selected) > limit:
+            raise SchemaNotAllowed(f"At most {limit} schemas can be selected at once")
+        return selected
+
+    if allowlist:
+        fallback = allowed
+    elif SCHEMA_DEFAULT in allowed:
+        fallback = [SCHEMA_DEFAULT]
+    else:
+        fallback = allowed[:1]
+    inferred = infer_schemas(prompt, directory, allowed) if prompt else []
+    return list(dict.fromkeys(inferred + fallback))[:limit]
@@ -0,0 +1,11 @@
+from typing import Any
+from utils.result_encoding import dumps
+
+
+# Keep proxies (nginx) from buffering the stream and clients from caching it
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+
+def sse_event(event: str, data: Any) -> bytes:
+    """Encode one server-sent event; data is JSON so multi-line SQL stays on a single data line"""
+    return b"event: " + event.encode() + b"\ndata: " + dumps(data) + b"\n\n"
@@ -1,73 +1,97 @@
-import json
+from typing import Any, Dict, List, Optional
+from utils.schema_cache import table_key
 
-def format_db_structure_for_visualization(db_agent):
+
+def format_db_structure_for_visualization(structure: Dict[str, Any]):
     """
     Formats the database structure into a JSON format suitable for the visualization component.
     
     Args:
-        db_agent: An instance of DatabaseAgent with tools initialized
+        structure: Database structure from a schema snapshot (DatabaseAgent.get_schema_snapshot)
         
     Returns:
         dict: A JSON-serializable dictionary with the database structure
     """
     result = {
-        "schemas": [],
+        "schemas": structure.get("schemas", []),
+        "loaded_schemas": structure.get("loaded_schemas", []),
         "tables": {}
     }
 
-    # Get schemas
-    try:
-        result["schemas"] = db_agent.tools.list_schemas()
-    except Exception as e:
-        print(f"Error fetching schemas: {e}")
-        result["schemas"] = []
-
-    # Focus on public schema for now
-    schema = "public"
-
-    try:
-        tables = db_agent.tools.list_tables(schema=schema)
-
-        for table_name in tables:
-            try:
-                # Get table structure
-                table_info = db_agent.tools.describe_table(table_name=table_name, schema=schema)
-
-                # Get sample data
-                sample_data = db_agent.tools.preview_data(table_name=table_name, schema=schema, limit=3)
-
-                processed_sample = []
-                for row in sample_data:
-                    processed_row = {}
-                    for key, value in row.items():
-                        processed_row[key] = str(value) if value is not None else None
-                    processed_sample.append(processed_row)
-
-                result["tables"][table_name] = {
-                    "structure": table_info,
-                    "sample_data": processed_sample
-                }
+    for table_name, table_data in structure.get("tables", {}).items():
+        if "error" in table_data:
+            result["tables"][table_name] = {"error": table_data["error"]}
+            continue
 
-            except Exception as e:
-                print(f"Error processing table {table_name}: {e}")
-                result["tables"][table_name] = {"error": str(e)}
-
-    except Exception as e:
-        print(f"Error fetching tables: {e}")
+        result["tables"][table_name] = {
+            "structure": table_data["structure"],
+            "column_stats": table_data.get("column_stats", {}),
+            "row_count": table_data["row_count"],
+            "row_count_estimated": table_data["row_count_estimated"]
+        }
 
     return result
 
 
-def get_db_structure_json(db_agent):
+def list_tables_for_visualization(structure: Dict[str, Any]):
     """
-    Converts the database structure into a pretty-printed JSON string.
+    Lightweight overview of a database: one entry per table plus the foreign-key edges between them.
     
     Args:
-        db_agent: An instance of DatabaseAgent with tools initialized
+        structure: Database structure from a schema snapshot
         
     Returns:
-        str: JSON string
+        dict: schemas, tables (name, counts, comment) and edges (from/to table and columns)
     """
-    db_structure = format_db_structure_for_visualization(db_agent)
-    return json.dumps(db_structure, indent=2)
+    tables = []
+    edges = []
+    for table_name, table_data in structure.get("tables", {}).items():
+        table_structure = table_data.get("structure", {})
+        entry = {
+            "name": table_name,
+            "schema": table_structure.get("schema"),
+            "comment": table_structure.get("comment"),
+            "column_count": len(table_structure.get("columns", [])),
+            "row_count": table_data.get("row_count"),
+            "row_count_estimated": table_data.get("row_count_estimated"),
+        }
+        if "error" in table_data:
+            entry["error"] = table_data["error"]
+        tables.append(entry)
+
+        for fk in table_structure.get("foreign_keys", []):
+            to_schema = fk.get("referred_schema") or table_structure.get("schema")
+            edges.append({
+                "name": fk.get("name"),
+                "from_table": table_name,
+                "from_columns": fk["constrained_columns"],
+                "to_schema": to_schema,
+                # Same key as in "tables", so edges across loaded schemas resolve
+                "to_table": table_key(to_schema, fk["referred_table"]),
+                "to_columns": fk["referred_columns"],
+            })
+
+    return {"schemas": structure.get("schemas", []), "loaded_schemas": structure.get("loaded_schemas", []),
+            "tables": tables, "edges": edges}
+
+
+def table_detail_for_visualization(structure: Dict[str, Any], table_name: str) -> Optional[Dict[str, Any]]:
+    """Columns, keys and indexes of one table (without sample rows), or None if the table is unknown"""
+    table_data = structure.get("tables", {}).get(table_name)
+    if table_data is None:
+        return None
+    detail = {
+        "name": table_name,
+        "structure": table_data.get("structure", {}),
+        "row_count": table_data.get("row_count"),
+        "row_count_estimated": table_data.get("row_count_estimated"),
+    }
+    if "error" in table_data:
+        detail["error"] = table_data["error"]
+    return detail
+
 
+def table_sample_for_visualization(structure: Dict[str, Any], table_name: str, rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Sample rows fetched on demand (values bounded, see utils.sampling) plus the table's column statistics"""
+    table_data = structure.get("tables", {}).get(table_name, {})
+    return {"name": table_name, "sample_data": rows, "column_stats": table_data.get("column_stats", {})}